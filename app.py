@@ -1,11 +1,26 @@
-from dash import Dash, html, dcc, page_container
+from dash import Dash, html, dcc, page_container, DiskcacheManager
 import dash_mantine_components as dmc
-from pandas import read_csv
+from diskcache import Cache
+from pandas import set_option
 
+from logic.global_function import read_data, build_month_index
+from logic.data_registry import register_dataset, resolve_dataset
+from logic.sql_function import register_sql_source, use_sql_backend, get_connection
+from logic.polars_function import register_polars_source
+from logic.callback_metrics import register_callback_metrics, register_metrics_collector
+from logic.figure_cache import figure_cache_metrics
+from logic.server_timing import register_server_timing
+from components.duration_callback import get_duration_sketches
+from components.utils import data_backend
+
+
+# Heavy Durations callbacks run in background processes, a newer input change terminates the running job.
+background_callback_manager = DiskcacheManager(Cache("cache/callbacks"))
 
 app = Dash(
     __name__, 
     use_pages=True,
+    background_callback_manager=background_callback_manager,
     external_stylesheets=[
         # Google fonts
         "https://fonts.googleapis.com/css2family=Inter:wght@100;200;300;400;500;600;900&display=swap"
@@ -13,9 +28,41 @@ app = Dash(
 )
 server = app.server
 
-orders_data = read_csv("data/orders.csv")
-customers_data = read_csv("data/customers.csv")
-item_sellers_data = read_csv("data/item_seller.csv")
+# Callback latency, payload size and error counts on /metrics.
+register_callback_metrics(app)
+register_metrics_collector(figure_cache_metrics)
+# Per response decode / data / compute / figure / encode split, visible in the browser devtools.
+register_server_timing(app)
+
+# Registered data is shared by every callback, derived frames must never write back into it.
+set_option("mode.copy_on_write", True)
+
+orders_data = read_data("data/orders.csv", "orders")
+customers_data = read_data("data/customers.csv", "customer")
+item_sellers_data = read_data("data/item_seller.csv", "seller")
+
+# Source files of the SQL backend (`data_backend` in components/utils.py), loaded once into a database file
+# that every process opens read-only.
+register_sql_source("data/orders.csv", "orders")
+register_sql_source("data/customers.csv", "customer")
+register_sql_source("data/item_seller.csv", "seller")
+
+if use_sql_backend(data_backend):
+    get_connection()
+
+# Keep the typed data on the server, the stores only carry a handle to it.
+orders_handle = register_dataset(build_month_index(orders_data), "orders")
+customers_handle = register_dataset(build_month_index(customers_data), "customer")
+item_sellers_handle = register_dataset(build_month_index(item_sellers_data), "seller")
+
+# The polars backend scans a parquet file of each registered snapshot, the app does not start without it.
+if data_backend == "polars":
+    for handle in [orders_handle, customers_handle, item_sellers_handle]:
+        register_polars_source(resolve_dataset(handle)["data"], handle)
+
+# Background jobs are forked from this process, build the duration structures once here so every job
+# inherits them.
+get_duration_sketches(orders_handle)
 
 
 app.layout = dmc.MantineProvider(
@@ -30,9 +77,9 @@ app.layout = dmc.MantineProvider(
     children=[
         html.Div(
             [
-                dcc.Store(id="store_orders_data", data=orders_data.to_dict('records')),
-                dcc.Store(id="store_customer_data", data=customers_data.to_dict('records')),
-                dcc.Store(id="store_seller_data", data=item_sellers_data.to_dict('records')),
+                dcc.Store(id="store_orders_data", data=orders_handle),
+                dcc.Store(id="store_customer_data", data=customers_handle),
+                dcc.Store(id="store_seller_data", data=item_sellers_handle),
                 page_container
             ],
             className="dashboard-body"
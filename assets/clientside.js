@@ -0,0 +1,37 @@
+// Presentational callbacks, run in the browser without a request to the server.
+
+// Same order as `delivery_phase` in components/utils.py
+const deliveryPhase = ["placement", "approval", "carrier", "customer"];
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    dashboard: {
+        toggleSidebar: function(isOpened) {
+            return isOpened ? "page-sidebar" : "page-sidebar close";
+        },
+
+        toggleModal: function(nClicks, opened) {
+            return !opened;
+        },
+
+        // The phases left to choose from in each phase selection.
+        validPhaseOptions: function(fromPhase, toPhase) {
+            if (fromPhase == null || toPhase == null) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            return [
+                deliveryPhase.filter(phase => phase !== toPhase),
+                deliveryPhase.filter(phase => phase !== fromPhase)
+            ];
+        },
+
+        // Highlight the selected phases of the breadcrumb.
+        updateBcStyle: function(fromPhase, toPhase) {
+            if (fromPhase == null || toPhase == null) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            return deliveryPhase.map(
+                phase => [fromPhase, toPhase].includes(phase) ? "dp-bc_item active" : "dp-bc_item"
+            );
+        }
+    }
+});
@@ -0,0 +1,496 @@
+"""
+Micro-benchmarks of the public functions in logic/.
+
+Every case is timed on the source data scaled 1x, 10x and 100x (rows are repeated with suffixed ids so
+distinct counts grow with the data). Wall time and peak (traced) memory are written to a json file that
+can be compared with the results of a previous run.
+
+usage (from the repository root):
+    python -m benchmarks.bench_logic --scales 1 10 100 --output bench_results.json
+    python -m benchmarks.bench_logic --scales 1 --compare bench_results.json
+"""
+from argparse import ArgumentParser
+from inspect import getmembers, isfunction
+from json import dump, load
+from os.path import join
+from tempfile import TemporaryDirectory
+from statistics import median
+from time import perf_counter
+from datetime import datetime, timezone
+import platform
+import tracemalloc
+import warnings
+
+import numpy
+import pandas
+from pandas import DataFrame, concat
+
+import logic.global_function as global_function
+import logic.order_function as order_function
+import logic.duration_function as duration_function
+import logic.seller_function as seller_function
+from logic.data_cache import source_signature, write_cache
+
+
+benchmarked_modules = [global_function, order_function, duration_function, seller_function]
+
+# Columns that identify an entity, suffixed with the copy number when the data is scaled up.
+id_columns = ["order_id", "customer_id", "customer_unique_id", "seller_id"]
+
+date_var = "order_purchase_timestamp"
+month = "March"
+period = "day"
+
+
+def scale_data(data: DataFrame, scale: int) -> DataFrame:
+    """
+    :params
+    data: source data.
+    scale: number of copies of the data.
+
+    :return the data repeated `scale` times, with distinct ids in every copy.
+    """
+    if scale == 1:
+        return data
+
+    copies = []
+    for copy_id in range(scale):
+        copy_df = data.copy()
+        for col in id_columns:
+            if col in copy_df.columns:
+                copy_df[col] = copy_df[col].astype(str) + f"_{copy_id}"
+        copies.append(copy_df)
+
+    return concat(copies, ignore_index=True)
+
+
+class BenchData:
+    """
+    Lazily built inputs of the benchmark cases for one scale.
+    """
+
+    def __init__(self, data_dir: str, scale: int):
+        self.data_dir = data_dir
+        self.scale = scale
+        self._values = {}
+        # Source files written at this scale, removed with the BenchData.
+        self._files = TemporaryDirectory(prefix=f"bench_{scale}x_")
+
+    def get(self, name: str):
+        if name not in self._values:
+            self._values[name] = getattr(self, f"_build_{name}")()
+        return self._values[name]
+
+    def _read(self, file_name: str, data_type: str) -> DataFrame:
+        return scale_data(global_function.read_data(join(self.data_dir, file_name), data_type), self.scale)
+
+    def _build_orders_raw(self):
+        return self._read("orders.csv", "orders")
+
+    def _build_customers_raw(self):
+        return self._read("customers.csv", "customer")
+
+    def _build_sellers_raw(self):
+        return self._read("item_seller.csv", "seller")
+
+    def _build_orders_csv(self):
+        # The scaled orders written as a csv file, without a parquet cache.
+        path = join(self._files.name, "orders.csv")
+        self.get("orders_raw").to_csv(path, index=False)
+        return path
+
+    def _build_orders_cached_csv(self):
+        # The scaled orders written as a csv file, with a valid parquet cache next to it.
+        path = join(self._files.name, "orders_cached.csv")
+        self.get("orders_raw").to_csv(path, index=False)
+        write_cache(self.get("orders_raw"), path, source_signature(path))
+        return path
+
+    def _build_orders_untyped(self):
+        return self.get("orders_raw").astype({col: str for col in global_function.date_columns["orders"]})
+
+    def _build_orders(self):
+        return global_function.build_month_index(self.get("orders_raw"))
+
+    def _build_customers(self):
+        return global_function.build_month_index(self.get("customers_raw"))
+
+    def _build_sellers(self):
+        return global_function.build_month_index(self.get("sellers_raw"))
+
+    def _build_orders_month(self):
+        return global_function.filter_month(self.get("orders"), date_var, month, False, True)["data"]
+
+    def _build_orders_offsets(self):
+        return global_function.month_offsets(self.get("orders"))
+
+    def _build_kpi_cube(self):
+        return order_function.build_kpi_cube(self.get("customers"), date_var)
+
+    def _build_status_cube(self):
+        return order_function.build_status_cube(self.get("orders"), date_var)
+
+    def _build_customer_bitmaps(self):
+        return order_function.build_customer_bitmaps(self.get("customers"), date_var)
+
+    def _build_seller_deadline_cube(self):
+        return seller_function.build_seller_deadline_cube(self.get("sellers"), date_var)
+
+    def _build_seller_deadline(self):
+        return seller_function.month_seller_deadline(self.get("seller_deadline_cube"), month)
+
+    def _build_duration_matrix(self):
+        return duration_function.build_duration_matrix(self.get("orders"))
+
+    def _build_duration_sketches(self):
+        return duration_function.build_duration_sketches(self.get("orders"), self.get("duration_matrix"), date_var)
+
+    def _build_time_diff(self):
+        return duration_function.create_time_diff(
+            self.get("orders_month"), "order_purchase_timestamp", "order_delivered_customer_date", period
+        )["data"]
+
+    def _build_lu_time_diff(self):
+        lu_df = global_function.filter_month(self.get("orders"), date_var, month, True, True)["data"]
+        return duration_function.create_time_diff(
+            lu_df, "order_purchase_timestamp", "order_delivered_customer_date", period
+        )["data"]
+
+    def _build_time_diff_series(self):
+        return self.get("time_diff")["time_diff"]
+
+    def _build_unit_codes(self):
+        return duration_function.unit_time_code(self.get("time_diff_series"))
+
+    def _build_seconds(self):
+        return self.get("time_diff_series").dropna().dt.total_seconds().to_numpy()
+
+    def _build_sketch_keys(self):
+        return duration_function.sketch_keys(self.get("seconds"))
+
+
+def benchmark_cases() -> list:
+    """
+    :return a list of (function name, case name, function of the BenchData returning the callable to time).
+    """
+    gf, of, df, sf = global_function, order_function, duration_function, seller_function
+    pair = ("order_purchase_timestamp", "order_delivered_customer_date")
+
+    return [
+        # logic/global_function.py
+        ("check_valid_month_name", "valid", lambda d: lambda: gf.check_valid_month_name(month)),
+        ("clean_date", "typed", lambda d: lambda: gf.clean_date(d.get("orders"), "orders")),
+        ("clean_date", "untyped", lambda d: lambda: gf.clean_date(d.get("orders_untyped"), "orders")),
+        # The csv parse and the cache read are timed separately, on the file of the case scale.
+        ("read_data", "parse", lambda d: lambda: gf.read_data(d.get("orders_csv"), "orders", use_cache=False)),
+        ("read_data", "cache_hit", lambda d: lambda: gf.read_data(d.get("orders_cached_csv"), "orders")),
+        ("build_month_index", "orders", lambda d: lambda: gf.build_month_index(d.get("orders_raw"))),
+        ("has_month_index", "orders", lambda d: lambda: gf.has_month_index(d.get("orders"), date_var)),
+        ("month_offsets", "orders", lambda d: lambda: gf.month_offsets(d.get("orders"))),
+        (
+            "take_periods", "leading",
+            lambda d: lambda: gf.take_periods(
+                d.get("orders"), d.get("orders_offsets"), gf.select_periods(d.get("orders_offsets"), month, True)
+            )
+        ),
+        ("select_periods", "leading", lambda d: lambda: gf.select_periods(d.get("orders_offsets"), month, True)),
+        ("period_code", "month", lambda d: lambda: gf.period_code(2018, 1)),
+        ("previous_period", "january", lambda d: lambda: gf.previous_period(201801)),
+        ("previous_year_period", "month", lambda d: lambda: gf.previous_year_period(201801)),
+        ("period_years", "orders", lambda d: lambda: gf.period_years(d.get("orders_offsets"))),
+        ("latest_year", "orders", lambda d: lambda: gf.latest_year(d.get("orders_offsets"))),
+        ("date_period_codes", "orders", lambda d: lambda: gf.date_period_codes(d.get("orders_raw"), date_var)),
+        ("data_periods", "indexed", lambda d: lambda: gf.data_periods(d.get("orders"), date_var)),
+        ("data_periods", "unindexed", lambda d: lambda: gf.data_periods(d.get("orders_raw"), date_var)),
+        (
+            "filter_periods", "leading",
+            lambda d: lambda: gf.filter_periods(
+                d.get("orders"), date_var, gf.select_periods(d.get("orders_offsets"), month, True)
+            )
+        ),
+        ("filter_month", "single", lambda d: lambda: gf.filter_month(d.get("orders"), date_var, month)),
+        ("filter_month", "leading", lambda d: lambda: gf.filter_month(d.get("orders"), date_var, month, True, True)),
+        ("filter_month", "unindexed", lambda d: lambda: gf.filter_month(d.get("orders_raw"), date_var, month, True)),
+        ("date_range_bounds", "two_weeks", lambda d: lambda: gf.date_range_bounds("2018-03-01", "2018-03-14")),
+        (
+            "date_range_offsets", "two_weeks",
+            lambda d: lambda: gf.date_range_offsets(d.get("orders"), date_var, "2018-03-01", "2018-03-14")
+        ),
+        (
+            "filter_date_range", "two_weeks",
+            lambda d: lambda: gf.filter_date_range(d.get("orders"), date_var, "2018-03-01", "2018-03-14")
+        ),
+        (
+            "filter_date_range", "unindexed",
+            lambda d: lambda: gf.filter_date_range(d.get("orders_raw"), date_var, "2018-03-01", "2018-03-14")
+        ),
+
+        # logic/order_function.py
+        ("build_kpi_cube", "customers", lambda d: lambda: of.build_kpi_cube(d.get("customers"), date_var)),
+        (
+            "kpi_cube_count", "customer",
+            lambda d: lambda: of.kpi_cube_count(d.get("kpi_cube"), list(d.get("kpi_cube").index[-1:]), "customer")
+        ),
+        ("build_status_cube", "orders", lambda d: lambda: of.build_status_cube(d.get("orders"), date_var)),
+        ("status_month_volume", "shipped", lambda d: lambda: of.status_month_volume(d.get("status_cube"), "shipped", month)),
+        ("build_customer_bitmaps", "customers", lambda d: lambda: of.build_customer_bitmaps(d.get("customers"), date_var)),
+        (
+            "distinct_customers", "all_months",
+            lambda d: lambda: of.distinct_customers(d.get("customer_bitmaps"), list(d.get("customer_bitmaps")["bitmaps"]))
+        ),
+        (
+            "get_stats_numbers", "customer_frame",
+            lambda d: lambda: of.get_stats_numbers(d.get("customers"), date_var, month, "customer")
+        ),
+        (
+            "get_stats_numbers", "customer_cube",
+            lambda d: lambda: of.get_stats_numbers(
+                d.get("customers"), date_var, month, "customer", d.get("kpi_cube"), d.get("customer_bitmaps")
+            )
+        ),
+        ("get_stats_numbers", "orders_frame", lambda d: lambda: of.get_stats_numbers(d.get("orders"), date_var, month, "orders")),
+        ("month_stats", "frame", lambda d: lambda: of.month_stats(d.get("orders"), date_var, month)),
+        ("month_stats", "cube", lambda d: lambda: of.month_stats(d.get("customers"), date_var, month, d.get("kpi_cube"))),
+        ("monthly_order_volume", "line", lambda d: lambda: of.monthly_order_volume(d.get("orders"), date_var, month)),
+        (
+            "monthly_order_volume", "cube",
+            lambda d: lambda: of.monthly_order_volume(d.get("orders"), date_var, month, "line", None, d.get("kpi_cube"))
+        ),
+        (
+            "monthly_order_volume", "unindexed",
+            lambda d: lambda: of.monthly_order_volume(d.get("orders_raw"), date_var, month)
+        ),
+        ("period_order_counts", "orders", lambda d: lambda: of.period_order_counts(d.get("orders"), date_var)),
+        (
+            "period_volume_figure", "cube",
+            lambda d: lambda: of.period_volume_figure(d.get("kpi_cube")["orders"], month)
+        ),
+        (
+            "monthly_volume_figure", "line",
+            lambda d: lambda: of.monthly_volume_figure(
+                DataFrame({"month": ["January", "February", "March"], "count": [10, 20, 30]}), month
+            )
+        ),
+        ("daily_order_volume", "month", lambda d: lambda: of.daily_order_volume(d.get("orders_month"), date_var, month)),
+        (
+            "daily_volume_figure", "month",
+            lambda d: lambda: of.daily_volume_figure(DataFrame({"day": range(1, 32), "count": range(31)}), month)
+        ),
+        ("get_week_volume", "month", lambda d: lambda: of.get_week_volume(d.get("orders_month"), date_var, month)),
+        (
+            "week_volume_figure", "month",
+            lambda d: lambda: of.week_volume_figure(DataFrame({"week_period": ["Weekday", "weekend"], "count": [70, 30]}))
+        ),
+        ("status_count", "month", lambda d: lambda: of.status_count(d.get("orders_month"), date_var, month)),
+
+        # logic/duration_function.py
+        ("arrange_selection", "columns", lambda d: lambda: df.arrange_selection("customer", "placement")),
+        ("unit_time_code", "month", lambda d: lambda: df.unit_time_code(d.get("time_diff_series"))),
+        ("unit_time_label", "month", lambda d: lambda: df.unit_time_label(d.get("time_diff_series"))),
+        ("unit_time_histogram", "month", lambda d: lambda: df.unit_time_histogram(d.get("unit_codes"))),
+        ("build_duration_matrix", "orders", lambda d: lambda: df.build_duration_matrix(d.get("orders"))),
+        ("create_time_diff", "computed", lambda d: lambda: df.create_time_diff(d.get("orders_month"), *pair, period)),
+        (
+            "create_time_diff", "matrix",
+            lambda d: lambda: df.create_time_diff(d.get("orders_month"), *pair, period, d.get("duration_matrix"))
+        ),
+        ("unit_of_time", "month", lambda d: lambda: df.unit_of_time(d.get("time_diff"))),
+        ("sketch_keys", "month", lambda d: lambda: df.sketch_keys(d.get("seconds"))),
+        ("sketch_values", "month", lambda d: lambda: df.sketch_values(d.get("sketch_keys"))),
+        (
+            "build_duration_sketches", "orders",
+            lambda d: lambda: df.build_duration_sketches(d.get("orders"), d.get("duration_matrix"), date_var)
+        ),
+        (
+            "sketch_medians", "day",
+            lambda d: lambda: df.sketch_medians(d.get("duration_sketches"), pair, [201803], "day", period)
+        ),
+        (
+            "sketch_medians", "month",
+            lambda d: lambda: df.sketch_medians(
+                d.get("duration_sketches"), pair, d.get("duration_sketches")["periods"], "month", period
+            )
+        ),
+        (
+            "median_duration_day", "exact",
+            lambda d: lambda: df.median_duration_day(d.get("time_diff"), date_var, ["Placement", "Customer"], period)
+        ),
+        (
+            "median_duration_month", "exact",
+            lambda d: lambda: df.median_duration_month(d.get("lu_time_diff"), date_var, period, month)
+        ),
+        ("get_min_max_duration", "month", lambda d: lambda: df.get_min_max_duration(d.get("time_diff"))),
+        ("estimate_actual", "exact", lambda d: lambda: df.estimate_actual(d.get("orders_month"), period)),
+        (
+            "estimate_actual_figure", "month",
+            lambda d: lambda: df.estimate_actual_figure(
+                DataFrame({"day": [1, 2, 1, 2], "type": ["Actual"] * 2 + ["Estimated"] * 2, "median_day": [1.0] * 4}),
+                period
+            )
+        ),
+
+        # logic/seller_function.py
+        ("seller_count", "month", lambda d: lambda: sf.seller_count(d.get("sellers"), date_var, month)),
+        (
+            "build_seller_deadline_cube", "sellers",
+            lambda d: lambda: sf.build_seller_deadline_cube(d.get("sellers"), date_var)
+        ),
+        (
+            "month_seller_deadline", "month",
+            lambda d: lambda: sf.month_seller_deadline(d.get("seller_deadline_cube"), month)
+        ),
+        (
+            "top_seller_codes", "top_100",
+            lambda d: lambda: sf.top_seller_codes(
+                d.get("seller_deadline"), d.get("seller_deadline_cube")["seller_ids"], 100
+            )
+        ),
+        (
+            "top_sellers_order_deadline", "top_5",
+            lambda d: lambda: sf.top_sellers_order_deadline(d.get("sellers"), date_var, month, 5)
+        ),
+        (
+            "top_sellers_order_deadline", "top_5_month_cached",
+            lambda d: lambda: sf.top_sellers_order_deadline(
+                None, date_var, month, 5, d.get("seller_deadline_cube"), d.get("seller_deadline")
+            )
+        ),
+        (
+            "seller_deadline_ranking", "month",
+            lambda d: lambda: sf.seller_deadline_ranking(d.get("seller_deadline_cube"), d.get("seller_deadline"))
+        ),
+    ]
+
+
+def time_call(func, min_time: float=0.2, max_repeat: int=10) -> list:
+    """
+    :return the wall times (seconds) of repeated calls, until `min_time` has passed or `max_repeat` calls.
+    """
+    times = []
+    while len(times) < max_repeat and sum(times) < min_time:
+        start = perf_counter()
+        func()
+        times.append(perf_counter() - start)
+
+    return times
+
+
+def peak_memory(func) -> int:
+    """
+    :return the peak memory (bytes) allocated while the function runs.
+    """
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmarks(data_dir: str, scales: list, only: list=None) -> dict:
+    """
+    :params
+    data_dir: directory with the orders.csv, customers.csv and item_seller.csv files.
+    scales: the data scales to run.
+    only: names of the functions to run (all when None).
+
+    :return a dictionary with the run metadata and a list of results.
+    """
+    cases = [case for case in benchmark_cases() if only is None or case[0] in only]
+    results = []
+
+    for scale in scales:
+        bench_data = BenchData(data_dir, scale)
+
+        for function_name, case_name, setup in cases:
+            func = setup(bench_data)
+            # Warm up (also builds the lazy inputs, outside of the measurements).
+            func()
+
+            times = time_call(func)
+            results.append({
+                "function": function_name,
+                "case": case_name,
+                "scale": scale,
+                "rows": len(bench_data.get("orders_raw")),
+                "repeat": len(times),
+                "wall_time_min_s": min(times),
+                "wall_time_median_s": median(times),
+                "peak_memory_bytes": peak_memory(func)
+            })
+            print(f"{scale:>4}x {function_name:<28} {case_name:<16} {median(times) * 1000:>10.3f} ms")
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "pandas": pandas.__version__,
+            "numpy": numpy.__version__,
+            "platform": platform.platform(),
+            "scales": scales
+        },
+        "results": results
+    }
+
+
+def uncovered_functions() -> list:
+    """
+    :return the public functions of the benchmarked modules that have no benchmark case.
+    """
+    covered = {case[0] for case in benchmark_cases()}
+    uncovered = []
+
+    for module in benchmarked_modules:
+        for name, func in getmembers(module, isfunction):
+            if func.__module__ == module.__name__ and not name.startswith("_") and name not in covered:
+                uncovered.append(f"{module.__name__}.{name}")
+
+    return uncovered
+
+
+def compare_results(previous: dict, current: dict) -> list:
+    """
+    :return a list of (function, case, scale, previous median, current median, ratio) for the cases in both runs.
+    """
+    previous_times = {
+        (r["function"], r["case"], r["scale"]): r["wall_time_median_s"] for r in previous["results"]
+    }
+    comparison = []
+
+    for r in current["results"]:
+        key = (r["function"], r["case"], r["scale"])
+        if key in previous_times:
+            ratio = r["wall_time_median_s"] / previous_times[key] if previous_times[key] > 0 else float("nan")
+            comparison.append((*key, previous_times[key], r["wall_time_median_s"], ratio))
+
+    return comparison
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark the logic/ functions.")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--only", nargs="+", default=None, help="function names to run")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", default=None, help="results json of a previous run")
+    args = parser.parse_args()
+
+    # plotly express deprecation warnings would bury the results.
+    warnings.simplefilter("ignore", FutureWarning)
+
+    for name in uncovered_functions():
+        print(f"warning: no benchmark case for {name}")
+
+    bench_results = run_benchmarks(args.data_dir, args.scales, args.only)
+
+    with open(args.output, "w") as output_file:
+        dump(bench_results, output_file, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as previous_file:
+            previous_results = load(previous_file)
+
+        print(f"\n{'function':<28} {'case':<16} {'scale':>5} {'before ms':>10} {'after ms':>10} {'ratio':>7}")
+        for function_name, case_name, scale, before, after, ratio in compare_results(previous_results, bench_results):
+            print(f"{function_name:<28} {case_name:<16} {scale:>5} {before * 1000:>10.3f} {after * 1000:>10.3f} {ratio:>7.2f}")
@@ -0,0 +1,301 @@
+"""
+Synthetic orders.csv, customers.csv and item_seller.csv at any scale, for load tests and benchmarks.
+
+The tables have the columns `clean_date` expects, with distributions close to the source data: the
+order status mix, the gaps between the delivery phases, repeat customers and the number of items and
+sellers per order. Orders are generated and written in chunks, so memory use does not grow with the
+number of orders, and the output is the same for the same seed and chunk size.
+
+usage (from the repository root):
+    python -m benchmarks.generate_data --orders 1000000 --years 3 --output-dir data/synthetic
+    python -m benchmarks.generate_data --orders 50000000 --format parquet --output-dir data/synthetic
+"""
+from argparse import ArgumentParser
+from os import makedirs
+from os.path import join
+
+import numpy as np
+from pandas import DataFrame, Timestamp
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # Without pyarrow only csv files can be written.
+    pa = pq = None
+
+
+# Order status mix of the source data.
+order_status_weights = {
+    "delivered": 0.9702,
+    "shipped": 0.0111,
+    "canceled": 0.0063,
+    "unavailable": 0.0061,
+    "invoiced": 0.0032,
+    "processing": 0.0030,
+    "created": 0.0001
+}
+
+# Statuses of orders that never reached the carrier.
+not_shipped_status = ["canceled", "unavailable", "invoiced", "processing", "created"]
+
+# Share of orders placed in each hour of the day.
+hour_weights = np.array([
+    2.4, 1.1, 0.5, 0.3, 0.2, 0.2, 0.5, 1.2, 3.0, 4.8, 6.2, 6.6,
+    6.0, 6.5, 6.7, 6.4, 6.3, 5.9, 5.8, 5.9, 6.3, 6.2, 5.8, 4.2
+])
+
+# (median, sigma) of the lognormal gaps between the phases, in seconds.
+approval_gap = (20 * 60, 1.6)
+carrier_gap = (2 * 86400, 0.8)
+customer_gap = (7 * 86400, 0.6)
+
+# Days between the purchase and the estimated delivery date.
+estimated_days = (23, 8.8)
+# Days between the approval and the seller shipping limit.
+shipping_limit_days = (6, 2)
+
+# Number of items in an order.
+items_per_order = np.arange(1, 7)
+items_per_order_weights = np.array([0.9, 0.075, 0.015, 0.006, 0.003, 0.001])
+
+repeat_customer_rate = 0.03
+# Share of the extra items of an order sold by another seller.
+other_seller_rate = 0.1
+orders_per_seller = 32
+# Higher values concentrate the orders on fewer sellers.
+seller_skew = 3.0
+
+date_format = "%Y-%m-%d %H:%M:%S"
+
+# Salts of the id hashes of each entity.
+id_salts = {"order": 1, "customer": 2, "seller": 3}
+
+hex_digits = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+
+
+def mix64(values: np.ndarray) -> np.ndarray:
+    """
+    :return the splitmix64 hash of an array of unsigned 64 bit integers.
+    """
+    with np.errstate(over="ignore"):
+        z = values + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def hex_ids(index: np.ndarray, entity: str, seed: int) -> np.ndarray:
+    """
+    :params
+    index: integer index of every entity.
+    entity: either ['order', 'customer', 'seller'].
+    seed: the generator seed.
+
+    :return an array of 32 character hex ids (like the source data ids), one per index.
+    """
+    salt = np.uint64((seed << 8) + id_salts[entity])
+    high = mix64(index.astype(np.uint64) ^ mix64(np.array([salt]))[0])
+    low = mix64(high ^ salt)
+
+    words = np.stack([high, low], axis=1).astype(">u8").view(np.uint8).reshape(-1, 16)
+    digits = np.empty((len(index), 32), dtype=np.uint8)
+    digits[:, 0::2] = hex_digits[words >> 4]
+    digits[:, 1::2] = hex_digits[words & 15]
+
+    return digits.view("S32").ravel().astype("U32")
+
+
+def lognormal_seconds(rng: np.random.Generator, gap: tuple, size: int) -> np.ndarray:
+    """
+    :return an array of timedelta64[s] gaps drawn from a lognormal distribution with the (median, sigma) `gap`.
+    """
+    median, sigma = gap
+    return rng.lognormal(np.log(median), sigma, size).astype("int64").astype("timedelta64[s]")
+
+
+def purchase_timestamps(rng: np.random.Generator, size: int, start: Timestamp, years: int, growth: float) -> np.ndarray:
+    """
+    :params
+    rng: the chunk's random generator.
+    size: number of timestamps.
+    start: the first day of the data.
+    years: number of years of data.
+    growth: order volume of the last day relative to the first day (volume grows linearly).
+
+    :return an array of datetime64[s] purchase timestamps.
+    """
+    days = 365 * years
+
+    # Inverse of the cumulative distribution of a linearly growing volume.
+    u = rng.random(size)
+    a = (growth - 1) / 2
+    position = u if a == 0 else (np.sqrt(1 + 4 * a * (1 + a) * u) - 1) / (2 * a)
+
+    day = np.minimum((position * days).astype("int64"), days - 1)
+    hour = rng.choice(24, size, p=hour_weights / hour_weights.sum())
+    second = rng.integers(0, 3600, size)
+
+    return (
+        np.datetime64(start.date(), "s")
+        + day.astype("timedelta64[D]")
+        + hour.astype("timedelta64[h]")
+        + second.astype("timedelta64[s]")
+    )
+
+
+def generate_chunk(first_order: int, size: int, seed: int, start: Timestamp, years: int, growth: float) -> dict:
+    """
+    :params
+    first_order: index of the first order of the chunk.
+    size: number of orders in the chunk.
+    seed: the generator seed.
+    start: the first day of the data.
+    years: number of years of data.
+    growth: order volume of the last day relative to the first day.
+
+    :return a dictionary of {'orders', 'customers', 'item_seller'} dataframes.
+    """
+    rng = np.random.default_rng([seed, first_order])
+    order_index = np.arange(first_order, first_order + size)
+
+    # Orders ------------------------------------------------------------------------------------------
+    status = rng.choice(
+        list(order_status_weights), size, p=np.array(list(order_status_weights.values())) / sum(order_status_weights.values())
+    )
+    purchase = purchase_timestamps(rng, size, start, years, growth)
+    approved = purchase + lognormal_seconds(rng, approval_gap, size)
+    carrier = approved + lognormal_seconds(rng, carrier_gap, size)
+    customer = carrier + lognormal_seconds(rng, customer_gap, size)
+    estimated = (
+        purchase.astype("datetime64[D]")
+        + np.maximum(rng.normal(*estimated_days, size).round(), 2).astype("timedelta64[D]")
+    ).astype("datetime64[s]")
+
+    not_shipped = np.isin(status, not_shipped_status)
+    approved[status == "created"] = np.datetime64("NaT")
+    carrier[not_shipped] = np.datetime64("NaT")
+    customer[not_shipped | (status == "shipped")] = np.datetime64("NaT")
+
+    order_ids = hex_ids(order_index, "order", seed)
+    orders_df = DataFrame({
+        "order_id": order_ids,
+        "order_status": status,
+        "order_purchase_timestamp": purchase,
+        "order_approved_at": approved,
+        "order_delivered_carrier_date": carrier,
+        "order_delivered_customer_date": customer,
+        "order_estimated_delivery_date": estimated
+    })
+
+    # Customers (one row per order, some customers order again) ---------------------------------------
+    repeat = rng.random(size) < repeat_customer_rate
+    customer_index = np.where(repeat, rng.integers(0, np.maximum(order_index, 1)), order_index)
+    customers_df = DataFrame({
+        "order_purchase_timestamp": purchase,
+        "customer_unique_id": hex_ids(customer_index, "customer", seed)
+    })
+
+    # Items and sellers -------------------------------------------------------------------------------
+    seller_count = max(1, (first_order + size) // orders_per_seller)
+    item_count = rng.choice(items_per_order, size, p=items_per_order_weights)
+    item_order = np.repeat(np.arange(size), item_count)
+
+    order_seller = (seller_count * rng.random(size) ** seller_skew).astype("int64")
+    other_seller = (seller_count * rng.random(len(item_order)) ** seller_skew).astype("int64")
+    # The first item of an order is always sold by the order's seller.
+    first_item = np.r_[True, item_order[1:] != item_order[:-1]]
+    item_seller = np.where(
+        first_item | (rng.random(len(item_order)) >= other_seller_rate), order_seller[item_order], other_seller
+    )
+
+    limit_from = np.where(np.isnat(approved), purchase, approved)[item_order]
+    shipping_limit = limit_from + (
+        np.maximum(rng.normal(*shipping_limit_days, len(item_order)), 1) * 86400
+    ).astype("int64").astype("timedelta64[s]")
+
+    item_seller_df = DataFrame({
+        "order_id": order_ids[item_order],
+        "seller_id": hex_ids(item_seller, "seller", seed),
+        "shipping_limit_date": shipping_limit,
+        "order_purchase_timestamp": purchase[item_order],
+        "order_delivered_customer_date": customer[item_order]
+    })
+
+    return {"orders": orders_df, "customers": customers_df, "item_seller": item_seller_df}
+
+
+def generate_data(
+        orders: int,
+        output_dir: str,
+        file_format: str="csv",
+        seed: int=0,
+        start: str="2016-09-01",
+        years: int=3,
+        growth: float=3.0,
+        chunk_size: int=1_000_000
+    ) -> dict:
+    """
+    :params
+    orders: number of orders.
+    output_dir: directory the files are written to.
+    file_format: either ['csv', 'parquet'].
+    seed: the generator seed, the same seed and chunk size always give the same data.
+    start: the first day of the data.
+    years: number of years of data.
+    growth: order volume of the last day relative to the first day.
+    chunk_size: number of orders generated and written at a time.
+
+    :return a dictionary of {table name: number of rows written}.
+    """
+    if file_format == "parquet" and pq is None:
+        raise ImportError("pyarrow is required to write parquet files.")
+
+    makedirs(output_dir, exist_ok=True)
+    start = Timestamp(start)
+    row_counts = {"orders": 0, "customers": 0, "item_seller": 0}
+    writers = {}
+
+    try:
+        for first_order in range(0, orders, chunk_size):
+            chunk = generate_chunk(first_order, min(chunk_size, orders - first_order), seed, start, years, growth)
+
+            for name, chunk_df in chunk.items():
+                path = join(output_dir, f"{name}.{file_format}")
+
+                if file_format == "csv":
+                    chunk_df.to_csv(
+                        path, mode="w" if first_order == 0 else "a", header=first_order == 0,
+                        index=False, date_format=date_format
+                    )
+                else:
+                    table = pa.Table.from_pandas(chunk_df, preserve_index=False)
+                    if name not in writers:
+                        writers[name] = pq.ParquetWriter(path, table.schema)
+                    writers[name].write_table(table)
+
+                row_counts[name] += len(chunk_df)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return row_counts
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Generate synthetic orders, customers and item_seller data.")
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--output-dir", default="data/synthetic")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start", default="2016-09-01")
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--growth", type=float, default=3.0)
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    written = generate_data(
+        args.orders, args.output_dir, args.format, args.seed, args.start, args.years, args.growth, args.chunk_size
+    )
+    for table_name, rows in written.items():
+        print(f"{table_name}: {rows:,} rows")
@@ -5,152 +5,284 @@ from dash.exceptions import PreventUpdate
 from pandas import read_json
 from io import StringIO
 
-from components.utils import delivery_phase, default_date_variable
+from components.utils import default_date_variable, exact_duration_medians, data_backend
+from components.period_callback import data_view
 from logic.duration_function import *
-from logic.global_function import clean_date, filter_month
+from logic.global_function import clean_date, filter_month, select_periods
+from logic.data_registry import resolve_dataset, get_derived
+from logic.figure_cache import cached_figure
+from logic import sql_function
+from logic.sql_function import use_sql_backend
 
 
 
 
-def valid_phase_options(from_phase_value: str, to_phase_value: str) -> tuple:
+def filter_month_data(data_dict: dict, month: str, leading_up_to_month: bool=False, year: int=None):
     """ 
     """
-    if from_phase_value is not None and to_phase_value is not None:
-        first_data = [data for data in delivery_phase if data != to_phase_value]
-        second_data = [data for data in delivery_phase if data != from_phase_value]
+    data_res = resolve_dataset(data_dict)
+    if data_res["error"]:
+        raise PreventUpdate
 
-        return (first_data, second_data)
-    else:
+    flt_dict = filter_month(
+        clean_date(data_res["data"], "orders"),
+        default_date_variable,
+        month,
+        leading_up_to_month, 
+        True,
+        year
+    )
+
+    if flt_dict["error"]:
         raise PreventUpdate
+    else:
+        return flt_dict["data"]
 
 
-def update_bc_style(from_phase_value: str, to_phase_value: str) -> tuple:
+def filter_time_diff(
+        data_dict: dict, 
+        month: str, 
+        from_phase: str, 
+        to_phase: str, 
+        period: str, 
+        leading_up_to_month: bool=False, 
+        year: int=None
+    ):
     """ 
     """
-    if from_phase_value is not None and to_phase_value is not None:
-        output_tuple = ()
-        for phase in delivery_phase:
-            el_class = f"{'dp-bc_item'} active" if phase in [from_phase_value, to_phase_value] else "dp-bc_item"
-            output_tuple = output_tuple + (el_class,)
+    # Every phase to phase duration of the data snapshot
+    matrix_res = get_derived(data_dict, "duration_matrix", build_duration_matrix)
+    if matrix_res["error"]:
+        raise PreventUpdate
 
-        return output_tuple
-    else:
+    phase_list = arrange_selection(from_phase, to_phase)
+    # Create date difference for the filtered month(s)
+    time_diff_dict = create_time_diff(
+        filter_month_data(data_dict, month, leading_up_to_month, year),
+        phase_list[0],
+        phase_list[1],
+        period,
+        matrix_res["data"]
+    )
+
+    if time_diff_dict["error"]:
         raise PreventUpdate
+    else:
+        return time_diff_dict["data"]
 
 
-def store_date_diff_data(data_dict: dict, month: str, from_phase: str, to_phase: str, period) -> tuple:
+def update_ut_table(data_dict: dict, month: str, from_phase: str, to_phase: str, year: int=None) -> tuple:
     """ 
     """
-    if data_dict != {}:        
-        # Filter only the selected month
-        flt_dict = filter_month(
-            clean_date(DataFrame(data_dict), "orders"),
-            default_date_variable,
-            month,
-            False, 
-            True
-        )
-        
-        if flt_dict["error"]:
-            raise PreventUpdate
-        else:
-            phase_list = arrange_selection(from_phase, to_phase)
-            # Create date difference for filtered month
-            time_diff_dict = create_time_diff(
-                flt_dict["data"],
-                phase_list[0],
-                phase_list[1],
-                period
+    if data_dict != {}:
+        pair = tuple(arrange_selection(from_phase, to_phase))
+
+        if use_sql_backend(data_backend):
+            # Classified and counted by the embedded database
+            histogram = sql_function.unit_time_histogram(
+                data_dict["data_type"], default_date_variable, *pair, month, year, data_dict.get("date_range")
             )
-            
-            if time_diff_dict["error"]:
+        else:
+            matrix_res = get_derived(data_dict, "duration_matrix", build_duration_matrix)
+            if matrix_res["error"]:
                 raise PreventUpdate
-            else:
-                return (
-                    flt_dict["data"].to_dict('records'),
-                    time_diff_dict["data"].to_dict('records')
-                )
+
+            # Unit of time codes of the selected month, read from the duration matrix.
+            phase_durations = matrix_res["data"][pair]
+            row_positions = filter_month_data(data_dict, month, year=year).index.to_numpy()
+            histogram = unit_time_histogram(phase_durations["unit_time"][row_positions])
+
+        count_tuple = tuple(f"{count:,}" for count in histogram["count"].tolist())
+        percent_tuple = tuple(histogram["percentage"].tolist())
+
+        return count_tuple + percent_tuple
     else:
         raise PreventUpdate
+    
 
+def get_duration_sketches(data_dict: dict) -> dict:
+    """ 
+    """
+    matrix_res = get_derived(data_dict, "duration_matrix", build_duration_matrix)
+    if matrix_res["error"]:
+        raise PreventUpdate
 
-def update_ut_table(data_dict: dict) -> tuple:
+    sketch_res = get_derived(
+        data_dict, 
+        "duration_sketches", 
+        lambda df: build_duration_sketches(df, matrix_res["data"], default_date_variable)
+    )
+    if sketch_res["error"]:
+        raise PreventUpdate
+    else:
+        return sketch_res["data"]
+
+
+def prepare_duration_data(data_dict: dict, date_range: list) -> dict:
     """ 
+    Register the data view of the selected date range and build the structures the duration charts read
+    from it. Background jobs run in a forked process, so whatever they build is lost when the job ends.
+
+    :params
+    data_dict: the orders data handle.
+    date_range: the selected [first day, last day] (DateRangePicker value).
+
+    :return the handle of the data view.
     """
     if data_dict != {}:
-        ut_dict = unit_of_time(DataFrame(data_dict))
+        view_dict = data_view(data_dict, date_range)
 
-        if ut_dict["error"]["type"]:
-            raise PreventUpdate
-        else:
-            count_tuple = ()
-            percent_tuple = ()
-            for idx in range(4):
-                count_tuple = count_tuple + (f"{ut_dict['count'][idx]:,}", )
-                percent_tuple = percent_tuple + (ut_dict['percentage'][idx], )
-
-            all_output = count_tuple + percent_tuple
-            return all_output
+        if not use_sql_backend(data_backend):
+            if exact_duration_medians:
+                matrix_res = get_derived(view_dict, "duration_matrix", build_duration_matrix)
+                if matrix_res["error"]:
+                    raise PreventUpdate
+            else:
+                get_duration_sketches(view_dict)
+
+        return view_dict
     else:
         raise PreventUpdate
-    
 
-def update_median_day_chart(diff_data_dict: dict, from_phase: str, to_phase: str, period: str) -> tuple:
+
+def sketch_summary(
+        data_dict: dict, 
+        pair: tuple, 
+        month: str, 
+        group_by: str, 
+        period: str, 
+        leading_up_to_month: bool=False, 
+        year: int=None
+    ):
+    """ 
+    """
+    duration_sketches = get_duration_sketches(data_dict)
+    periods = select_periods(duration_sketches["periods"], month, leading_up_to_month, True, year)
+
+    return sketch_medians(duration_sketches, pair, periods, group_by, period)
+
+
+def update_median_day_chart(data_dict: dict, month: str, from_phase: str, to_phase: str, period: str, year: int=None):
     """ 
     """
-    if diff_data_dict != {}:
-        func_data = clean_date(DataFrame(diff_data_dict), "orders")
+    if data_dict != {}:
         phase_diff_cols = arrange_selection(from_phase, to_phase, labels=True)
 
-        return median_duration_day(func_data, default_date_variable, phase_diff_cols, period)
+        def build_figure():
+            if use_sql_backend(data_backend):
+                return sql_function.median_duration_day(
+                    data_dict["data_type"], 
+                    default_date_variable, 
+                    tuple(arrange_selection(from_phase, to_phase)), 
+                    phase_diff_cols, 
+                    period, 
+                    month, 
+                    year, 
+                    data_dict.get("date_range")
+                )
+            elif exact_duration_medians:
+                return median_duration_day(
+                    filter_time_diff(data_dict, month, from_phase, to_phase, period, year=year), 
+                    default_date_variable, 
+                    phase_diff_cols, 
+                    period
+                )
+            else:
+                pair = tuple(arrange_selection(from_phase, to_phase))
+                return median_duration_day(
+                    None, 
+                    default_date_variable, 
+                    phase_diff_cols, 
+                    period, 
+                    sketch_summary(data_dict, pair, month, "day", period, year=year)
+                )
+
+        return cached_figure(
+            data_dict["snapshot_id"], "median_duration_day", 
+            (month, year, from_phase, to_phase, period, exact_duration_medians, data_backend), 
+            build_figure
+        )
     else:
         raise PreventUpdate
 
 
-def update_median_month_chart(lu_data_dict: dict, month: str, from_phase: str, to_phase: str, period: str):
+def update_median_month_chart(
+        lu_data_dict: dict, 
+        month: str, 
+        from_phase: str, 
+        to_phase: str, 
+        period: str, 
+        year: int=None
+    ):
     """ 
     """
     if lu_data_dict != {}:
-        # Filter the all months leading up to the selected month
-        lu_flt_dict = filter_month(
-            clean_date(DataFrame(lu_data_dict), "orders"),
-            default_date_variable,
-            month,
-            True, 
-            True
-        )
 
-        if lu_flt_dict["error"]:
-            raise PreventUpdate
-        else:
-            phase_list = arrange_selection(from_phase, to_phase)
-            # Create date difference for all available months
-            lu_time_diff_dict = create_time_diff(
-                lu_flt_dict["data"],
-                phase_list[0],
-                phase_list[1],
-                period
-            )
-
-            if lu_time_diff_dict["error"]:
-                raise PreventUpdate
-            else:
+        def build_figure():
+            if use_sql_backend(data_backend):
+                return sql_function.median_duration_month(
+                    lu_data_dict["data_type"], 
+                    default_date_variable, 
+                    tuple(arrange_selection(from_phase, to_phase)), 
+                    period, 
+                    month, 
+                    year, 
+                    lu_data_dict.get("date_range")
+                )
+            elif exact_duration_medians:
+                # Date difference for all the months leading up to the selected month
                 return median_duration_month(
-                    lu_time_diff_dict["data"], 
+                    filter_time_diff(lu_data_dict, month, from_phase, to_phase, period, True, year), 
                     default_date_variable, 
                     period,
                     month
                 )
+            else:
+                pair = tuple(arrange_selection(from_phase, to_phase))
+                return median_duration_month(
+                    None, 
+                    default_date_variable, 
+                    period, 
+                    month, 
+                    sketch_summary(lu_data_dict, pair, month, "month", period, True, year)
+                )
+
+        return cached_figure(
+            lu_data_dict["snapshot_id"], "median_duration_month", 
+            (month, year, from_phase, to_phase, period, exact_duration_medians, data_backend), 
+            build_figure
+        )
     else:
         raise PreventUpdate
     
 
-def update_actual_estimated_chart(data_dict: dict, period: str):
+def update_actual_estimated_chart(data_dict: dict, month: str, period: str, year: int=None):
     """ 
     """
 
     if data_dict != {}:
 
-        return estimate_actual(clean_date(DataFrame(data_dict), "orders"), period)
+        def build_figure():
+            if use_sql_backend(data_backend):
+                return sql_function.estimate_actual(
+                    data_dict["data_type"], default_date_variable, period, month, year, data_dict.get("date_range")
+                )
+            elif exact_duration_medians:
+                return estimate_actual(filter_month_data(data_dict, month, year=year), period)
+            else:
+                actual_df = sketch_summary(
+                    data_dict, tuple(arrange_selection("placement", "customer")), month, "day", period, year=year
+                )
+                estimate_df = sketch_summary(data_dict, estimate_pair, month, "day", period, year=year)
+
+                summary_df = (
+                    estimate_df.rename(columns={"period": "Estimated"})
+                    .merge(actual_df.rename(columns={"period": "Actual"}), on="day", how="outer")
+                )
+                return estimate_actual(None, period, summary_df)
+
+        return cached_figure(
+            data_dict["snapshot_id"], "estimate_actual", (month, year, period, exact_duration_medians, data_backend), build_figure
+        )
     else:
-        raise PreventUpdate
\ No newline at end of file
+        raise PreventUpdate
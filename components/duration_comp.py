@@ -192,6 +192,18 @@ def figure_output_ui(chart_id: str, period_value: str="hour"):
                 className="dp-chart-settings_container"
             ),
 
+            # Shown while the chart is computed in the background.
+            dmc.Progress(
+                id=f"{chart_id}_progress",
+                value=100,
+                striped=True,
+                animate=True,
+                size="xs",
+                color="teal",
+                className="dp-chart-progress",
+                style={"visibility": "hidden"}
+            ),
+
             dcc.Graph(id=chart_id, config=config_plotly, style={'height': "350px"}),
         ],
         className="dp-chart"
@@ -45,13 +45,13 @@ def status_summary():
                     DashIconify(icon="fluent-mdl2:navigate-external-inline", color=default_color, height=25),
                     size="lg",
                     variant="light",
-                    id=f"{modal_id}_trigger",
+                    id={"type": "status_modal_trigger", "status": modal_id},
                     color=DEFAULT_COLORS["teal"][0]
                 ),
 
                 dmc.Modal(
                     # title="",
-                    id=f"{modal_id}_modal",
+                    id={"type": "status_modal", "status": modal_id},
                     zIndex=10000,
                     size="lg",
                     children=[
@@ -61,7 +61,7 @@ def status_summary():
                                 html.Div(
                                     [
                                         dcc.Graph(
-                                            id=f"{modal_id}_month_chart", 
+                                            id={"type": "status_month_chart", "status": modal_id}, 
                                             config=config_plotly, 
                                             style={'height': "400px"}
                                         )
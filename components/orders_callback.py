@@ -4,41 +4,104 @@ from dash_iconify import DashIconify
 from dash_mantine_components.theme import DEFAULT_COLORS
 
 from logic.global_function import filter_month, clean_date
+from logic.data_registry import resolve_dataset, get_derived
+from logic.figure_cache import cached_figure
 from logic.order_function import *
-from components.utils import month_abbrev, default_date_variable, default_color, delivery_status
+from logic import sql_function
+from logic.sql_function import use_sql_backend
+from logic import polars_function
+from logic.polars_function import use_polars_backend, get_lazy_frame
+from components.utils import month_abbrev, default_date_variable, default_color, delivery_status, data_backend
 
 
-def filter_single_month(data_dict: dict, month: str):
+def filter_single_month(data_dict: dict, month: str, year: int=None) -> DataFrame:
     """ 
     """
 
     if data_dict != {}:
+        data_res = resolve_dataset(data_dict)
+        if data_res["error"]:
+            raise PreventUpdate
+
         selected_month = filter_month(
-            clean_date(DataFrame(data_dict), "orders"),
+            clean_date(data_res["data"], "orders"),
             date_var=default_date_variable,
             month_name=month,
             leading_up_to_month=False,
-            drop_prev_year=True
+            drop_prev_year=True,
+            year=year
         )
 
         if selected_month["error"]:
             raise PreventUpdate
         else:
-            return selected_month["data"].to_dict("records")
+            return selected_month["data"]
     else:
         raise PreventUpdate
 
 
+def update_orders_page(orders_dict: dict, customer_dict: dict, month: str, year: int=None) -> tuple:
+    """ 
+    Every output of the Orders page from a single filtered view of the selected month.
+    """
+    # The selected month view is shared by the charts and the status counts, the embedded database 
+    # aggregates them from its own table.
+    single_month_df = None if use_sql_backend(data_backend) else filter_single_month(orders_dict, month, year)
+
+    return (
+        update_count_stats(orders_dict, month, "orders", year)
+        + update_count_stats(customer_dict, month, "customer", year)
+        + update_months_values(orders_dict, month, year)
+        + update_chart_callback(orders_dict, single_month_df, month, year)
+        + update_status_count(orders_dict, single_month_df, month, year)
+    )
+
 
-def update_count_stats(data_dict: dict, month: str, output_type: str) -> tuple:
+
+def update_count_stats(data_dict: dict, month: str, output_type: str, year: int=None) -> tuple:
     """ 
     """
 
     if data_dict != {}:
-        # Convert to pandas dataframe
-        func_df = clean_date(DataFrame(data_dict), output_type)
-        # Get stats numbers 
-        stats_dict = get_stats_numbers(func_df, default_date_variable, month, output_type)
+        if use_sql_backend(data_backend):
+            # Counted by the embedded database
+            stats_dict = sql_function.get_stats_numbers(
+                data_dict["data_type"], default_date_variable, month, output_type, year, data_dict.get("date_range")
+            )
+        elif use_polars_backend(data_backend):
+            # Counted on the lazy frame of the data snapshot
+            frame_res = get_lazy_frame(data_dict)
+            if frame_res["error"]:
+                raise PreventUpdate
+
+            stats_dict = polars_function.get_stats_numbers(
+                frame_res["data"], default_date_variable, month, output_type, year
+            )
+        else:
+            # Get the registered pandas dataframe
+            data_res = resolve_dataset(data_dict)
+            if data_res["error"]:
+                raise PreventUpdate
+
+            func_df = clean_date(data_res["data"], output_type)
+            # Monthly counts of the data snapshot
+            cube_res = get_derived(data_dict, "kpi_cube", lambda df: build_kpi_cube(df, default_date_variable))
+            if cube_res["error"]:
+                raise PreventUpdate
+
+            customer_bitmaps = None
+            if output_type == "customer":
+                bitmap_res = get_derived(
+                    data_dict, "customer_bitmaps", lambda df: build_customer_bitmaps(df, default_date_variable)
+                )
+                if bitmap_res["error"]:
+                    raise PreventUpdate
+                customer_bitmaps = bitmap_res["data"]
+
+            # Get stats numbers 
+            stats_dict = get_stats_numbers(
+                func_df, default_date_variable, month, output_type, cube_res["data"], customer_bitmaps, year
+            )
             
         # Check for error while getting the stats
         if stats_dict["error"]:
@@ -75,14 +138,35 @@ def update_count_stats(data_dict: dict, month: str, output_type: str) -> tuple:
         raise PreventUpdate
 
 
-def update_months_values(data_dict: dict, month: str) -> tuple:
+def update_months_values(data_dict: dict, month: str, year: int=None) -> tuple:
     """ 
     """
     if data_dict != {}:
-        # Convert to pandas dataframe
-        func_df = clean_date(DataFrame(data_dict), "orders")
+        if use_sql_backend(data_backend):
+            # Counted by the embedded database
+            month_dict = sql_function.month_stats(
+                data_dict["data_type"], default_date_variable, month, year, data_dict.get("date_range")
+            )
+        elif use_polars_backend(data_backend):
+            # Counted on the lazy frame of the data snapshot
+            frame_res = get_lazy_frame(data_dict)
+            if frame_res["error"]:
+                raise PreventUpdate
+
+            month_dict = polars_function.month_stats(frame_res["data"], default_date_variable, month, year)
+        else:
+            # Get the registered pandas dataframe
+            data_res = resolve_dataset(data_dict)
+            if data_res["error"]:
+                raise PreventUpdate
+
+            func_df = clean_date(data_res["data"], "orders")
+            # Monthly counts of the data snapshot
+            cube_res = get_derived(data_dict, "kpi_cube", lambda df: build_kpi_cube(df, default_date_variable))
+            if cube_res["error"]:
+                raise PreventUpdate
 
-        month_dict = month_stats(func_df, default_date_variable, month)
+            month_dict = month_stats(func_df, default_date_variable, month, cube_res["data"], year)
 
         # Check for error while getting the stats
         if month_dict["error"]:
@@ -110,68 +194,107 @@ def update_months_values(data_dict: dict, month: str) -> tuple:
         raise PreventUpdate
 
 
-def update_chart_callback(data_dict: dict, single_month_dict: dict, month: str): # ~/
+def update_chart_callback(data_dict: dict, single_month_df: DataFrame, month: str, year: int=None): # ~/
     """ 
     """
 
     if data_dict != {}:
-        # Convert to pandas dataframe
-        func_df = clean_date(DataFrame(data_dict), "orders")
+        snapshot_id = data_dict["snapshot_id"]
+
+        if use_sql_backend(data_backend):
+            # Aggregated by the embedded database
+            table, date_range = data_dict["data_type"], data_dict.get("date_range")
+
+            return (
+                cached_figure(
+                    snapshot_id, "monthly_order_volume", (month, year, "line"),
+                    lambda: sql_function.monthly_order_volume(
+                        table, default_date_variable, month, "line", year, date_range
+                    )
+                ),
+                cached_figure(
+                    snapshot_id, "get_week_volume", (month, year),
+                    lambda: sql_function.get_week_volume(table, default_date_variable, month, year, date_range)
+                ),
+                cached_figure(
+                    snapshot_id, "daily_order_volume", (month, year),
+                    lambda: sql_function.daily_order_volume(table, default_date_variable, month, year, date_range)
+                )
+            )
+
+        # Get the registered pandas dataframe
+        data_res = resolve_dataset(data_dict)
+        if data_res["error"]:
+            raise PreventUpdate
 
-        # Filter selected month data
-        single_month_func_df = clean_date(DataFrame(single_month_dict), "orders")
-        # data_dict = filter_month(func_df, default_date_variable, month, False, True)
+        func_df = clean_date(data_res["data"], "orders")
+        # Monthly counts of the data snapshot
+        cube_res = get_derived(data_dict, "kpi_cube", lambda df: build_kpi_cube(df, default_date_variable))
+        if cube_res["error"]:
+            raise PreventUpdate
 
         return (
-            monthly_order_volume(func_df, default_date_variable, month, "line"),
-            get_week_volume(single_month_func_df, default_date_variable, month),
-            daily_order_volume(single_month_func_df, default_date_variable, month)
+            cached_figure(
+                snapshot_id, "monthly_order_volume", (month, year, "line"),
+                lambda: monthly_order_volume(func_df, default_date_variable, month, "line", year, cube_res["data"])
+            ),
+            cached_figure(
+                snapshot_id, "get_week_volume", (month, year),
+                lambda: get_week_volume(single_month_df, default_date_variable, month)
+            ),
+            cached_figure(
+                snapshot_id, "daily_order_volume", (month, year),
+                lambda: daily_order_volume(single_month_df, default_date_variable, month)
+            )
         )
     else:
         raise PreventUpdate
 
 
-def update_status_count(data_dict: dict, month: str):
+def update_status_count(data_dict: dict, single_month_df: DataFrame, month: str, year: int=None):
     """ 
     """ 
 
-    if data_dict != {}:
-        # Convert to pandas dataframe
-        func_df = clean_date(DataFrame(data_dict), "orders")
-
+    if use_sql_backend(data_backend) and data_dict != {}:
+        # Counted by the embedded database
+        status_dict = sql_function.status_count(
+            data_dict["data_type"], default_date_variable, month, year, data_dict.get("date_range")
+        )
+    elif single_month_df is not None:
         # Get the number of orders that fall within each status.
-        status_dict = status_count(func_df, default_date_variable, month)
-        # Check that status_dict is not an empty dictionary
-        if status_dict != {}:
-            output_tuple = ()
-            for status in delivery_status:
-                output_tuple += (f"{status_dict[status]:,}", )
-
-            return output_tuple 
-        else:
-            raise PreventUpdate
+        # (a date range can leave the month without any order, every status count is then 0)
+        status_dict = status_count(single_month_df, default_date_variable, month)
     else:
         raise PreventUpdate
-    
 
-def update_status_chart(data_dict: dict, month: str, status_type: str):
-    """ 
-    """
+    output_tuple = ()
+    for status in delivery_status:
+        output_tuple += (f"{status_dict.get(status, 0):,}", )
 
+    return output_tuple 
     
 
-
-def update_status_charts(data_dict: dict, month: str, is_opened: bool, status_type):
+def update_status_charts(data_dict: dict, month: str, is_opened: bool, status_type, year: int=None):
     """ 
     """
     if is_opened:
         if data_dict != {}:
             if status_type in delivery_status:
-                # Convert to pandas dataframe
-                func_df = clean_date(DataFrame(data_dict), "orders")
-                
-                func_df = func_df.query(f"order_status == '{status_type}'")
-                return monthly_order_volume(func_df, default_date_variable, month)
+                if use_sql_backend(data_backend):
+                    # Counted by the embedded database
+                    return sql_function.monthly_order_volume(
+                        data_dict["data_type"], default_date_variable, month, "line", year, 
+                        data_dict.get("date_range"), status_type
+                    )
+
+                # Status by month counts of the data snapshot
+                cube_res = get_derived(
+                    data_dict, "status_cube", lambda df: build_status_cube(df, default_date_variable)
+                )
+                if cube_res["error"]:
+                    raise PreventUpdate
+
+                return status_month_volume(cube_res["data"], status_type, month, "line", year)
             else:
                 raise PreventUpdate
         else:
@@ -47,6 +47,28 @@ def dashboard_page_layout(
                                         style={"width": 200},
                                         icon=DashIconify(icon="radix-icons:magnifying-glass")
                                     ),
+                                    html.P("Year:", className="pmc-select-title"),
+                                    dmc.Select(
+                                        label="",
+                                        placeholder="Select Year",
+                                        # Years of the page data, set by `update_year_select`.
+                                        id=f"{page_name_id}_selected_year",
+                                        clearable=False,
+                                        value=None,
+                                        data=[],
+                                        style={"width": 120}
+                                    ),
+                                    html.P("Dates:", className="pmc-select-title"),
+                                    dmc.DateRangePicker(
+                                        label="",
+                                        placeholder="All dates",
+                                        id=f"{page_name_id}_date_range",
+                                        clearable=True,
+                                        allowSingleDateInRange=True,
+                                        value=None,
+                                        style={"width": 260},
+                                        icon=DashIconify(icon="solar:calendar-broken")
+                                    ),
                                 ],
                                 className="pmc-info"
                             )
@@ -0,0 +1,53 @@
+from dash.exceptions import PreventUpdate
+
+from components.utils import default_date_variable
+from logic.global_function import data_periods, period_years
+from logic.data_registry import get_derived, date_range_view
+
+
+def update_year_select(data_dict: dict, year: int) -> tuple:
+    """ 
+    :params
+    data_dict: the page data handle.
+    year: the selected year.
+
+    :return a tuple of the year options of the data and the selected year (the latest year when the 
+    selected year is not in the data).
+    """
+    if data_dict != {}:
+        years_res = get_derived(
+            data_dict, "period_years", lambda df: period_years(data_periods(df, default_date_variable))
+        )
+        if years_res["error"] or len(years_res["data"]) == 0:
+            raise PreventUpdate
+
+        years = years_res["data"]
+        year_data = [{"value": str(y), "label": str(y)} for y in years]
+
+        return (year_data, year if year is not None and int(year) in years else str(years[-1]))
+    else:
+        raise PreventUpdate
+
+
+def year_value(year: str) -> int | None:
+    """ 
+    :return the selected year (Select value) as an integer, None when no year is selected yet.
+    """
+    return int(year) if year else None
+
+
+def data_view(data_dict: dict, date_range: list) -> dict:
+    """ 
+    :params
+    data_dict: the page data handle.
+    date_range: the selected [first day, last day] (DateRangePicker value).
+
+    :return the handle of the data in the date range, the page data handle when no range is selected.
+    """
+    view_res = date_range_view(data_dict, date_range)
+
+    # A reversed or invalid range does not update the page.
+    if view_res["error"]:
+        raise PreventUpdate
+    else:
+        return view_res["data"]
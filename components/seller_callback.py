@@ -0,0 +1,184 @@
+from dash.exceptions import PreventUpdate
+from pandas import DataFrame, isna, to_numeric
+from pandas.api.types import is_numeric_dtype
+
+from components.utils import default_date_variable, data_backend
+from logic.seller_function import build_seller_deadline_cube, month_seller_deadline, seller_deadline_ranking
+from logic.data_registry import get_derived
+from logic import sql_function
+from logic.sql_function import use_sql_backend
+from logic import polars_function
+from logic.polars_function import use_polars_backend, get_lazy_frame
+
+
+# DataTable filter operators, as [operator, alternative spellings...]
+filter_operators = [
+    ["ge ", ">="],
+    ["le ", "<="],
+    ["lt ", "<"],
+    ["gt ", ">"],
+    ["ne ", "!="],
+    ["eq ", "="],
+    ["contains "],
+    ["datestartswith "]
+]
+
+
+def split_filter_part(filter_part: str) -> tuple:
+    """
+    :params
+    filter_part: one expression of a DataTable `filter_query`, e.g '{Meet Deadline} eq "Yes"'.
+
+    :return a tuple of (column name, operator, value text), (None, None, None) when the expression is not valid.
+    """
+    for operator_type in filter_operators:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find("{") + 1: name_part.rfind("}")]
+
+                value_part = value_part.strip()
+                if value_part == "":
+                    return (None, None, None)
+
+                # The value text, typed by `filter_table` from the column it is compared with.
+                quote = value_part[0]
+                if quote == value_part[-1] and quote in ("'", '"', "`"):
+                    value = value_part[1: -1].replace("\\" + quote, quote)
+                else:
+                    value = value_part
+
+                return (name, operator_type[0].strip(), value)
+
+    return (None, None, None)
+
+
+def filter_table(df: DataFrame, filter_query: str) -> DataFrame:
+    """
+    :return the rows of the table that match every expression of the DataTable `filter_query`, expressions
+    on an unknown column or with a value that does not fit the column are skipped.
+    """
+    if not filter_query:
+        return df
+
+    for filter_part in filter_query.split(" && "):
+        col_name, operator, value = split_filter_part(filter_part)
+
+        if col_name not in df.columns:
+            continue
+
+        if operator in ("eq", "ne", "lt", "le", "gt", "ge"):
+            # Values are compared with the column type, e.g '{Avg. Days before Deadline} gt "abc"' is skipped.
+            if is_numeric_dtype(df[col_name]):
+                value = to_numeric(value, errors="coerce")
+                if isna(value):
+                    continue
+            else:
+                value = str(value)
+
+            df = df[getattr(df[col_name], operator)(value)]
+        elif operator == "contains":
+            df = df[df[col_name].astype(str).str.contains(str(value), regex=False)]
+        elif operator == "datestartswith":
+            df = df[df[col_name].astype(str).str.startswith(str(value))]
+
+    return df
+
+
+def sort_table(df: DataFrame, sort_by: list) -> DataFrame:
+    """
+    :return the table sorted by the columns of the DataTable `sort_by`, rows keep their order on ties.
+    """
+    sort_by = [col for col in (sort_by or []) if col["column_id"] in df.columns]
+
+    if len(sort_by) == 0:
+        return df
+
+    return df.sort_values(
+        by=[col["column_id"] for col in sort_by],
+        ascending=[col["direction"] == "asc" for col in sort_by],
+        kind="stable"
+    )
+
+
+def get_seller_ranking(data_dict: dict, month: str, year: int=None) -> DataFrame:
+    """
+    :return every seller active in the month ranked by their average days before the shipping deadline,
+    built once per data snapshot and month.
+    """
+    # Seller by month deadline aggregates of the data snapshot
+    cube_res = get_derived(
+        data_dict, "seller_deadline_cube", lambda df: build_seller_deadline_cube(df, default_date_variable)
+    )
+    if cube_res["error"]:
+        raise PreventUpdate
+
+    ranking_res = get_derived(
+        data_dict,
+        f"seller_deadline_ranking_{month}_{year}",
+        lambda df: seller_deadline_ranking(cube_res["data"], month_seller_deadline(cube_res["data"], month, year))
+    )
+    if ranking_res["error"]:
+        raise PreventUpdate
+    else:
+        return ranking_res["data"]
+
+
+def update_seller_table(
+        data_dict: dict,
+        month: str,
+        top_n: int,
+        page_current: int,
+        page_size: int,
+        sort_by: list,
+        filter_query: str,
+        year: int=None
+    ) -> tuple:
+    """
+    :params
+    data_dict: the seller data handle.
+    month: the selected month.
+    top_n: number of top sellers in the average days.
+    page_current, page_size, sort_by, filter_query: the DataTable paging, sorting and filtering state.
+    year: the selected year, the latest year of the data when None.
+
+    :return a tuple of the rows of the current page (of the whole ranking), the number of pages, the current 
+    page and the average days of the `top_n` first sellers of the ranking ("-" when no seller is selected).
+    """
+    if data_dict != {} and month is not None and top_n is not None:
+        if use_sql_backend(data_backend):
+            # Ranked by the embedded database
+            ranking_df = sql_function.seller_deadline_ranking(
+                data_dict["data_type"], default_date_variable, month, None, year, data_dict.get("date_range")
+            )
+        elif use_polars_backend(data_backend):
+            # Ranked on the lazy frame
+            frame_res = get_lazy_frame(data_dict)
+            if frame_res["error"]:
+                raise PreventUpdate
+
+            ranking_df = polars_function.seller_deadline_ranking(
+                frame_res["data"], default_date_variable, month, None, year
+            )
+        else:
+            ranking_df = get_seller_ranking(data_dict, month, year)
+
+        # The table pages over the whole (filtered) ranking, the top sellers are its first rows.
+        ranking_df = filter_table(ranking_df, filter_query)
+        top_df = ranking_df.head(int(top_n))
+
+        table_df = sort_table(ranking_df, sort_by)
+        page_count = max(-(-len(table_df) // page_size), 1)
+        page_current = min(page_current or 0, page_count - 1)
+
+        page_df = table_df.iloc[page_current * page_size: (page_current + 1) * page_size]
+        avg_top_days = top_df["Avg. Days before Deadline"].mean()
+
+        return (
+            page_df.to_dict("records"), 
+            page_count, 
+            page_current, 
+            round(avg_top_days, 2) if not isna(avg_top_days) else "-"
+        )
+    else:
+        raise PreventUpdate
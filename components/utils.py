@@ -3,7 +3,7 @@ from dash_mantine_components.theme import DEFAULT_COLORS
 
 default_color = DEFAULT_COLORS["teal"][4]
 
-month_names = list(calendar.month_name[1:9])
+month_names = list(calendar.month_name[1:])
 month_name_data = [{"value": name, "label": name} for name in month_names]
 
 delivery_phase = ["placement", "approval", "carrier", "customer"]
@@ -29,6 +29,15 @@ default_date_variable = "order_purchase_timestamp"
 # period
 period_data = ["second", "minute", "hour", "day", "week"]
 
+# Duration charts medians: exact (full sort of the durations) or from the per day quantile sketches.
+exact_duration_medians = False
+
+# Logic backend: "pandas" (registered dataframes), "duckdb" (SQL on the local data files, needs duckdb)
+# or "polars" (lazy frames of a parquet file of each data snapshot, needs polars and pyarrow). The
+# Durations page runs on pandas with the polars backend: its callbacks are forked background jobs and
+# polars can not run after a fork.
+data_backend = "pandas"
+
 config_plotly = {
     "displaylogo": False,
     "modeBarButtonsToRemove": ['pan2d', 'lasso2d', 'zoom2d', 'zoomIn2d', 'zoomOut2d', 'select2d', 'autoScale2d']
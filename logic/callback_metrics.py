@@ -0,0 +1,247 @@
+from bisect import bisect_left
+from collections import defaultdict
+from functools import wraps
+from time import perf_counter
+import flask
+from dash import callback_context
+from dash.exceptions import PreventUpdate
+
+try:
+    from diskcache import Cache
+except ImportError:
+    # Without diskcache every worker only reports its own requests.
+    Cache = None
+
+
+# Shared by every app worker on the host, counters are incremented atomically.
+metrics_directory = "cache/metrics"
+
+# Upper bounds of the histogram buckets.
+latency_buckets = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+payload_buckets = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+
+# name: (help text, buckets, unit scale of the stored integer sums)
+histograms = {
+    "dash_callback_duration_seconds": ("Callback request latency.", latency_buckets, 10**6),
+    "dash_callback_request_bytes": ("Callback request (inputs and state) payload size.", payload_buckets, 1),
+    "dash_callback_response_bytes": ("Callback response (outputs) payload size.", payload_buckets, 1),
+    "dash_background_job_duration_seconds": ("Background callback job runtime.", latency_buckets, 10**6)
+}
+counters = {
+    "dash_callback_prevent_update_total": "Callback requests without an update (PreventUpdate or no_update).",
+    "dash_callback_errors_total": "Callback requests that failed.",
+    "dash_background_requests_total": "Background callback start and polling requests (not in the latency histogram).",
+    "dash_background_jobs_started_total": "Background callback jobs started.",
+    "dash_background_jobs_cancelled_total": "Background callback jobs terminated by a newer input change."
+}
+
+# Route of the callback requests (after the app's routes pathname prefix).
+callback_route = "_dash-update-component"
+
+_metrics_store = None
+_local_metrics = defaultdict(int)
+# Functions returning the metrics of other modules, see `register_metrics_collector`.
+_metrics_collectors = []
+
+
+def get_metrics_store():
+    """
+    :return the disk backed metrics store, or a dictionary of this worker's metrics when diskcache is not installed.
+    """
+    global _metrics_store
+
+    if _metrics_store is None:
+        _metrics_store = Cache(metrics_directory) if Cache is not None else _local_metrics
+
+    return _metrics_store
+
+
+def increment(key: tuple, value: int=1):
+    """
+    Add `value` to the metric `key`.
+    """
+    metrics_store = get_metrics_store()
+
+    if isinstance(metrics_store, dict):
+        metrics_store[key] += value
+    else:
+        metrics_store.incr(key, value)
+
+
+def observe(name: str, labels: tuple, value: float):
+    """
+    :params
+    name: the histogram name.
+    labels: the (callback, output) labels.
+    value: the observed value, e.g latency in seconds or payload size in bytes.
+    """
+    _, buckets, scale = histograms[name]
+
+    increment((name, "bucket", *labels, bisect_left(buckets, value)))
+    increment((name, "sum", *labels), round(value * scale))
+    increment((name, "count", *labels))
+
+
+def callback_name(app, output: str) -> str:
+    """
+    :return the name of the function of the callback with the `output` id.
+    """
+    callback = app.callback_map.get(output, {}).get("callback")
+    return getattr(callback, "__name__", "")
+
+
+def output_label(outputs_list) -> str:
+    """
+    :return the output id of a callback (as sent in the callback requests) from its `outputs_list`.
+    """
+    if isinstance(outputs_list, dict):
+        return f"{outputs_list['id']}.{outputs_list['property']}"
+
+    # Several outputs: "..id.property...id.property.."
+    return ".." + "...".join(f"{output['id']}.{output['property']}" for output in outputs_list) + ".."
+
+
+def record_callback_request(app, response):
+    """
+    Record the latency, payload sizes and outcome of a callback request (a Flask after request function).
+    The requests of background callbacks only start and poll their job, they are counted apart and the
+    job itself is measured by `background_job_metrics`.
+    """
+    if "metrics_start" not in flask.g:
+        return response
+
+    body = flask.request.get_json(silent=True) or {}
+    output = body.get("output", "")
+    labels = (callback_name(app, output), output)
+
+    if app.callback_map.get(output, {}).get("long"):
+        increment(("dash_background_requests_total", "total", *labels))
+
+        # Running jobs of the callback that the new request replaces.
+        cancelled_jobs = len(flask.request.args.getlist("oldJob"))
+        if cancelled_jobs > 0:
+            increment(("dash_background_jobs_cancelled_total", "total", *labels), cancelled_jobs)
+
+        return response
+
+    observe("dash_callback_duration_seconds", labels, perf_counter() - flask.g.metrics_start)
+    observe("dash_callback_request_bytes", labels, flask.request.content_length or 0)
+    observe("dash_callback_response_bytes", labels, response.calculate_content_length() or 0)
+
+    if response.status_code == 204:
+        increment(("dash_callback_prevent_update_total", "total", *labels))
+    elif response.status_code >= 500:
+        increment(("dash_callback_errors_total", "total", *labels))
+
+    return response
+
+
+def background_job_metrics(func):
+    """
+    Decorator of the background callbacks (under `@callback`), records the start, runtime and outcome of
+    every job in the process that runs it.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        labels = (func.__name__, output_label(callback_context.outputs_list))
+        increment(("dash_background_jobs_started_total", "total", *labels))
+        job_start = perf_counter()
+
+        try:
+            return func(*args, **kwargs)
+        except PreventUpdate:
+            increment(("dash_callback_prevent_update_total", "total", *labels))
+            raise
+        except Exception:
+            increment(("dash_callback_errors_total", "total", *labels))
+            raise
+        finally:
+            observe("dash_background_job_duration_seconds", labels, perf_counter() - job_start)
+
+    return wrapper
+
+
+def label_text(callback: str, output: str, **extra) -> str:
+    """
+    :return the Prometheus label set of a sample.
+    """
+    labels = {"callback": callback, "output": output, **extra}
+    escaped = {
+        key: str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        for key, value in labels.items()
+    }
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped.items()) + "}"
+
+
+def metrics_text() -> str:
+    """
+    :return every metric in the Prometheus text exposition format.
+    """
+    metrics_store = get_metrics_store()
+    values = defaultdict(dict)
+
+    for key in list(metrics_store):
+        value = metrics_store.get(key)
+        if value is not None:
+            name, kind, *labels = key
+            values[name][(kind, *labels)] = value
+
+    lines = []
+    for name, (help_text, buckets, scale) in histograms.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+
+        series = sorted({tuple(key[1:3]) for key in values[name]})
+        for labels in series:
+            cumulative = 0
+            for idx, bound in enumerate(buckets + ["+Inf"]):
+                cumulative += values[name].get(("bucket", *labels, idx), 0)
+                lines.append(f"{name}_bucket{label_text(*labels, le=bound)} {cumulative}")
+
+            lines.append(f"{name}_sum{label_text(*labels)} {values[name].get(('sum', *labels), 0) / scale}")
+            lines.append(f"{name}_count{label_text(*labels)} {values[name].get(('count', *labels), 0)}")
+
+    for name, help_text in counters.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+
+        for (_, *labels), value in sorted(values[name].items()):
+            lines.append(f"{name}{label_text(*labels)} {value}")
+
+    for collect_metrics in _metrics_collectors:
+        for name, help_text, metric_type, value in collect_metrics():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}", f"{name} {value}"]
+
+    return "\n".join(lines) + "\n"
+
+
+def register_metrics_collector(collect_metrics):
+    """
+    Add the metrics of another module to the `/metrics` output.
+
+    :params
+    collect_metrics: a function without arguments that returns a list of (name, help text, type, value),
+    called on every `/metrics` request.
+    """
+    _metrics_collectors.append(collect_metrics)
+
+
+def register_callback_metrics(app):
+    """
+    Time every callback request of the app and expose the metrics on the `/metrics` route.
+
+    :params
+    app: the Dash app.
+    """
+    server = app.server
+
+    @server.before_request
+    def start_callback_timer():
+        if flask.request.path == app.config.routes_pathname_prefix + callback_route:
+            flask.g.metrics_start = perf_counter()
+
+    @server.after_request
+    def record_callback_metrics(response):
+        return record_callback_request(app, response)
+
+    @server.route("/metrics")
+    def metrics():
+        return flask.Response(metrics_text(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,100 @@
+from os import stat, replace, getpid
+from os.path import splitext, exists
+from pandas import DataFrame
+
+try:
+    from pyarrow import Table, ArrowException
+    import pyarrow.parquet as pq
+except ImportError:
+    # Without pyarrow the app reads the csv files directly.
+    pq = None
+
+
+def cache_path(source_path: str) -> str:
+    """
+    :params
+    source_path: path to the source csv file.
+
+    :return the path of the parquet cache written next to the csv file.
+    """
+    return f"{splitext(source_path)[0]}.parquet"
+
+
+def source_signature(source_path: str) -> dict:
+    """
+    :params
+    source_path: path to the source csv file.
+
+    :return a dictionary with the size and modification time of the source file.
+    """
+    source_stat = stat(source_path)
+
+    return {
+        b"source_size": str(source_stat.st_size).encode(),
+        b"source_mtime_ns": str(source_stat.st_mtime_ns).encode()
+    }
+
+
+def read_cache(source_path: str) -> DataFrame | None:
+    """
+    :params
+    source_path: path to the source csv file.
+
+    :return the cached pandas dataframe, or None when there is no valid cache for the current csv file.
+    """
+    path = cache_path(source_path)
+
+    if pq is None or not exists(path):
+        return None
+
+    try:
+        metadata = pq.read_schema(path).metadata or {}
+        signature = source_signature(source_path)
+
+        if any(metadata.get(key) != value for key, value in signature.items()):
+            return None
+
+        return pq.read_table(path).to_pandas()
+
+    except (OSError, ArrowException):
+        return None
+
+
+def write_cache(data: DataFrame, source_path: str, signature: dict) -> bool:
+    """
+    :params
+    data: typed data read from the source csv file.
+    source_path: path to the source csv file.
+    signature: the `source_signature` taken before the csv file was read.
+
+    :return a boolean, whether the cache was written.
+    """
+    return write_parquet(data, cache_path(source_path), signature)
+
+
+def write_parquet(data: DataFrame, path: str, metadata: dict=None) -> bool:
+    """
+    :params
+    data: a pandas dataframe.
+    path: path of the parquet file.
+    metadata: key/value (bytes) pairs added to the file schema metadata.
+
+    :return a boolean, whether the file was written.
+    """
+    if pq is None:
+        return False
+
+    # Each worker writes its own temporary file, the final rename is atomic.
+    temp_path = f"{path}.{getpid()}.tmp"
+
+    try:
+        table = Table.from_pandas(data, preserve_index=False)
+        if metadata:
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+
+        pq.write_table(table, temp_path)
+        replace(temp_path, path)
+        return True
+
+    except (OSError, ArrowException):
+        return False
@@ -0,0 +1,181 @@
+from threading import Lock
+from collections import OrderedDict
+from hashlib import sha1
+from pandas import DataFrame
+from pandas.util import hash_pandas_object
+
+from logic.server_timing import timed
+from logic.global_function import filter_date_range, month_index_var
+
+
+# In-process datasets keyed by their snapshot id.
+_datasets: dict[str, DataFrame] = {}
+# Structures derived from a dataset, keyed by (snapshot id, name).
+_derived: dict[tuple, object] = {}
+# Date range views in least recently used order, at most `max_date_range_views` are kept.
+_views: OrderedDict = OrderedDict()
+_registry_lock = Lock()
+
+max_date_range_views = 16
+
+
+def snapshot_id(data: DataFrame, data_type: str) -> str:
+    """
+    :params
+    data: App data.
+    data_type: The name of the dataset either ['orders', 'customer', 'seller'].
+
+    :return a short id that is identical for identical data (across every app worker).
+    """
+    row_hashes = hash_pandas_object(data, index=False).to_numpy()
+    digest = sha1(row_hashes.tobytes()).hexdigest()[:16]
+
+    return f"{data_type}-{digest}"
+
+
+def register_dataset(data: DataFrame, data_type: str) -> dict:
+    """
+    Keep a typed dataframe on the server and return the handle that is stored in the browser.
+
+    :params
+    data: App data (already cleaned).
+    data_type: The name of the dataset either ['orders', 'customer', 'seller'].
+
+    :return a dictionary handle with the data type and snapshot id.
+    """
+    snap_id = snapshot_id(data, data_type)
+
+    with _registry_lock:
+        _datasets[snap_id] = data
+
+    return {"data_type": data_type, "snapshot_id": snap_id}
+
+
+@timed("data")
+def resolve_dataset(handle: dict) -> dict:
+    """
+    :params
+    handle: a dictionary returned by `register_dataset` (dcc.Store data).
+
+    :return A dictionary containing boolean error and the registered pandas dataframe.
+    """
+    try:
+        return {"error": False, "message": "", "data": _datasets[handle["snapshot_id"]]}
+
+    except (KeyError, TypeError) as e:
+        return {
+            "error": True,
+            "message": f"No registered dataset for the supplied handle: {e}",
+            "data": None
+        }
+
+
+@timed("data")
+def get_derived(handle: dict, name: str, builder) -> dict:
+    """
+    Build a structure from a registered dataset once per snapshot and reuse it afterwards.
+
+    :params
+    handle: a dictionary returned by `register_dataset` (dcc.Store data).
+    name: the name of the derived structure.
+    builder: a function that takes the registered pandas dataframe and returns the structure.
+
+    :return A dictionary containing boolean error and the derived structure.
+    """
+    data_res = resolve_dataset(handle)
+    if data_res["error"]:
+        return data_res
+
+    key = (handle["snapshot_id"], name)
+    derived = _derived.get(key)
+    if derived is None:
+        try:
+            derived = builder(data_res["data"])
+        except ValueError as e:
+            return {"error": True, "message": f"An error occured while building {name}: {e}", "data": None}
+
+        with _registry_lock:
+            # An evicted view does not keep the structures that were being built from it.
+            if handle["snapshot_id"] in _datasets:
+                derived = _derived.setdefault(key, derived)
+
+    return {"error": False, "message": "", "data": derived}
+
+
+def evict_view(view_id: str):
+    """
+    Remove a date range view and every structure derived from it. The caller holds `_registry_lock`.
+    """
+    _views.pop(view_id, None)
+    _datasets.pop(view_id, None)
+
+    for key in [key for key in _derived if key[0] == view_id]:
+        del _derived[key]
+
+
+def date_range_view(handle: dict, date_range: list, date_var: str=month_index_var) -> dict:
+    """
+    Narrow a registered dataset to a range of days. The rows are found by binary search on the sorted
+    `date_var` and the view is registered like a dataset, so its derived structures and figures are
+    cached under the view id. Only the `max_date_range_views` most recently used views (with their
+    derived structures) are kept.
+
+    :params
+    handle: a dictionary returned by `register_dataset` or by this function (dcc.Store data).
+    date_range: a list of the [first day, last day] of the range (DateRangePicker value), None for every day.
+    date_var: the date column the dataset is sorted by.
+
+    :return A dictionary containing boolean error and the handle of the view (with its `date_range`), the
+    handle of the whole dataset when no range is selected.
+    """
+    if not handle or not date_range or None in date_range:
+        return {"error": False, "message": "", "data": handle}
+
+    # A view is always taken from the whole dataset, so it can be rebuilt from its own handle.
+    source_handle = {**handle, "snapshot_id": handle.get("source_id", handle["snapshot_id"])}
+    source_handle.pop("source_id", None)
+    source_handle.pop("date_range", None)
+
+    start_date, end_date = date_range[0], date_range[-1]
+    view_id = f"{source_handle['snapshot_id']}:{start_date}:{end_date}"
+
+    view_data = None
+    if view_id not in _datasets:
+        data_res = resolve_dataset(source_handle)
+        if data_res["error"]:
+            return data_res
+
+        range_res = filter_date_range(data_res["data"], date_var, start_date, end_date)
+        if range_res["error"]:
+            return range_res
+
+        # Derived structures are aligned to the row positions of the data they are built from.
+        view_data = range_res["data"].reset_index(drop=True)
+
+    with _registry_lock:
+        if view_data is not None:
+            _datasets.setdefault(view_id, view_data)
+        elif view_id not in _datasets:
+            view_id = None
+
+        if view_id is not None:
+            _views[view_id] = None
+            _views.move_to_end(view_id)
+
+            while len(_views) > max_date_range_views:
+                evict_view(next(iter(_views)))
+
+    if view_id is None:
+        # The view was evicted by another request after it was looked up.
+        return date_range_view(handle, date_range, date_var)
+
+    return {
+        "error": False, 
+        "message": "", 
+        "data": {
+            **source_handle, 
+            "snapshot_id": view_id, 
+            "source_id": source_handle["snapshot_id"], 
+            "date_range": [start_date, end_date]
+        }
+    }
@@ -1,17 +1,48 @@
-from pandas import DataFrame, Timedelta, Categorical
-from numpy import where
+from pandas import DataFrame, Series, Timedelta, Categorical
+from numpy import (
+    select, bincount, zeros, isnat, isnan, ndarray, where, ceil, log, sign, unique, concatenate, arange
+)
 import calendar
-from plotly.express import line, bar, colors
-import plotly.io as pio
-
-pio.templates.default = "plotly_white"
 
 from components.utils import default_color
+from logic.figure_builder import figure_layout, line_trace, bar_trace, hover_label, marker_style
 
 plot_color = "#38D9A9"
 
 
  
+# Unit of time labels, in order of their codes.
+unit_time_labels = ["Seconds", "Minutes", "Hours", "Days"]
+minute_ns = 60 * 10**9
+hour_ns = 60 * minute_ns
+day_ns = 24 * hour_ns
+
+# Quantile sketch relative accuracy.
+sketch_accuracy = 0.01
+sketch_gamma = (1 + sketch_accuracy) / (1 - sketch_accuracy)
+# Number of seconds in each unit of time.
+unit_seconds = {"second": 1, "minute": 60, "hour": 3600, "day": 86400, "week": 604800}
+# Delivered vs estimated delivery date.
+estimate_pair = ("order_estimated_delivery_date", "order_delivered_customer_date")
+
+# Original date column names
+phase_columns = {
+    "placement": "order_purchase_timestamp",
+    "approval": "order_approved_at",
+    "carrier": "order_delivered_carrier_date",
+    "customer": "order_delivered_customer_date"
+}
+# arranged inputes
+phase_pairs = {
+    "customer_placement": ["placement", "customer"],
+    "approval_placement": ["placement", "approval"],
+    "carrier_placement":  ["placement", "carrier"],
+    "approval_carrier":   ["approval", "carrier"],
+    "approval_customer":  ["approval", "customer"],
+    "carrier_customer":   ["carrier", "customer"]
+}
+
+ 
 def arrange_selection(first_date: str, second_date: str, labels: bool=False) -> list:
     """ 
     :params
@@ -20,40 +51,104 @@ def arrange_selection(first_date: str, second_date: str, labels: bool=False) ->
 
     :return a list of arranged date column name. 
     """
-    # Original date column names
-    col_dict = {
-        "placement": "order_purchase_timestamp",
-        "approval": "order_approved_at",
-        "carrier": "order_delivered_carrier_date",
-        "customer": "order_delivered_customer_date"
-    }
-    # arranged inputes
-    arranged_dict = {
-        "customer_placement": ["placement", "customer"],
-        "approval_placement": ["placement", "approval"],
-        "carrier_placement":  ["placement", "carrier"],
-        "approval_carrier":   ["approval", "carrier"],
-        "approval_customer":  ["approval", "customer"],
-        "carrier_customer":   ["carrier", "customer"]
-    }
     # Sort the values in alphabetical order.
     alpha_sorting = sorted([first_date, second_date])
     # combine sorted value to create a valid key
     request = "_".join(alpha_sorting)
 
     if labels:
-        return [str.title(lab) for lab in arranged_dict[request]]
+        return [str.title(lab) for lab in phase_pairs[request]]
     else:
-        return [col_dict[arranged_dict[request][0]], col_dict[arranged_dict[request][1]]]
+        return [phase_columns[phase_pairs[request][0]], phase_columns[phase_pairs[request][1]]]
 
 
-def create_time_diff(data: DataFrame, first_date: str, second_date: str, num_unit: str="minute") -> dict:
+def unit_time_code(time_diff: Series) -> ndarray:
+    """ 
+    Classify durations on their int64 nanosecond values (the same result as using `.dt.components`,
+    where a negative duration keeps a negative day and positive hours, minutes and seconds).
+
+    :params
+    time_diff: a timedelta series.
+
+    :return an int8 array with the position of each duration's largest non zero unit of time in
+    `unit_time_labels` (missing durations are 'Seconds').
+    """
+    ns_values = time_diff.to_numpy().astype("timedelta64[ns]").view("int64")
+    # Time of day part of the duration (always positive).
+    day_remainder = ns_values % day_ns
+
+    unit_codes = select(
+        [ns_values >= day_ns, day_remainder >= hour_ns, day_remainder >= minute_ns],
+        [3, 2, 1],
+        default=0
+    ).astype("int8")
+    unit_codes[isnat(time_diff.to_numpy())] = 0
+
+    return unit_codes
+
+
+def unit_time_label(time_diff: Series) -> Categorical:
+    """ 
+    :params
+    time_diff: a timedelta series.
+
+    :return the largest non zero unit of time ('Days', 'Hours', 'Minutes' or 'Seconds') of each duration.
+    """
+    return Categorical.from_codes(unit_time_code(time_diff), categories=unit_time_labels, ordered=True)
+
+
+def unit_time_histogram(unit_codes: ndarray) -> dict:
+    """ 
+    :params
+    unit_codes: output of `unit_time_code`.
+
+    :return a dictionary with the count and percentage of each unit of time (in the `unit_time_labels` order).
+    """
+    counts = bincount(unit_codes[unit_codes >= 0], minlength=len(unit_time_labels))
+    total = counts.sum()
+    percentages = (counts / total * 100).round(1) if total > 0 else zeros(len(unit_time_labels))
+
+    return {"count": counts, "percentage": percentages}
+
+
+def build_duration_matrix(data: DataFrame) -> dict:
+    """ 
+    Every phase to phase duration, computed once per data snapshot.
+
+    :params
+    data: App data.
+
+    :return a dictionary of {(first date column, second date column): {"time_diff", "unit_time"}} arrays
+    (durations and unit of time codes) aligned to the rows of the data.
+    """
+    duration_matrix = {}
+    for first_phase, second_phase in phase_pairs.values():
+        first_date, second_date = phase_columns[first_phase], phase_columns[second_phase]
+        time_diff = data[second_date] - data[first_date]
+
+        duration_matrix[(first_date, second_date)] = {
+            "time_diff": time_diff.to_numpy(),
+            "unit_time": unit_time_code(time_diff)
+        }
+
+    return duration_matrix
+
+
+def create_time_diff(
+        data: DataFrame, 
+        first_date: str, 
+        second_date: str, 
+        num_unit: str="minute", 
+        duration_matrix: dict=None
+) -> dict:
     """ 
     :params
     data: App data.
     first_date: a date column name corresponding to the latest date.
     second_date: a date column name corresponding to the past date.
     num_unit: The unit of time the difference should be measured.
+    duration_matrix: output of `build_duration_matrix` for the data that `data` is a row subset of
+    (same index), the durations are looked up instead of computed.
 
     :return a pandas dataframe.
     """
@@ -62,21 +157,20 @@ def create_time_diff(data: DataFrame, first_date: str, second_date: str, num_uni
     func_df = data.copy()
 
     try:
-        # Add the time difference column (second date [current] - first date [current])
-        func_df["time_diff"] = (func_df[second_date] - func_df[first_date])
-
-        # Add the days, hours, minutes and seconds date components
-        date_components = ["days", "hours", "minutes", "seconds"]
-        func_df[date_components] = func_df["time_diff"].dt.components[date_components]
-
-        # Add date component label
-        func_df["unit_time"] = where(
-            func_df["days"] > 0, "Days", where(
-                func_df["hours"] > 0, "Hours", where(
-                    func_df["minutes"] > 0, "Minutes", "Seconds"
-                )
+        if duration_matrix is not None and (first_date, second_date) in duration_matrix:
+            phase_durations = duration_matrix[(first_date, second_date)]
+            row_positions = func_df.index.to_numpy()
+
+            func_df["time_diff"] = phase_durations["time_diff"][row_positions]
+            func_df["unit_time"] = Categorical.from_codes(
+                phase_durations["unit_time"][row_positions], categories=unit_time_labels, ordered=True
             )
-        )
+        else:
+            # Add the time difference column (second date [current] - first date [current])
+            func_df["time_diff"] = (func_df[second_date] - func_df[first_date])
+
+            # Add date component label
+            func_df["unit_time"] = unit_time_label(func_df["time_diff"])
 
         # Add Numeric unit
         if num_unit == "second":
@@ -105,146 +199,233 @@ def unit_of_time(data: DataFrame) -> dict:
     :param
     data: App data with a date difference applied to the data.
 
-    :return a dictionary with the summarised count and percentage of each unit of time. 
+    :return a dictionary with the summarised count and percentage of each unit of time
+    (Seconds, Minutes, Hours, Days). 
     """
 
     try:
-        unit_time_lab = ["Seconds", "Minutes", "Hours", "Days"]
+        unit_codes = Categorical(data["unit_time"], categories=unit_time_labels).codes
+        histogram = unit_time_histogram(unit_codes)
 
-        func_dict = (
-            data["unit_time"]
-            .value_counts()
-            .reset_index()
-            .assign(percentage=lambda _: round(_["count"] / _["count"].sum() * 100, 1))
-            .to_dict()
-        )
-        # Check if all unit time are available
-        if len(func_dict["unit_time"]) != 4:
-            # Collect available unit time labels 
-            av_values = list(func_dict["unit_time"].values()) 
-            # Collect all missing values
-            miss_values = [v for v in unit_time_lab if v not in av_values]
-            # Get the number of values
-            len_idx = len(func_dict["unit_time"])
-            for i in miss_values:
-                func_dict["unit_time"][len_idx] = i
-                func_dict["count"][len_idx] = 0
-                func_dict["percentage"][len_idx] = 0
-                len_idx += 1
-
-            func_dict = (
-                DataFrame(func_dict)
-                .assign(unit_time=lambda _: _['unit_time'].astype("category"))
-                .assign(unit_time=lambda _: _['unit_time'].cat.reorder_categories(unit_time_lab, ordered=True))
-                .sort_values(by="unit_time")
-                .reset_index(drop=True)
-                .to_dict()
-            )
-
-        func_dict["error"] = {"type": False, "message": ""}
-
-        return func_dict
+        return {
+            "unit_time": dict(enumerate(unit_time_labels)),
+            "count": dict(enumerate(histogram["count"].tolist())),
+            "percentage": dict(enumerate(histogram["percentage"].tolist())),
+            "error": {"type": False, "message": ""}
+        }
     
     except ValueError as e:
         return {"unit_time": {}, "count": {}, "percentage": {}, "error": {"type": True, "message": e}}
 
 
-def median_duration_day(data: DataFrame, date_var: str, diff_cols: list[str], period: str):
+def sketch_keys(seconds: ndarray) -> ndarray:
+    """ 
+    :params
+    seconds: durations in seconds.
+
+    :return the signed log bucket of each duration (0 for durations under a second). Keys sort in the
+    same order as the durations.
+    """
+    magnitude = abs(seconds)
+    keys = zeros(len(seconds), dtype="int64")
+
+    is_large = magnitude >= 1
+    keys[is_large] = (ceil(log(magnitude[is_large]) / log(sketch_gamma)) + 1) * sign(seconds[is_large])
+
+    return keys
+
+
+def sketch_values(keys: ndarray) -> ndarray:
+    """ 
+    :params
+    keys: output of `sketch_keys`.
+
+    :return the duration (seconds) that represents each bucket, within `sketch_accuracy` of every duration in it.
+    """
+    magnitude = 2 * sketch_gamma ** (abs(keys) - 1) / (sketch_gamma + 1)
+
+    return where(keys == 0, 0.0, sign(keys) * magnitude)
+
+
+def build_duration_sketches(data: DataFrame, duration_matrix: dict, date_var: str) -> dict:
+    """ 
+    Quantile sketches (log bucket counts) of every phase pair duration and of the delivered vs estimated
+    duration, for each day of the data. Day sketches merge into month sketches by adding their counts.
+
+    :params
+    data: App data.
+    duration_matrix: output of `build_duration_matrix` for the data.
+    date_var: The name of the date column used to assign each duration to a day (order_purchase_timestamp).
+
+    :return a dictionary with the available yyyymm periods and a sketch of {"day_code", "key", "count"}
+    arrays (sorted by day code yyyymmdd then key) for each pair of date columns.
+    """
+    dates = data[date_var]
+    day_codes = (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).to_numpy()
+
+    time_diffs = {pair: phase_durations["time_diff"] for pair, phase_durations in duration_matrix.items()}
+    time_diffs[estimate_pair] = (data[estimate_pair[1]] - data[estimate_pair[0]]).to_numpy()
+
+    sketches = {}
+    for pair, time_diff in time_diffs.items():
+        is_valid = ~isnat(time_diff) & ~isnan(day_codes)
+        seconds = time_diff[is_valid].astype("timedelta64[ns]").view("int64") / 10**9
+
+        bucket_counts = (
+            DataFrame({"day_code": day_codes[is_valid].astype("int64"), "key": sketch_keys(seconds)})
+            .groupby(["day_code", "key"])
+            .size()
+        )
+
+        sketches[pair] = {
+            "day_code": bucket_counts.index.get_level_values("day_code").to_numpy(),
+            "key": bucket_counts.index.get_level_values("key").to_numpy(),
+            "count": bucket_counts.to_numpy()
+        }
+
+    periods = sorted({int(code) // 100 for code in unique(day_codes[~isnan(day_codes)])})
+
+    return {"periods": periods, "sketches": sketches}
+
+
+def sketch_medians(duration_sketches: dict, pair: tuple, periods: list, group_by: str, num_unit: str) -> DataFrame:
+    """ 
+    :params
+    duration_sketches: output of `build_duration_sketches`.
+    pair: the (first date column, second date column) of the duration.
+    periods: the yyyymm periods to include.
+    group_by: either ['day', 'month'], the day of the month or the month (number) of each median.
+    num_unit: The unit of time the medians should be measured in.
+
+    :return a pandas dataframe with the group and the approximate median `period` of each group.
+    """
+    sketch = duration_sketches["sketches"][pair]
+    day_code = sketch["day_code"]
+
+    # Rows of the selected periods, each period is a contiguous block.
+    starts = day_code.searchsorted([p * 100 for p in periods], "left")
+    stops = day_code.searchsorted([p * 100 + 99 for p in periods], "right")
+    rows = concatenate([arange(start, stop) for start, stop in zip(starts, stops)] + [arange(0)])
+
+    groups = day_code[rows] % 100 if group_by == "day" else (day_code[rows] // 100) % 100
+
+    merged_counts = (
+        DataFrame({group_by: groups, "key": sketch["key"][rows], "count": sketch["count"][rows]})
+        .groupby([group_by, "key"])["count"].sum()
+    )
+
+    medians = {}
+    for group, group_counts in merged_counts.groupby(level=group_by):
+        keys = group_counts.index.get_level_values("key").to_numpy()
+        cumulative = group_counts.to_numpy().cumsum()
+        # Same as the exact median: the mean of the middle value(s).
+        middle_ranks = [(cumulative[-1] - 1) // 2, cumulative[-1] // 2]
+        middle_keys = keys[cumulative.searchsorted(middle_ranks, "right")]
+        medians[group] = sketch_values(middle_keys).mean()
+
+    return DataFrame({group_by: list(medians.keys()), "period": list(medians.values())}).assign(
+        period=lambda _: _["period"] / (unit_seconds[num_unit] if num_unit in unit_seconds else unit_seconds["week"])
+    )
+
+
+def median_duration_day(
+        data: DataFrame, 
+        date_var: str, 
+        diff_cols: list[str], 
+        period: str, 
+        summary_df: DataFrame=None
+):
     """
     :params
     data: App data with a date difference applied to the data.
     date_var: The name of the date column to extract the unique days (order_purchase_timestamp).
     diff_cols: a list of the two differenced date columns label.
+    summary_df: the median `period` of each `day` (e.g from `sketch_medians`), used instead of summarising the data.
     
-    :retrun a plotly object.
+    :retrun a plotly figure dictionary.
     """
 
-    # Create a copy of the data
-    func_df = data.copy()
-    # Summarise the duration using the median aggregate function for each days in the inputed month.
-    func_df = (
-        func_df
-        .assign(day=lambda _: _[date_var].dt.day)
-        .groupby("day")["period"].median()
-        .reset_index()
-    )
+    if summary_df is None:
+        # Create a copy of the data
+        func_df = data.copy()
+        # Summarise the duration using the median aggregate function for each days in the inputed month.
+        func_df = (
+            func_df
+            .assign(day=lambda _: _[date_var].dt.day)
+            .groupby("day")["period"].median()
+            .reset_index()
+        )
+    else:
+        func_df = summary_df
 
     # print(func_df)
 
     # Plot the result
-    fun_fig = bar(
-        data_frame=func_df,
-        x="day", y="period",
-        labels={"period": f"Period: {str.title(period)}s", "day": "Day"},
-        title=f"Median Duration from {diff_cols[0]} to {diff_cols[1]}",
-        color_discrete_sequence=[plot_color]
+    trace = bar_trace(
+        func_df["day"], func_df["period"],
+        plot_color,
+        f"<b>Day - %{{x}} </b><br><b>{str.title(period)}s: %{{y:,.2f}} </b>",
+        hover_label(plot_color, 18)
     )
 
-    fun_fig.update_traces(
-        hovertemplate = f"<b>Day - %{{x}} </b><br><b>{str.title(period)}s: %{{y:,.2f}} </b>",
-        hoverlabel=dict(
-            bgcolor="#FFFFFF",
-            font_size=18,
-            font=dict(color=plot_color),
-            bordercolor=plot_color
+    return {
+        "data": [trace],
+        "layout": figure_layout(
+            f"Median Duration from {diff_cols[0]} to {diff_cols[1]}", 
+            "Day", f"Period: {str.title(period)}s", 
+            {"showgrid": False}, 
+            barmode="relative"
         )
-    )
-
-    fun_fig.update_xaxes(showgrid=False) #, tickmode="linear", dtick=1
-
-    return fun_fig
+    }
 
 
-def median_duration_month(data: DataFrame, date_var: str, period: str, month: str):
+def median_duration_month(data: DataFrame, date_var: str, period: str, month: str, summary_df: DataFrame=None):
     """
     :params
     data: App data with a date difference applied to the data.
     date_var: The name of the date column to extract the unique days (order_purchase_timestamp).
     month: Name of the input month.
+    summary_df: the median `period` of each `month` number (e.g from `sketch_medians`), used instead of 
+    summarising the data.
 
-    :return a plotly object.
+    :return a plotly figure dictionary.
     """
-    # Copy data
-    func_df = data.copy()
-
-    # Get the available ordered month name
-    month_names = func_df[date_var].dt.strftime("%b").unique()
-    month_cat = [name for name in list(calendar.month_abbr[1:]) if name in month_names] 
-    # Summarise the duration using the median aggregate function for each month leading to the inputed month.
-    func_df = (
-        func_df
-        .assign(month=lambda _: _[date_var].dt.strftime("%b"))
-        .groupby("month")["period"].median()
-        .reset_index()
-        .assign(month=lambda _: Categorical(_["month"], categories=month_cat, ordered=True))
-        .sort_values(by="month")
-    )
+    if summary_df is None:
+        # Copy data
+        func_df = data.copy()
+
+        # Get the available ordered month name
+        month_names = func_df[date_var].dt.strftime("%b").unique()
+        month_cat = [name for name in list(calendar.month_abbr[1:]) if name in month_names] 
+        # Summarise the duration using the median aggregate function for each month leading to the inputed month.
+        func_df = (
+            func_df
+            .assign(month=lambda _: _[date_var].dt.strftime("%b"))
+            .groupby("month")["period"].median()
+            .reset_index()
+            .assign(month=lambda _: Categorical(_["month"], categories=month_cat, ordered=True))
+            .sort_values(by="month")
+        )
+    else:
+        func_df = (
+            summary_df
+            .sort_values(by="month")
+            .assign(month=lambda _: [calendar.month_abbr[month_id] for month_id in _["month"]])
+        )
 
     # Plot the result
-    func_fig = line(
-        data_frame=func_df, 
-        x="month", y="period",
-        markers=True,
-        labels={"period": f"{str.title(period)}s", "month": "Month"},
-        title=f"Median Duration Up to {month}",
-        color_discrete_sequence=[plot_color]
+    trace = line_trace(
+        func_df["month"].astype(str), func_df["period"],
+        plot_color,
+        f"<b>%{{x}} </b><br><b>{str.title(period)}s: %{{y:,.2f}} </b>",
+        hover_label(plot_color, 18),
+        marker_style(plot_color, 12)
     )
 
-    func_fig.update_traces(
-        marker=dict(
-            size=12,
-            color="#FFFFFF",
-            line=dict(width=2, color=plot_color)
-        ),
-        hovertemplate=f"<b>%{{x}} </b><br><b>{str.title(period)}s: %{{y:,.2f}} </b>",
-        hoverlabel=dict(
-            bgcolor="#FFFFFF",
-            font_size=18,
-            font=dict(color=plot_color),
-            bordercolor=plot_color
-        )
-    )
-    return func_fig
+    return {
+        "data": [trace],
+        "layout": figure_layout(f"Median Duration Up to {month}", "Month", f"{str.title(period)}s")
+    }
 
 
 def get_min_max_duration(data: DataFrame) -> dict:
@@ -295,15 +476,25 @@ def get_min_max_duration(data: DataFrame) -> dict:
         }
 
 
-def estimate_actual(data: DataFrame, num_unit: str="day"):
+def estimate_actual(data: DataFrame, num_unit: str="day", summary_df: DataFrame=None):
     """
     :params
     data: App (Filterd) data.
     num_unit: The unit of time the difference should be measured.
+    summary_df: the median `Estimated` (delivered - estimated) and `Actual` (delivered - placement) duration 
+    of each `day`, used instead of summarising the data.
 
-    :return a plotly object.
+    :return a plotly figure dictionary.
     """
 
+    if summary_df is not None:
+        func_df = (
+            summary_df
+            .assign(Estimated=lambda _: abs(_["Estimated"]))
+            .melt(id_vars="day", var_name="type", value_name=f"median_{num_unit}")
+        )
+        return estimate_actual_figure(func_df, num_unit)
+
     # Make a copy of the supplied data
     func_df = data.copy()
 
@@ -335,25 +526,42 @@ def estimate_actual(data: DataFrame, num_unit: str="day"):
         .assign(Estimated=lambda _: abs(_["Estimated"]))
         .melt(id_vars="day", var_name="type", value_name=f"median_{num_unit}")
     )
-    
-    # Plot output
-    func_fig = line(
-        data_frame=func_df,
-        x="day", y=f"median_{num_unit}", color="type",
-        custom_data=["type"],
-        title="Median Delivery Duration (Extimate vs Actual)",
-        labels={f"median_{num_unit}": f"{str.title(num_unit)}s", "day": "Days"},
-        color_discrete_sequence=["#087F5B", "#96F2D7"]
-    )
 
-    func_fig.update_traces(
-        hovertemplate = "<b>%{customdata[0]}</b><br><b>Day: %{x}</b><br><b>Median: %{y:,.1f}</b><extra></extra>",
-        hoverlabel=dict(font_size=18)
-    )
+    return estimate_actual_figure(func_df, num_unit)
 
-    func_fig.update_xaxes(showgrid=False) # ,tickmode="linear", dtick=1
 
-    return func_fig
+def estimate_actual_figure(func_df: DataFrame, num_unit: str):
+    """
+    :params
+    func_df: the melted median duration of each day and type (Estimated/Actual).
+    num_unit: The unit of time the difference was measured in.
+
+    :return a plotly figure dictionary.
+    """
+    # One line per type, in order of appearance.
+    traces = [
+        line_trace(
+            type_df["day"], type_df[f"median_{num_unit}"],
+            type_color,
+            "<b>%{customdata[0]}</b><br><b>Day: %{x}</b><br><b>Median: %{y:,.1f}</b><extra></extra>",
+            hover_label(font_size=18),
+            name=type_name,
+            customdata=[[type_name]] * len(type_df)
+        )
+        for (type_name, type_df), type_color in zip(
+            func_df.groupby("type", sort=False), ["#087F5B", "#96F2D7"]
+        )
+    ]
+
+    return {
+        "data": traces,
+        "layout": figure_layout(
+            "Median Delivery Duration (Extimate vs Actual)", 
+            "Days", f"{str.title(num_unit)}s", 
+            {"showgrid": False}, 
+            legend={"title": {"text": "type"}, "tracegroupgap": 0}
+        )
+    }
 
 
 
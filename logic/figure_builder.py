@@ -0,0 +1,192 @@
+from json import dumps, loads
+import plotly.io as pio
+
+from logic.server_timing import timed
+
+
+# Figure dictionaries built from fixed templates, the same figures plotly express returns for the app's
+# charts without building the internal data frames and validating every property. The layout and trace
+# builders are the figure assembly of a callback (`figure` phase of the Server-Timing header).
+
+# Template of every chart (plotly_white), serialised once.
+figure_template = loads(dumps(pio.templates["plotly_white"].to_plotly_json()))
+
+axis_domain = [0.0, 1.0]
+
+
+def values_list(values) -> list:
+    """
+    :return a list of the values of an array, series or list.
+    """
+    return values.tolist() if hasattr(values, "tolist") else list(values)
+
+
+def hover_label(color: str=None, font_size: int=16) -> dict:
+    """
+    :return the hover label style, white with a `color` border and text (or the default style when color is None).
+    """
+    if color is None:
+        return {"font": {"size": font_size}}
+
+    return {"bgcolor": "#FFFFFF", "bordercolor": color, "font": {"color": color, "size": font_size}}
+
+
+def marker_style(color: str, size: int) -> dict:
+    """
+    :return the style of a white line chart marker with a `color` outline.
+    """
+    return {"color": "#FFFFFF", "line": {"color": color, "width": 2}, "size": size, "symbol": "circle"}
+
+
+@timed("figure")
+def figure_layout(title: str, x_title: str=None, y_title: str=None, xaxis: dict=None, **layout) -> dict:
+    """
+    :params
+    title: the chart title.
+    x_title, y_title: the axis titles (no cartesian axes when both are None).
+    xaxis: extra x axis properties, e.g showgrid.
+    layout: extra layout properties.
+
+    :return a figure layout dictionary.
+    """
+    func_layout = {"template": figure_template, "legend": {"tracegroupgap": 0}, **layout}
+
+    if title is None:
+        func_layout["margin"] = {"t": 60}
+    else:
+        func_layout["title"] = {"text": title}
+
+    if x_title is not None or y_title is not None:
+        func_layout["xaxis"] = {"anchor": "y", "domain": axis_domain, "title": {"text": x_title}, **(xaxis or {})}
+        func_layout["yaxis"] = {"anchor": "x", "domain": axis_domain, "title": {"text": y_title}}
+
+    return func_layout
+
+
+@timed("figure")
+def line_trace(
+        x, y,
+        color: str,
+        hovertemplate: str,
+        hoverlabel: dict,
+        marker: dict=None,
+        name: str="",
+        customdata: list=None
+    ) -> dict:
+    """
+    :params
+    x, y: the values of the line.
+    color: the line color.
+    hovertemplate: the hover text template.
+    hoverlabel: the hover label style.
+    marker: the marker style, a line without markers when None.
+    name: the name of the line (a legend entry is added when not empty).
+    customdata: extra values of every point, used in the hover template.
+
+    :return a scatter trace dictionary.
+    """
+    trace = {
+        "hoverlabel": hoverlabel,
+        "hovertemplate": hovertemplate,
+        "legendgroup": name,
+        "line": {"color": color, "dash": "solid"},
+        "marker": marker if marker is not None else {"symbol": "circle"},
+        "mode": "lines+markers" if marker is not None else "lines",
+        "name": name,
+        "orientation": "v",
+        "showlegend": name != "",
+        "type": "scatter",
+        "x": values_list(x),
+        "xaxis": "x",
+        "y": values_list(y),
+        "yaxis": "y"
+    }
+
+    if customdata is not None:
+        trace["customdata"] = customdata
+
+    return trace
+
+
+@timed("figure")
+def bar_trace(x, y, color: str, hovertemplate: str, hoverlabel: dict) -> dict:
+    """
+    :params
+    x, y: the values of the bars.
+    color: the bar color.
+    hovertemplate: the hover text template.
+    hoverlabel: the hover label style.
+
+    :return a bar trace dictionary.
+    """
+    return {
+        "alignmentgroup": "True",
+        "hoverlabel": hoverlabel,
+        "hovertemplate": hovertemplate,
+        "legendgroup": "",
+        "marker": {"color": color, "pattern": {"shape": ""}},
+        "name": "",
+        "offsetgroup": "",
+        "orientation": "v",
+        "showlegend": False,
+        "textposition": "auto",
+        "type": "bar",
+        "x": values_list(x),
+        "xaxis": "x",
+        "y": values_list(y),
+        "yaxis": "y"
+    }
+
+
+@timed("figure")
+def pie_trace(labels, values, hole: float, hovertemplate: str, hoverlabel: dict) -> dict:
+    """
+    :params
+    labels, values: the names and values of the slices.
+    hole: the fraction of the radius cut out of the pie (donut chart).
+    hovertemplate: the hover text template.
+    hoverlabel: the hover label style.
+
+    :return a pie trace dictionary, without slice text.
+    """
+    return {
+        "domain": {"x": axis_domain, "y": axis_domain},
+        "hole": hole,
+        "hoverlabel": hoverlabel,
+        "hovertemplate": hovertemplate,
+        "labels": values_list(labels),
+        "legendgroup": "",
+        "name": "",
+        "showlegend": True,
+        "textposition": "none",
+        "type": "pie",
+        "values": values_list(values)
+    }
+
+
+@timed("figure")
+def empty_figure(trace_type: str="scatter") -> dict:
+    """
+    :params
+    trace_type: either ['scatter', 'pie'].
+
+    :return an empty figure dictionary (an empty `px.line()` or `px.pie()`).
+    """
+    trace = {"hovertemplate": "<extra></extra>", "legendgroup": "", "name": "", "showlegend": False, "type": trace_type}
+
+    if trace_type == "pie":
+        return {"data": [{"domain": {"x": axis_domain, "y": axis_domain}, **trace}], "layout": figure_layout(None)}
+
+    trace.update({
+        "line": {"color": "#636efa", "dash": "solid"},
+        "marker": {"symbol": "circle"},
+        "mode": "lines",
+        "orientation": "v",
+        "xaxis": "x",
+        "yaxis": "y"
+    })
+    layout = figure_layout(None)
+    layout["xaxis"] = {"anchor": "y", "domain": axis_domain}
+    layout["yaxis"] = {"anchor": "x", "domain": axis_domain}
+
+    return {"data": [trace], "layout": layout}
@@ -0,0 +1,124 @@
+from json import loads
+from hashlib import sha1
+from glob import glob
+from os.path import dirname, join
+import plotly.io as pio
+
+from logic.server_timing import timed
+
+try:
+    from diskcache import Cache
+except ImportError:
+    # Without diskcache every figure is built on request.
+    Cache = None
+
+
+# Shared by every app worker on the host.
+figure_cache_directory = "cache/figures"
+figure_cache_size_limit = 2**28  # 256MB
+
+# Packages of the figure builders, a change to their code starts a new set of cache keys so figures of a
+# previous deploy are never served.
+figure_code_packages = ["logic", "components"]
+
+_figure_cache = None
+_figure_code_version = None
+
+
+def figure_code_version() -> str:
+    """
+    :return a hash of the source files of the figure builders (`figure_code_packages`), computed once per process.
+    """
+    global _figure_code_version
+
+    if _figure_code_version is None:
+        root = dirname(dirname(__file__))
+        code_hash = sha1()
+
+        for package in figure_code_packages:
+            for path in sorted(glob(join(root, package, "*.py"))):
+                with open(path, "rb") as source_file:
+                    code_hash.update(source_file.read())
+
+        _figure_code_version = code_hash.hexdigest()[:16]
+
+    return _figure_code_version
+
+
+def get_figure_cache():
+    """
+    :return the disk backed figure cache (least recently used figures are evicted past the size limit),
+    or None when diskcache is not installed.
+    """
+    global _figure_cache
+
+    if _figure_cache is None and Cache is not None:
+        _figure_cache = Cache(
+            figure_cache_directory,
+            size_limit=figure_cache_size_limit,
+            eviction_policy="least-recently-used",
+            statistics=True
+        )
+
+    return _figure_cache
+
+
+def cached_figure(snapshot_id: str, function_name: str, arguments: tuple, build_figure):
+    """
+    Only the cache read/write and the JSON (de)serialisation are timed as `figure`, the summaries inside
+    `build_figure` report their own phases (data / compute, figure assembly in logic/figure_builder.py).
+
+    :params
+    snapshot_id: the snapshot id of the data the figure is built from.
+    function_name: the name of the function that builds the figure.
+    arguments: the (hashable) callback inputs the figure depends on, e.g month, phases and period.
+    build_figure: a function without arguments that returns the plotly figure.
+
+    :return the figure as a dictionary, read from the cache or built and stored on a miss.
+    """
+    figure_cache = get_figure_cache()
+
+    if figure_cache is None:
+        return build_figure()
+
+    key = (figure_code_version(), snapshot_id, function_name, *arguments)
+    with timed("figure"):
+        figure_json = figure_cache.get(key)
+
+    if figure_json is None:
+        figure = build_figure()
+
+        with timed("figure"):
+            figure_json = pio.to_json(figure, validate=False)
+            figure_cache.set(key, figure_json)
+
+    with timed("figure"):
+        return loads(figure_json)
+
+
+def figure_cache_stats() -> dict:
+    """
+    :return a dictionary with the hit/miss counters (summed over every worker), number of figures and size.
+    """
+    figure_cache = get_figure_cache()
+
+    if figure_cache is None:
+        return {"hits": 0, "misses": 0, "count": 0, "size": 0}
+
+    hits, misses = figure_cache.stats()
+
+    return {"hits": hits, "misses": misses, "count": len(figure_cache), "size": figure_cache.volume()}
+
+
+def figure_cache_metrics() -> list:
+    """
+    :return the figure cache metrics as a list of (name, help text, type, value), see `register_metrics_collector`.
+    """
+    stats = figure_cache_stats()
+
+    return [
+        ("dash_figure_cache_hits_total", "Figure cache reads that found the figure.", "counter", stats["hits"]),
+        ("dash_figure_cache_misses_total", "Figure cache reads that built the figure.", "counter", stats["misses"]),
+        ("dash_figure_cache_figures", "Number of figures in the figure cache.", "gauge", stats["count"]),
+        ("dash_figure_cache_bytes", "Size of the figure cache on disk.", "gauge", stats["size"])
+    ]
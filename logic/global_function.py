@@ -1,6 +1,11 @@
-from pandas import DataFrame, to_datetime
+from pandas import DataFrame, Timestamp, Timedelta, to_datetime, read_csv
+from pandas.api.types import is_datetime64_any_dtype
+from numpy import array, arange, concatenate
 import calendar
 
+from logic.data_cache import read_cache, write_cache, source_signature
+from logic.server_timing import timed
+
 
 def check_valid_month_name(month_name: str) -> list:
     """ 
@@ -19,65 +24,310 @@ def check_valid_month_name(month_name: str) -> list:
         return {"error": False, "message": "Valid month name"}
     
 
+# Date columns of each dataset type.
+date_columns = {
+    "orders": [
+        "order_purchase_timestamp", 
+        "order_approved_at", 
+        "order_delivered_carrier_date", 
+        "order_delivered_customer_date",
+        "order_estimated_delivery_date"
+    ],
+    "customer": ["order_purchase_timestamp"],
+    "seller": ["order_purchase_timestamp", "order_delivered_customer_date", "shipping_limit_date"]
+}
+
+# Month name -> month number
+month_ids = {name: idx for idx, name in enumerate(calendar.month_name) if name}
+
+# Partition index: data sorted by `month_index_var` with an integer yyyymm period column.
+month_index_var = "order_purchase_timestamp"
+month_index_column = "year_month"
+missing_period = 999999
+
+# All source timestamps are written as 'YYYY-MM-DD[ HH:MM:SS]'.
+date_format = "ISO8601"
+
+
+@timed("data")
 def clean_date(data: DataFrame, data_type: str) -> DataFrame:
     """ 
+    :params
+    data: App data.
+    data_type: either ['orders', 'customer', 'seller'].
+
+    :return a pandas dataframe with datetime64 date columns. Data that is already typed is returned
+    as it is, otherwise a converted copy is returned (the supplied data is never modified).
     """
+    date_cols = date_columns.get(data_type, date_columns["seller"])
 
-    if data_type == "orders":
-        date_cols = [
-            "order_purchase_timestamp", 
-            "order_approved_at", 
-            "order_delivered_carrier_date", 
-            "order_delivered_customer_date",
-            "order_estimated_delivery_date"
-        ]
-    elif data_type == "customer":
-        date_cols = ["order_purchase_timestamp"]
-    else:
-        date_cols = ["order_purchase_timestamp", "order_delivered_customer_date", "shipping_limit_date"]
+    untyped_cols = [date for date in date_cols if not is_datetime64_any_dtype(data[date])]
+    if not untyped_cols:
+        return data
+
+    return data.assign(**{date: to_datetime(data[date], format=date_format) for date in untyped_cols})
+
+
+def read_data(path: str, data_type: str, use_cache: bool=True) -> DataFrame:
+    """ 
+    Typed ingest of a source csv file, the date columns are parsed once here. The typed data is
+    cached as parquet next to the csv file and reused until the csv size or modification time changes.
+
+    :params
+    path: path to the csv file.
+    data_type: either ['orders', 'customer', 'seller'].
+    use_cache: whether to read/write the parquet cache.
+
+    :return a pandas dataframe.
+    """
+    if use_cache:
+        cached_data = read_cache(path)
+        if cached_data is not None:
+            return clean_date(cached_data, data_type)
+
+        signature = source_signature(path)
+
+    data = clean_date(read_csv(path), data_type)
+
+    if use_cache:
+        write_cache(data, path, signature)
 
-    for date in date_cols:
-        data[date] = to_datetime(data[date])
-    
     return data
 
 
+def build_month_index(data: DataFrame, date_var: str=month_index_var) -> DataFrame:
+    """ 
+    Year-month partition index, built once per dataset snapshot.
+
+    :params
+    data: App data.
+    date_var: the date column to partition the data by.
+
+    :return a copy of the data sorted by `date_var` with an integer (yyyymm) `year_month` column.
+    Rows with a missing date get a period code that is never selected.
+    """
+    func_df = data.sort_values(by=date_var, kind="stable", na_position="last").reset_index(drop=True)
+
+    func_df[month_index_column] = (
+        (func_df[date_var].dt.year * 100 + func_df[date_var].dt.month)
+        .fillna(missing_period)
+        .astype("int64")
+    )
+    return func_df
+
+
+def has_month_index(df: DataFrame, date_var: str) -> bool:
+    """ 
+    :return a boolean, whether the data carries the partition index of `date_var`. Row subsets of an
+    indexed frame keep their order, so they can be sliced in the same way.
+    """
+    return date_var == month_index_var and month_index_column in df.columns
+
+
+def month_offsets(df: DataFrame) -> dict:
+    """ 
+    :params
+    df: data returned by `build_month_index` (or a row subset of it).
+
+    :return a dictionary of {yyyymm: (start row, stop row)} for every period in the data.
+    """
+    codes = df[month_index_column].to_numpy()
+    valid_count = codes.searchsorted(missing_period, "left")
+
+    if valid_count == 0:
+        return {}
+
+    first_year, first_month = divmod(int(codes[0]), 100)
+    last_year, last_month = divmod(int(codes[valid_count-1]), 100)
+    periods = array([
+        year * 100 + month 
+        for year in range(first_year, last_year+1) 
+        for month in range(1, 13)
+        if (year, month) >= (first_year, first_month) and (year, month) <= (last_year, last_month)
+    ])
+
+    starts = codes.searchsorted(periods, "left")
+    stops = codes.searchsorted(periods, "right")
+
+    return {int(p): (int(a), int(b)) for p, a, b in zip(periods, starts, stops) if b > a}
+
+
+def take_periods(df: DataFrame, offsets: dict, periods: list) -> DataFrame:
+    """ 
+    :params
+    df: data returned by `build_month_index` (or a row subset of it).
+    offsets: output of `month_offsets`.
+    periods: the yyyymm periods to keep.
+
+    :return the rows of the selected periods, as a single slice when they are contiguous.
+    """
+    ranges = []
+    for start, stop in sorted(offsets[p] for p in periods if p in offsets):
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = stop
+        else:
+            ranges.append([start, stop])
+
+    if len(ranges) == 0:
+        return df.iloc[0:0]
+    elif len(ranges) == 1:
+        return df.iloc[ranges[0][0]:ranges[0][1]]
+    else:
+        return df.iloc[concatenate([arange(start, stop) for start, stop in ranges])]
+
+
+def period_code(year: int, month_id: int) -> int:
+    """ 
+    :return the integer yyyymm period of a (year, month number).
+    """
+    return year * 100 + month_id
+
+
+def previous_period(period: int) -> int:
+    """ 
+    :return the yyyymm period of the month before `period` (December of the previous year for January).
+    """
+    return period - 1 if period % 100 > 1 else period - 100 + 11
+
+
+def previous_year_period(period: int) -> int:
+    """ 
+    :return the yyyymm period of the same month in the previous year.
+    """
+    return period - 100
+
+
+def period_years(periods: list) -> list:
+    """ 
+    :params
+    periods: a list of yyyymm periods (e.g the keys of `month_offsets` or a KPI cube index).
+
+    :return the sorted list of the years of the periods.
+    """
+    return sorted({int(p) // 100 for p in periods if p != missing_period})
+
+
+def latest_year(periods: list) -> int | None:
+    """ 
+    :return the year of the last period, None when there is no period.
+    """
+    years = period_years(periods)
+    return years[-1] if years else None
+
+
+def date_period_codes(df: DataFrame, date_var: str):
+    """ 
+    :return the integer yyyymm period of every row of the data (NaN for a missing date).
+    """
+    return df[date_var].dt.year * 100 + df[date_var].dt.month
+
+
+def data_periods(df: DataFrame, date_var: str) -> list:
+    """ 
+    :params
+    df: App data, data with a partition index (`build_month_index`) is read from its offsets instead of scanned.
+    date_var: a date variable from the df.
+
+    :return the sorted list of the yyyymm periods of the data.
+    """
+    if has_month_index(df, date_var):
+        return list(month_offsets(df))
+
+    return sorted(int(p) for p in date_period_codes(df, date_var).dropna().unique())
+
+
+def select_periods(
+        periods: list, 
+        month_name: str, 
+        leading_up_to_month: bool=False,
+        drop_prev_year: bool=False,
+        year: int=None
+) -> list:
+    """
+    The period version of `filter_month`.
+
+    :params
+    periods: a list of yyyymm periods.
+    month_name: input month name.
+    leading_up_to_month: whether to include all the months from December of the previous year up to the input month.
+    drop_prev_year: whether to drop the previous year periods (the window then starts in January).
+    year: the year of the input month, the latest year of the periods when None.
+
+    :return a list of the selected yyyymm periods.
+    """
+    month_id = month_ids[month_name]
+
+    if year is None:
+        year = latest_year(periods)
+        if year is None:
+            return []
+
+    current = period_code(year, month_id)
+
+    if leading_up_to_month:
+        first = period_code(year, 1) if drop_prev_year else period_code(year - 1, 12)
+        return [p for p in periods if first <= p <= current]
+    else:
+        return [p for p in periods if p == current]
+
+
+@timed("data")
+def filter_periods(df: DataFrame, date_var: str, periods: list) -> dict:
+    """
+    :params
+    df: App data, data with a partition index (`build_month_index`) is sliced instead of scanned.
+    date_var: a date variable from the df, used to filter the data.
+    periods: the yyyymm periods to keep.
+
+    :return A dictionary containing boolean error and pandas dataframe.
+    """
+    try:
+        if has_month_index(df, date_var):
+            return {"error": False, "message": " ", "data": take_periods(df, month_offsets(df), periods)}
+
+        return {"error": False, "message": " ", "data": df[date_period_codes(df, date_var).isin(periods)]}
+
+    except ValueError as e:
+        return {
+            "error": True,
+            "message": f"An Error occured while filtering the data: {e}",
+            "data": None
+        }
+
+
+@timed("data")
 def filter_month(
         df: DataFrame, 
         date_var: str, 
         month_name: str, 
         leading_up_to_month: bool=False,
-        drop_prev_year: bool=False
+        drop_prev_year: bool=False,
+        year: int=None
 ) -> dict:
     """
     :params
-    df:
-    date_var:
-    month_name:
-    leading_up_to_month:
-    drop_prev_year:
+    df: App data, data with a partition index (`build_month_index`) is sliced instead of scanned.
+    date_var: a date variable from the df, used to filter the data.
+    month_name: input month name.
+    leading_up_to_month: whether to include all the months from December of the previous year up to the input month.
+    drop_prev_year: whether to drop the previous year data (the window then starts in January).
+    year: the year of the input month, the latest year of the data when None.
 
     :return A dictionary containing boolean error and pandas dataframe.
     """
-    # List of month names
-    month_names = list(calendar.month_name[1:])
-    # Create month dictionary with month id
-    month_dic = {month_names[i] : i+1 for i in range(len(month_names))}
-
     try:
-        # Get the period between the 12th month of 2017 and the inputed month.
-        if leading_up_to_month:
-            func_df = df[
-                ((df[date_var].dt.year == 2017) & (df[date_var].dt.month == 12)) | (df[date_var].dt.month <= month_dic[month_name])
-            ]
-        else:
-            func_df = df[df[date_var].dt.month == month_dic[month_name]]
+        if has_month_index(df, date_var):
+            offsets = month_offsets(df)
+            periods = select_periods(offsets, month_name, leading_up_to_month, drop_prev_year, year)
 
-        # Drop previous year (2017) data.
-        if drop_prev_year:
-            func_df = func_df[func_df[date_var].dt.year != 2017]
+            return {"error": False, "message": " ", "data": take_periods(df, offsets, periods)}
 
-        return {"error": False, "message": " ", "data": func_df}
+        codes = date_period_codes(df, date_var)
+        periods = select_periods(
+            sorted(int(p) for p in codes.dropna().unique()), month_name, leading_up_to_month, drop_prev_year, year
+        )
+
+        return {"error": False, "message": " ", "data": df[codes.isin(periods)]}
     
     except ValueError as e:
         return {
@@ -85,6 +335,82 @@ def filter_month(
             "message": f"An Error occured while filtering the data: {e}",
             "data": None
         }
-    
 
 
+def date_range_bounds(start_date: str=None, end_date: str=None) -> tuple:
+    """
+    :params
+    start_date: first day of the range, None for no lower bound.
+    end_date: last day of the range (the whole day is included), None for no upper bound.
+
+    :return a tuple of (inclusive start, exclusive stop) timestamps, None for an open bound.
+    """
+    start = Timestamp(start_date).normalize() if start_date is not None else None
+    stop = Timestamp(end_date).normalize() + Timedelta(days=1) if end_date is not None else None
+
+    if start is not None and stop is not None and start >= stop:
+        raise ValueError(f"the start date {start_date} is after the end date {end_date}")
+
+    return (start, stop)
+
+
+def date_range_offsets(df: DataFrame, date_var: str, start_date: str=None, end_date: str=None) -> tuple:
+    """ 
+    :params
+    df: data returned by `build_month_index` (or a row subset of it).
+    date_var: the date column the data is sorted by.
+    start_date, end_date: the first and last day of the range.
+
+    :return a tuple of the (start row, stop row) of the range, found by binary search on the sorted dates.
+    """
+    start, stop = date_range_bounds(start_date, end_date)
+    dates = df[date_var].to_numpy()
+
+    # Rows with a missing date are sorted last and never selected.
+    start_row = dates.searchsorted(start.to_datetime64(), "left") if start is not None else 0
+    stop_row = (
+        dates.searchsorted(stop.to_datetime64(), "left") if stop is not None 
+        else df[month_index_column].to_numpy().searchsorted(missing_period, "left")
+    )
+
+    return (int(start_row), int(stop_row))
+
+
+@timed("data")
+def filter_date_range(
+        df: DataFrame, 
+        date_var: str, 
+        start_date: str=None, 
+        end_date: str=None
+) -> dict:
+    """
+    :params
+    df: App data, data with a partition index (`build_month_index`) is sliced instead of scanned.
+    date_var: a date variable from the df, used to filter the data.
+    start_date: first day of the range, None for no lower bound.
+    end_date: last day of the range (the whole day is included), None for no upper bound.
+
+    :return A dictionary containing boolean error and pandas dataframe.
+    """
+    try:
+        if has_month_index(df, date_var):
+            start_row, stop_row = date_range_offsets(df, date_var, start_date, end_date)
+
+            return {"error": False, "message": " ", "data": df.iloc[start_row:stop_row]}
+
+        start, stop = date_range_bounds(start_date, end_date)
+
+        func_df = df[df[date_var].notna()]
+        if start is not None:
+            func_df = func_df[func_df[date_var] >= start]
+        if stop is not None:
+            func_df = func_df[func_df[date_var] < stop]
+
+        return {"error": False, "message": " ", "data": func_df}
+
+    except ValueError as e:
+        return {
+            "error": True,
+            "message": f"An Error occured while filtering the data: {e}",
+            "data": None
+        }
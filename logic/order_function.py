@@ -1,23 +1,174 @@
-from pandas import DataFrame, Categorical
-from numpy import where
+from pandas import DataFrame, Series, factorize
+from numpy import where, zeros, packbits, uint8, uint64, array
+try:
+    from numpy import bitwise_count
+except ImportError:
+    bitwise_count = None
 import calendar
-import plotly.express as px
-from plotly.express import bar, line, pie
-import plotly.io as pio
 
-pio.templates.default = "plotly_white"
-
-from logic.global_function import filter_month
+from logic.figure_builder import (
+    figure_layout, line_trace, bar_trace, pie_trace, hover_label, marker_style, empty_figure
+)
+
+from logic.global_function import (
+    check_valid_month_name,
+    filter_month, 
+    filter_periods,
+    select_periods, 
+    data_periods,
+    date_period_codes,
+    latest_year,
+    period_code,
+    previous_period,
+    previous_year_period,
+    month_ids,
+    build_month_index, 
+    has_month_index, 
+    month_index_column, 
+    missing_period,
+    month_offsets
+)
 
 plot_color = "#38D9A9"
 
+# Number of set bits of every byte value (used when numpy has no `bitwise_count`, numpy < 2.0).
+popcount_table = array([bin(i).count("1") for i in range(256)], dtype=uint8)
+
+
+def build_kpi_cube(df: DataFrame, date_var: str) -> DataFrame:
+    """
+    Monthly KPI cube, built once per data snapshot.
+
+    :params
+    df: App data.
+    date_var: a date variable from the df, used to assign each row to a month.
+
+    :return a pandas dataframe indexed by the yyyymm period with the order count of each month and, when
+    the data has a `customer_unique_id`, the distinct customer count.
+    """
+    if not has_month_index(df, date_var):
+        df = build_month_index(df, date_var)
+
+    func_df = df[df[month_index_column] != missing_period]
+    period_group = func_df.groupby(month_index_column)
+
+    kpi_cube = period_group.size().to_frame("orders")
+
+    if "customer_unique_id" in func_df.columns:
+        kpi_cube["customers"] = period_group["customer_unique_id"].nunique()
+
+    return kpi_cube
+
+
+def build_status_cube(df: DataFrame, date_var: str) -> DataFrame:
+    """
+    Status by month order counts, built once per data snapshot.
+
+    :params
+    df: App data with an `order_status`.
+    date_var: a date variable from the df, used to assign each row to a month.
+
+    :return a pandas dataframe indexed by the yyyymm period with the order count of each status (column).
+    """
+    if not has_month_index(df, date_var):
+        df = build_month_index(df, date_var)
+
+    func_df = df[df[month_index_column] != missing_period]
+
+    return func_df.groupby([month_index_column, "order_status"]).size().unstack(fill_value=0)
+
+
+def kpi_cube_count(kpi_cube: DataFrame, periods: list, output_type: str) -> int | None:
+    """
+    :params
+    kpi_cube: output of `build_kpi_cube`.
+    periods: the yyyymm periods to count.
+    output_type: either ['orders', 'customer']
+
+    :return the number of orders/distinct customers over the periods, or None when the distinct customers
+    can not be read from the cube (a window of more than one month, see `distinct_customers`).
+    """
+    periods = sorted(p for p in periods if p in kpi_cube.index)
+
+    if output_type == "orders":
+        return int(kpi_cube.loc[periods, "orders"].sum())
+    elif len(periods) == 0:
+        return 0
+    elif len(periods) == 1:
+        return int(kpi_cube.at[periods[0], "customers"])
+    else:
+        return None
+
+
+def build_customer_bitmaps(df: DataFrame, date_var: str) -> dict:
+    """
+    Dictionary encode each customer to a dense integer id and keep one bitmap of customers per month.
+
+    :params
+    df: App data with a `customer_unique_id`.
+    date_var: a date variable from the df, used to assign each row to a month.
+
+    :return a dictionary with the number of customers and the {yyyymm: uint64 bitmap} of each month.
+    """
+    if not has_month_index(df, date_var):
+        df = build_month_index(df, date_var)
+
+    customer_ids, customer_names = factorize(df["customer_unique_id"])
+    # Bitmaps are whole uint64 words.
+    word_count = (len(customer_names) + 63) // 64
+
+    bitmaps = {}
+    for period, (start, stop) in month_offsets(df).items():
+        period_ids = customer_ids[start:stop]
+
+        is_customer = zeros(word_count * 64, dtype=bool)
+        is_customer[period_ids[period_ids >= 0]] = True
+        bitmaps[period] = packbits(is_customer, bitorder="little").view(uint64)
+
+    return {"customer_count": len(customer_names), "bitmaps": bitmaps}
+
+
+def distinct_customers(customer_bitmaps: dict, periods: list) -> int:
+    """
+    :params
+    customer_bitmaps: output of `build_customer_bitmaps`.
+    periods: the yyyymm periods to count.
+
+    :return the exact number of distinct customers over the periods (union of the month bitmaps).
+    """
+    bitmaps = [customer_bitmaps["bitmaps"][p] for p in periods if p in customer_bitmaps["bitmaps"]]
+
+    if len(bitmaps) == 0:
+        return 0
 
-def get_stats_numbers(df: DataFrame, date_var: str, month_name: str, output_type: str) -> dict:
+    union = bitmaps[0].copy()
+    for bitmap in bitmaps[1:]:
+        union |= bitmap
+
+    if bitwise_count is not None:
+        return int(bitwise_count(union).sum())
+    else:
+        return int(popcount_table[union.view(uint8)].sum())
+
+
+def get_stats_numbers(
+        df: DataFrame, 
+        date_var: str, 
+        month_name: str, 
+        output_type: str, 
+        kpi_cube: DataFrame=None,
+        customer_bitmaps: dict=None,
+        year: int=None
+) -> dict:
     """
     :params
     df: App data.
     month_name: input month name.
     output_type: either ['orders', 'customer']
+    kpi_cube: output of `build_kpi_cube`, the counts are read from it instead of filtering the df.
+    customer_bitmaps: output of `build_customer_bitmaps`, used for the customer windows that the
+    kpi_cube can not answer.
+    year: the year of the input month, the latest year of the data when None.
 
     :return a dictionary of Order volume values.
     """
@@ -37,35 +188,41 @@ def get_stats_numbers(df: DataFrame, date_var: str, month_name: str, output_type
         error_dict["message"] = "Invalid `output_type` value. Please input either 'orders' or 'customer'"
         return error_dict
     
-    # Get the list of month name and assign them their respective ids
-    month_list = list(calendar.month_name[1:])
-    month_dic = {month_list[i] : i+1 for i in range(len(month_list))}
-    # Get previous month name 
-    if month_name != "January":
-        previous_month_dict = {name: value for name, value in month_dic.items() if value == month_dic[month_name]-1}
-    else:
-        previous_month_dict = {"December": 12}
-    previous_month_name = [name for name in previous_month_dict.keys()][0]
-    
-    try:
-        # Get all the rows of for the total orders leading up to the input month, the current month and
-        # previous month.
-        total_month_df = filter_month(df, date_var, month_name, True)["data"]
-        current_month_df = filter_month(df, date_var, month_name, False)["data"]
-        previous_month_df = filter_month(df, date_var, previous_month_name, False)["data"]
+    def window_count(periods: list) -> int:
+        if kpi_cube is not None:
+            count = kpi_cube_count(kpi_cube, periods, output_type)
+            if count is not None:
+                return count
 
+        if output_type == "customer" and customer_bitmaps is not None:
+            return distinct_customers(customer_bitmaps, periods)
+
+        window_df = filter_periods(df, date_var, periods)["data"]
         if output_type == "orders":
-            total_month = total_month_df.shape[0]
-            current_month = current_month_df.shape[0]
-            previous_month = previous_month_df.shape[0]
+            return window_df.shape[0]
         else:
-            total_month = total_month_df["customer_unique_id"].nunique()
-            current_month = current_month_df["customer_unique_id"].nunique()
-            previous_month = previous_month_df["customer_unique_id"].nunique()
+            return window_df["customer_unique_id"].nunique()
+
+    try:
+        periods = list(kpi_cube.index) if kpi_cube is not None else data_periods(df, date_var)
+        if year is None:
+            year = latest_year(periods)
+
+        # The current and previous (yyyymm) periods of the input month, every window is empty when the data 
+        # has no dated rows.
+        current_period = period_code(year, month_ids[month_name]) if year is not None else missing_period
+        prev_period = previous_period(current_period)
+
+        # Get the count for the total orders leading up to the input month, the current month and
+        # previous month.
+        total_month = window_count(select_periods(periods, month_name, True, False, year))
+        current_month = window_count([current_period])
+        previous_month = window_count([prev_period])
 
-        percentage_total = int((current_month / total_month)*100)
+        # A date range can leave a window without any order.
+        percentage_total = int((current_month / total_month)*100) if total_month > 0 else 0
 
-        change = round((current_month - previous_month) / previous_month * 100, 2)
+        change = round((current_month - previous_month) / previous_month * 100, 2) if previous_month > 0 else 0
         if change > 0:
             change_text = "increase"
         elif change == 0:
@@ -87,45 +244,58 @@ def get_stats_numbers(df: DataFrame, date_var: str, month_name: str, output_type
         return error_dict
 
 
-def month_stats(df: DataFrame, date_var: str, month_name: str) -> dict:
+def month_stats(df: DataFrame, date_var: str, month_name: str, kpi_cube: DataFrame=None, year: int=None) -> dict:
     """
     :params
     df: App data.
     date_var: a date variable from the df, used to filter the data.
     month_name: input month (dashboard current month).
+    kpi_cube: output of `build_kpi_cube`, the counts are read from it instead of filtering the df.
+    year: the year of the input month, the latest year of the data when None.
 
-    :return a dictionary containing The MTD and MoM values.
+    :return a dictionary containing The MTD, MoM and YoY values.
     """
 
+    def window_count(periods: list) -> int:
+        if kpi_cube is not None:
+            return kpi_cube_count(kpi_cube, periods, "orders")
+        else:
+            return filter_periods(df, date_var, periods)["data"].shape[0]
+
     try:
+        periods = list(kpi_cube.index) if kpi_cube is not None else data_periods(df, date_var)
+        if year is None:
+            year = latest_year(periods)
+
         # Month to Date
-        MTD = filter_month(df, date_var, month_name, True, True)["data"].shape[0]
+        MTD = window_count(select_periods(periods, month_name, True, True, year))
 
-        # Month over Month
-        # Get the list of month name and assign them their respective ids
-        month_list = list(calendar.month_name[1:])
-        month_dic = {month_list[i] : i+1 for i in range(len(month_list))}
-        # Get previous month name 
-        if month_name != "January":
-            previous_month_dict = {name: value for name, value in month_dic.items() if value == month_dic[month_name]-1}
-        else:
-            previous_month_dict = {"December": 12}
-        previous_month_name = [name for name in previous_month_dict.keys()][0]
+        # get the input month, the previous month and the same month of the previous year order volume.
+        current_period = period_code(year, month_ids[month_name]) if year is not None else missing_period
+        month_current_value = window_count([current_period])
+        month_previous_value = window_count([previous_period(current_period)])
+        year_previous_value = window_count([previous_year_period(current_period)])
 
-        # get the input month and the previous month order volume.
-        month_current_value = filter_month(df, date_var, month_name, False, True)["data"].shape[0]
-        month_previous_value = filter_month(df, date_var, previous_month_name, False, False)["data"].shape[0]
+        # Month over Month
         # Calculate the percentage change of the input month against the prevous month.
-        MoM_change = (month_current_value - month_previous_value) / month_previous_value * 100
+        MoM_change = (
+            (month_current_value - month_previous_value) / month_previous_value * 100 if month_previous_value > 0 else 0
+        )
         # Calculate the growth rate of the input month against the previous month
         MoM_growth = (month_current_value - month_previous_value) - 1
 
+        # Year over Year
+        YoY_change = (
+            (month_current_value - year_previous_value) / year_previous_value * 100 if year_previous_value > 0 else 0
+        )
+
         return {
             "error": False,
             "message": " ",
             "MTD": MTD,
             "MoM_change": MoM_change,
-            "MoM_growth_rate": MoM_growth
+            "MoM_growth_rate": MoM_growth,
+            "YoY_change": YoY_change
         }
     except ValueError as e:
         return {
@@ -133,77 +303,125 @@ def month_stats(df: DataFrame, date_var: str, month_name: str) -> dict:
             "message": f"An error occured while calculating month stats: {e}",
             "MTD": None,
             "MoM_change": None,
-            "MoM_growth_rate": None
+            "MoM_growth_rate": None,
+            "YoY_change": None
         }
 
 
-def monthly_order_volume(df: DataFrame, date_var: str, month_name: str, plot_type: str="line"):
+def period_order_counts(df: DataFrame, date_var: str) -> Series:
+    """
+    :params
+    df: App data.
+    date_var: a date variable from the df, used to assign each row to a month.
+
+    :return a pandas series of the order count of each yyyymm period, read from the partition index when
+    the df has one.
+    """
+    if has_month_index(df, date_var):
+        return Series({period: stop - start for period, (start, stop) in month_offsets(df).items()}, dtype="int64")
+
+    return date_period_codes(df, date_var).dropna().astype("int64").value_counts().sort_index()
+
+
+def period_volume_figure(period_counts: Series, month_name: str, plot_type: str="line", year: int=None):
+    """
+    :params
+    period_counts: a pandas series of the order count of each yyyymm period.
+    month_name: input month (dashboard current month).
+    plot_type: the type of plot to return either a 'line' or 'bar' chart
+    year: the year of the input month, the latest year of the data when None.
+
+    :return a plotly figure dictionary of the months of the year leading up to the input month.
+    """
+    if check_valid_month_name(month_name)["error"]:
+        return empty_figure()
+
+    periods = select_periods(list(period_counts.index), month_name, True, True, year)
+    # Months without orders are left out of the chart.
+    period_counts = period_counts.loc[periods]
+    period_counts = period_counts[period_counts > 0]
+
+    # Months of the selected year, in calendar order.
+    month_counts = period_counts.groupby(period_counts.index % 100).sum().sort_index()
+    plt_df = DataFrame({
+        "month": [calendar.month_name[month_id] for month_id in month_counts.index],
+        "count": month_counts.to_numpy()
+    })
+
+    return monthly_volume_figure(plt_df, month_name, plot_type)
+
+
+def monthly_order_volume(
+        df: DataFrame, 
+        date_var: str, 
+        month_name: str, 
+        plot_type: str="line", 
+        year: int=None, 
+        kpi_cube: DataFrame=None
+):
     """
     :params
     df: App data.
     date_var: a date variable from the df, used to filter the data.
     month_name: input month (dashboard current month).
     plot_type: the type of plot to return either a 'line' or 'bar' chart
+    year: the year of the input month, the latest year of the data when None.
+    kpi_cube: output of `build_kpi_cube`, the monthly counts are read from it instead of the df.
 
-    :return a plotly object. 
+    :return a plotly figure dictionary. 
     """
+    period_counts = kpi_cube["orders"] if kpi_cube is not None else period_order_counts(df, date_var)
 
-    # Filter input month and other previous month
-    data_dict = filter_month(df, date_var, month_name, True, True)
+    return period_volume_figure(period_counts, month_name, plot_type, year)
 
-    if data_dict["error"] != True:
-        month_names = data_dict["data"][date_var].dt.strftime("%B").unique()
-        month_cat = [name for name in list(calendar.month_name[1:]) if name in month_names]
-        
-        plt_df = (
-            data_dict["data"]
-            .assign(month=lambda _: _[date_var].dt.strftime("%B"))
-            ["month"].value_counts(sort=False)
-            .reset_index().reset_index() # /!\ Double /!\
-            .assign(month=lambda _: Categorical(_["month"], categories=month_cat, ordered=True))
-            .sort_values(by="month")
-        )
 
-        plt_title = f"Order Volume Performance Up to {month_name}"
-        plt_labs = {"month": " ", "count": "Orders"}
-
-        if plot_type == "bar":
-            func_fig = bar(
-                data_frame=plt_df, 
-                x="month", y="count",
-                title=plt_title, labels=plt_labs,
-                color_discrete_sequence=[plot_color]
-            )
-            marker_dict = {}
-        else:
-            func_fig = line(
-                data_frame=plt_df, 
-                x="month", y="count",
-                markers=True,
-                title=plt_title, labels=plt_labs,
-                color_discrete_sequence=[plot_color]
-            )
-            marker_dict = dict(
-                size=12,
-                color="#FFFFFF",
-                line=dict(width=2, color=plot_color)
-            )
-
-        func_fig.update_traces( 
-            marker=marker_dict,
-            hovertemplate="<b>%{x}</b><br><b>Volume: %{y:,}</b>",
-            hoverlabel=dict(
-                bgcolor="#FFFFFF",
-                font_size=16,
-                font=dict(color=plot_color),
-                bordercolor=plot_color
-            )
-        )
+def status_month_volume(status_cube: DataFrame, status: str, month_name: str, plot_type: str="line", year: int=None):
+    """
+    The `monthly_order_volume` of the orders with a status, read from the status cube.
+
+    :params
+    status_cube: output of `build_status_cube`.
+    status: the order status.
+    month_name: input month (dashboard current month).
+    plot_type: the type of plot to return either a 'line' or 'bar' chart
+    year: the year of the input month, the latest year of the data when None.
+
+    :return a plotly figure dictionary.
+    """
+    # A status without orders gives an empty chart.
+    status_counts = status_cube.reindex(columns=[status], fill_value=0)[status]
+
+    return period_volume_figure(status_counts, month_name, plot_type, year)
 
-        func_fig.update_xaxes(showgrid=False, tickmode="linear", dtick=1)
-        return func_fig
+
+def monthly_volume_figure(plt_df: DataFrame, month_name: str, plot_type: str="line"):
+    """
+    :params
+    plt_df: the `count` of orders of each `month` name, in calendar order.
+    month_name: input month (dashboard current month).
+    plot_type: the type of plot to return either a 'line' or 'bar' chart
+
+    :return a plotly figure dictionary.
+    """
+    plt_title = f"Order Volume Performance Up to {month_name}"
+    hovertemplate = "<b>%{x}</b><br><b>Volume: %{y:,}</b>"
+    x_values = plt_df["month"].astype(str)
+
+    if plot_type == "bar":
+        trace = bar_trace(x_values, plt_df["count"], plot_color, hovertemplate, hover_label(plot_color))
+        extra_layout = {"barmode": "relative"}
     else:
-        return px.line()
+        trace = line_trace(
+            x_values, plt_df["count"], plot_color, hovertemplate, hover_label(plot_color), marker_style(plot_color, 12)
+        )
+        extra_layout = {}
+
+    return {
+        "data": [trace],
+        "layout": figure_layout(
+            plt_title, " ", "Orders", {"showgrid": False, "tickmode": "linear", "dtick": 1}, **extra_layout
+        )
+    }
 
 
 def daily_order_volume(data: DataFrame, date_var: str, month_name: str):
@@ -213,7 +431,7 @@ def daily_order_volume(data: DataFrame, date_var: str, month_name: str):
     date_var: a date variable from the df, used to filter the data.
     month_name: input month (dashboard current month).
 
-    :return a plotly object
+    :return a plotly figure dictionary
     """
 
     if data is not None:
@@ -226,33 +444,31 @@ def daily_order_volume(data: DataFrame, date_var: str, month_name: str):
             .sort_values(by="day")
         )
 
-        func_fig = line(
-            data_frame=func_df,
-            x="day", y="count",
-            markers=True,
-            labels={"day": "Days", "count": "Orders"},
-            title = f"Order Volume for the Month of {month_name}",
-            color_discrete_sequence=[plot_color]
-        )
-
-        func_fig.update_traces( 
-            marker=dict(
-                size=5,
-                color="#FFFFFF",
-                line=dict(width=2, color=plot_color)
-            ),
-            hovertemplate="<b>Day - %{x}</b><br><b>Volume: %{y:,}</b>",
-            hoverlabel=dict(
-                bgcolor="#FFFFFF",
-                font_size=16,
-                font=dict(color=plot_color),
-                bordercolor=plot_color
-            )
-        )
-        func_fig.update_xaxes(showgrid=False) #tickmode="linear", dtick=1
-        return func_fig
+        return daily_volume_figure(func_df, month_name)
     else:
-        return line()
+        return empty_figure()
+
+
+def daily_volume_figure(plt_df: DataFrame, month_name: str):
+    """
+    :params
+    plt_df: the `count` of orders of each `day` of the month, in day order.
+    month_name: input month (dashboard current month).
+
+    :return a plotly figure dictionary
+    """
+    trace = line_trace(
+        plt_df["day"], plt_df["count"],
+        plot_color,
+        "<b>Day - %{x}</b><br><b>Volume: %{y:,}</b>",
+        hover_label(plot_color),
+        marker_style(plot_color, 5)
+    )
+
+    return {
+        "data": [trace],
+        "layout": figure_layout(f"Order Volume for the Month of {month_name}", "Days", "Orders", {"showgrid": False})
+    }
 
 
 def get_week_volume(data: dict, date_var: str, month_name: str):
@@ -262,7 +478,7 @@ def get_week_volume(data: dict, date_var: str, month_name: str):
     date_var: a date variable from the df, used to filter the data.
     month_name: input month (dashboard current month).
 
-    :return a plotly object
+    :return a plotly figure dictionary
     """
 
     if data is not None:
@@ -275,23 +491,29 @@ def get_week_volume(data: dict, date_var: str, month_name: str):
             .value_counts().reset_index()
         )
 
-        func_fig = pie(
-            data_frame=func_df,
-            names="week_period",
-            values="count",
-            hole=0.5,
-            title="Order Volume by Weekdays & Weekends",
-            color_discrete_sequence=["#087F5B", "#96F2D7"]
-        )
-
-        func_fig.update_traces(
-            textposition='none',
-            hovertemplate="<b>%{label}</b><br><b>Volume: %{value:,}</b><br>%{percent:.2f}%", ## /!\/!\
-            hoverlabel=dict(font_size=16)
-        )
-        return func_fig
+        return week_volume_figure(func_df)
     else:
-        return pie()
+        return empty_figure("pie")
+
+
+def week_volume_figure(plt_df: DataFrame):
+    """ 
+    :params
+    plt_df: the `count` of orders of each `week_period` ('Weekday' or 'weekend'), from the largest count.
+
+    :return a plotly figure dictionary
+    """
+    trace = pie_trace(
+        plt_df["week_period"], plt_df["count"],
+        0.5,
+        "<b>%{label}</b><br><b>Volume: %{value:,}</b><br>%{percent:.2f}%", ## /!\/!\
+        hover_label(font_size=16)
+    )
+
+    return {
+        "data": [trace],
+        "layout": figure_layout("Order Volume by Weekdays & Weekends", piecolorway=["#087F5B", "#96F2D7"])
+    }
     
 
 def status_count(df: DataFrame, date_var: str, month_name: str) -> dict:
@@ -0,0 +1,377 @@
+"""
+Polars versions of the Orders and Seller logic functions, on lazy scans of the parquet caches.
+
+The Durations page always runs on pandas: its callbacks are background jobs forked from the app process,
+and polars can not run in a process forked after it has run.
+"""
+from os import getpid, makedirs
+from os.path import exists, join
+from pandas import DataFrame
+from numpy import where
+
+try:
+    import polars as pl
+except ImportError:
+    # Without polars the logic functions run on the registered pandas dataframes.
+    pl = None
+
+from logic.global_function import (
+    select_periods,
+    period_code,
+    previous_period,
+    previous_year_period,
+    latest_year,
+    month_ids,
+    month_index_var,
+    month_index_column,
+    missing_period,
+    date_range_bounds,
+    build_month_index,
+    has_month_index
+)
+from logic.duration_function import unit_seconds
+from logic.data_cache import write_parquet
+from logic.server_timing import timed
+
+
+# Parquet file of each registered snapshot (by snapshot id), scanned by the lazy frames.
+polars_sources: dict[str, str] = {}
+polars_source_directory = "cache/polars"
+# Process that built the first lazy frame. The polars thread pool does not survive a fork, so a process
+# forked from it must not run polars.
+_polars_pid = None
+
+# Errors of a lazy query, returned in the error dictionaries like the pandas errors.
+frame_errors = (ValueError, pl.exceptions.PolarsError) if pl is not None else (ValueError, )
+
+
+def register_polars_source(data: DataFrame, handle: dict) -> None:
+    """
+    Write a registered dataset to a parquet file named after its snapshot id (once, the file of a snapshot
+    never changes), so the lazy frames of the snapshot and of its views scan exactly the registered rows.
+
+    :params
+    data: the registered pandas dataframe.
+    handle: the dictionary returned by `register_dataset` for the data.
+    """
+    if pl is None:
+        raise ImportError("The polars backend needs polars, install it or use another `data_backend`.")
+
+    snap_id = handle["snapshot_id"]
+    path = join(polars_source_directory, f"{snap_id}.parquet")
+
+    if not exists(path):
+        makedirs(polars_source_directory, exist_ok=True)
+
+        if not has_month_index(data, month_index_var):
+            data = build_month_index(data, month_index_var)
+
+        if not write_parquet(data, path):
+            raise OSError(f"The parquet file of the polars backend could not be written to {path} (needs pyarrow).")
+
+    polars_sources[snap_id] = path
+
+
+def use_polars_backend(backend: str) -> bool:
+    """
+    :params
+    backend: the configured logic backend, either ['pandas', 'duckdb', 'polars'].
+
+    :return a boolean, whether the logic functions should run on polars lazy frames. Always False in a
+    process forked after polars has run (background callback jobs, preloaded gunicorn workers).
+    """
+    return (
+        backend == "polars" 
+        and pl is not None 
+        and len(polars_sources) > 0 
+        and _polars_pid in (None, getpid())
+    )
+
+
+def lazy_frame(path: str, date_var: str=month_index_var, date_range: list=None):
+    """
+    :params
+    path: path to a parquet file written by `register_polars_source`.
+    date_var: the date column of the range.
+    date_range: the [first day, last day] of the range (see `date_range_view`), None for every day.
+
+    :return a polars lazy frame of the file (with its integer yyyymm `year_month` column), the range is 
+    pushed down to the scan.
+    """
+    func_lf = pl.scan_parquet(path)
+
+    if date_range:
+        start, stop = date_range_bounds(date_range[0], date_range[-1])
+        func_lf = func_lf.filter((pl.col(date_var) >= start) & (pl.col(date_var) < stop))
+
+    return func_lf
+
+
+def get_lazy_frame(handle: dict) -> dict:
+    """
+    :params
+    handle: a dictionary returned by `register_dataset` or `date_range_view` (dcc.Store data).
+
+    :return A dictionary containing boolean error and the lazy frame of the snapshot (in the range of the view).
+    Nothing is read until the frame is collected.
+    """
+    global _polars_pid
+
+    try:
+        snap_id = handle.get("source_id", handle["snapshot_id"])
+        func_lf = lazy_frame(polars_sources[snap_id], month_index_var, handle.get("date_range"))
+    except (KeyError, TypeError, AttributeError, ValueError) as e:
+        return {"error": True, "message": f"No lazy frame for the supplied handle: {e}", "data": None}
+
+    _polars_pid = getpid()
+
+    return {"error": False, "message": "", "data": func_lf}
+
+
+def period_expr(date_var: str):
+    """
+    :return an expression of the yyyymm period of each row of `date_var`.
+    """
+    if date_var == month_index_var:
+        return pl.col(month_index_column)
+    else:
+        return pl.col(date_var).dt.year() * 100 + pl.col(date_var).dt.month()
+
+
+@timed("data")
+def frame_periods(lf, date_var: str) -> list:
+    """
+    :return the sorted list of the yyyymm periods of the lazy frame.
+    """
+    periods_df = lf.select(period_expr(date_var).unique().drop_nulls().alias("period")).collect()
+    return sorted(int(p) for p in periods_df["period"])
+
+
+@timed("data")
+def window_counts(lf, date_var: str, windows: list, count_expr) -> list:
+    """
+    :params
+    lf: a polars lazy frame.
+    date_var: the date column of the periods.
+    windows: a list of the yyyymm periods of each window, None for every row.
+    count_expr: a function of the window condition that returns the count expression, e.g
+    `lambda cond: cond.sum()`.
+
+    :return the count of every window, from a single pass over the frame.
+    """
+    period = period_expr(date_var)
+    counts_df = lf.select([
+        count_expr(period.is_in(periods) if periods is not None else pl.lit(True)).alias(f"window_{i}")
+        for i, periods in enumerate(windows)
+    ]).collect()
+
+    return [int(count or 0) for count in counts_df.row(0)]
+
+
+def duration_expr(first_date: str, second_date: str, num_unit: str):
+    """
+    :return an expression of the duration from the first to the second date column, in `num_unit`.
+    """
+    unit = unit_seconds[num_unit] if num_unit in unit_seconds else unit_seconds["week"]
+    return (pl.col(second_date) - pl.col(first_date)).dt.total_nanoseconds() / (unit * 10**9)
+
+
+def get_stats_numbers(lf, date_var: str, month_name: str, output_type: str, year: int=None) -> dict:
+    """
+    The polars version of `order_function.get_stats_numbers`.
+
+    :params
+    lf: a polars lazy frame of the orders or customers.
+    month_name: input month name.
+    output_type: either ['orders', 'customer']
+    year: the year of the input month, the latest year of the data when None.
+
+    :return a dictionary of Order volume values.
+    """
+    error_dict =  {
+        "error": True,
+        "message": " ",
+        "volume": None,
+        "prev_volume": None,
+        "percentage_change": None,
+        "change_text": None,
+        "percentage_total": None
+    }
+
+    if output_type not in ["orders", "customer"]:
+        error_dict["message"] = "Invalid `output_type` value. Please input either 'orders' or 'customer'"
+        return error_dict
+
+    if output_type == "orders":
+        count_expr = lambda cond: cond.sum()
+    else:
+        count_expr = lambda cond: pl.col("customer_unique_id").filter(cond).drop_nulls().n_unique()
+
+    try:
+        periods = frame_periods(lf, date_var)
+        if year is None:
+            year = latest_year(periods)
+
+        current_period = period_code(year, month_ids[month_name]) if year is not None else missing_period
+
+        total_month, current_month, previous_month = window_counts(
+            lf,
+            date_var,
+            [
+                select_periods(periods, month_name, True, False, year),
+                [current_period],
+                [previous_period(current_period)]
+            ],
+            count_expr
+        )
+
+        percentage_total = int((current_month / total_month)*100) if total_month > 0 else 0
+
+        change = round((current_month - previous_month) / previous_month * 100, 2) if previous_month > 0 else 0
+        if change > 0:
+            change_text = "increase"
+        elif change == 0:
+            change_text = "stable"
+        else:
+            change_text = "decrease"
+
+        return {
+            "error": False,
+            "message": "",
+            "volume": current_month,
+            "prev_volume": previous_month,
+            "percentage_change": change,
+            "change_text": change_text,
+            "percentage_total": percentage_total
+        }
+    except frame_errors as e:
+        error_dict["message"] = f"An error occured while summarising order volume: {e}"
+        return error_dict
+
+
+def month_stats(lf, date_var: str, month_name: str, year: int=None) -> dict:
+    """
+    The polars version of `order_function.month_stats`.
+
+    :return a dictionary containing The MTD, MoM and YoY values.
+    """
+    try:
+        periods = frame_periods(lf, date_var)
+        if year is None:
+            year = latest_year(periods)
+
+        current_period = period_code(year, month_ids[month_name]) if year is not None else missing_period
+
+        MTD, month_current_value, month_previous_value, year_previous_value = window_counts(
+            lf,
+            date_var,
+            [
+                select_periods(periods, month_name, True, True, year),
+                [current_period],
+                [previous_period(current_period)],
+                [previous_year_period(current_period)]
+            ],
+            lambda cond: cond.sum()
+        )
+
+        MoM_change = (
+            (month_current_value - month_previous_value) / month_previous_value * 100 if month_previous_value > 0 else 0
+        )
+        MoM_growth = (month_current_value - month_previous_value) - 1
+        YoY_change = (
+            (month_current_value - year_previous_value) / year_previous_value * 100 if year_previous_value > 0 else 0
+        )
+
+        return {
+            "error": False,
+            "message": " ",
+            "MTD": MTD,
+            "MoM_change": MoM_change,
+            "MoM_growth_rate": MoM_growth,
+            "YoY_change": YoY_change
+        }
+    except frame_errors as e:
+        return {
+            "error": True,
+            "message": f"An error occured while calculating month stats: {e}",
+            "MTD": None,
+            "MoM_change": None,
+            "MoM_growth_rate": None,
+            "YoY_change": None
+        }
+
+
+def seller_count(lf, date_var: str, month_name: str, year: int=None) -> dict:
+    """
+    The polars version of `seller_function.seller_count`.
+
+    :return a dictionary
+    """
+    if "seller_id" not in lf.collect_schema().names():
+        return {
+            "error": True,
+            "message": "Data supplied does not have a seller id; make sure orders table is accurately joined with seller table",
+            "overall_seller_count": None,
+            "seller_count": None,
+            "percentage": None
+        }
+
+    try:
+        periods = select_periods(frame_periods(lf, date_var), month_name, False, True, year)
+        overall_seller_count, seller_count = window_counts(
+            lf, date_var, [None, periods], lambda cond: pl.col("seller_id").filter(cond).drop_nulls().n_unique()
+        )
+
+        percentage = round(seller_count / overall_seller_count * 100) if overall_seller_count > 0 else 0
+
+        return {
+            "error": False,
+            "message": "",
+            "overall_seller_count": overall_seller_count,
+            "seller_count": seller_count,
+            "percentage": percentage
+        }
+    except frame_errors as e:
+        return {
+            "error": True,
+            "message": f"An error occured while counting the sellers: {e}",
+            "overall_seller_count": None,
+            "seller_count": None,
+            "percentage": None
+        }
+
+
+@timed("data")
+def seller_deadline_ranking(lf, date_var: str, month_name: str, top: int=None, year: int=None) -> DataFrame:
+    """
+    The polars version of `seller_function.seller_deadline_ranking`, only the `top` sellers are collected.
+
+    :params
+    lf: a polars lazy frame of the sellers.
+    date_var: a date variable from the data, used to filter the data.
+    month_name: input month (dashboard current month).
+    top: number of sellers, every seller active in the month when None.
+    year: the year of the input month, the latest year of the data when None.
+
+    :return a pandas dataframe of the sellers ranked from the lowest average days between the shipping limit
+    and the delivery.
+    """
+    periods = select_periods(frame_periods(lf, date_var), month_name, False, True, year)
+
+    ranking_lf = (
+        lf.filter(period_expr(date_var).is_in(periods) & pl.col("seller_id").is_not_null())
+        .group_by("seller_id")
+        .agg(duration_expr("shipping_limit_date", "order_delivered_customer_date", "day").mean().alias("days"))
+        .sort(["days", "seller_id"], nulls_last=True)
+    )
+    if top is not None:
+        ranking_lf = ranking_lf.head(int(top))
+
+    ranking_df = ranking_lf.collect()
+    ranked_days = ranking_df["days"].to_numpy().astype(float)
+
+    return DataFrame({
+        "seller Id": ranking_df["seller_id"].to_numpy(),
+        "Avg. Days before Deadline": ranked_days.round(2),
+        "Meet Deadline": where(ranked_days < 0, "Yes", "No")
+    })
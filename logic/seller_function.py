@@ -1,15 +1,22 @@
-from pandas import DataFrame
-from numpy import where
-from logic.global_function import filter_month
-from logic.duration_function import create_time_diff
-
-
-def seller_count(data: DataFrame, date_var: str, month_name: str) -> dict:
+from pandas import DataFrame, Timedelta, factorize
+from numpy import where, isnan, inf, argpartition, lexsort, arange
+from logic.global_function import (
+    filter_month, 
+    select_periods, 
+    build_month_index, 
+    has_month_index, 
+    month_index_column, 
+    missing_period
+)
+
+
+def seller_count(data: DataFrame, date_var: str, month_name: str, year: int=None) -> dict:
     """ 
     :params
     data: App data with seller's information
     date_var:
     month_name:
+    year: the year of the input month, the latest year of the data when None.
 
     :return a dictionary
     """
@@ -27,12 +34,12 @@ def seller_count(data: DataFrame, date_var: str, month_name: str) -> dict:
     overall_seller_count = data["seller_id"].nunique()
 
     # Total number of active sellers in the selected month
-    func_dict = filter_month(data, date_var, month_name, False, True)
+    func_dict = filter_month(data, date_var, month_name, False, True, year)
 
     if func_dict["error"] == False:
         seller_count = func_dict["data"]["seller_id"].nunique()
 
-        percentage = round(seller_count / overall_seller_count * 100)
+        percentage = round(seller_count / overall_seller_count * 100) if overall_seller_count > 0 else 0
     else:
         seller_count = None
         percentage = None
@@ -48,61 +55,159 @@ def seller_count(data: DataFrame, date_var: str, month_name: str) -> dict:
 
 
 
-def top_sellers_order_deadline(data: DataFrame, date_var: str, month_name:str, top: int=5) -> dict:
+def build_seller_deadline_cube(data: DataFrame, date_var: str) -> dict:
+    """ 
+    Seller by month shipping deadline aggregates, built once per data snapshot.
+
+    :params
+    data: App data with seller's information.
+    date_var: a date variable from the data, used to assign each row to a month.
+
+    :return a dictionary with the seller ids and a pandas dataframe indexed by (yyyymm period, seller code)
+    with the sum and count of the days between the shipping limit and the delivery of each order item.
+    """
+    if not has_month_index(data, date_var):
+        data = build_month_index(data, date_var)
+
+    seller_codes, seller_ids = factorize(data["seller_id"])
+    func_df = DataFrame({
+        month_index_column: data[month_index_column].to_numpy(),
+        "seller": seller_codes,
+        # Days of actual vs limit, negative when delivered before the deadline.
+        "days": ((data["order_delivered_customer_date"] - data["shipping_limit_date"]) / Timedelta(days=1)).to_numpy()
+    })
+    func_df = func_df[(func_df[month_index_column] != missing_period) & (func_df["seller"] >= 0)]
+
+    deadline_cube = (
+        func_df
+        .groupby([month_index_column, "seller"])
+        .agg(days_sum=("days", "sum"), days_count=("days", "count"))
+    )
+
+    return {"seller_ids": seller_ids.to_numpy(), "cube": deadline_cube}
+
+
+def month_seller_deadline(deadline_cube: dict, month_name: str, year: int=None) -> dict:
+    """ 
+    :params
+    deadline_cube: output of `build_seller_deadline_cube`.
+    month_name: input month (dashboard current month).
+    year: the year of the input month, the latest year of the data when None.
+
+    :return a dictionary with the codes of the sellers active in the month and their average days between 
+    the shipping limit and the delivery (NaN when none of their items was delivered).
+    """
+    cube = deadline_cube["cube"]
+    periods = select_periods(list(cube.index.unique(month_index_column)), month_name, False, True, year)
+
+    seller_totals = (
+        cube[cube.index.get_level_values(month_index_column).isin(periods)]
+        .groupby(level="seller")
+        .sum()
+    )
+    days_count = seller_totals["days_count"].to_numpy()
+
+    return {
+        "seller_codes": seller_totals.index.to_numpy(),
+        "avg_days": where(days_count > 0, seller_totals["days_sum"].to_numpy() / where(days_count > 0, days_count, 1), float("nan"))
+    }
+
+
+def top_seller_codes(seller_deadline: dict, seller_ids, top: int):
+    """ 
+    :params
+    seller_deadline: output of `month_seller_deadline`.
+    seller_ids: the seller id of each seller code.
+    top: number of sellers.
+
+    :return the positions (in `seller_deadline`) of the `top` sellers with the lowest average days, in order.
+    Only the candidates picked by a partial selection are sorted, ties are ordered by seller id.
+    """
+    avg_days = seller_deadline["avg_days"]
+    # Sellers without a delivered item rank last.
+    rank_days = where(isnan(avg_days), inf, avg_days)
+    top = min(top, len(rank_days))
+
+    if top <= 0:
+        return arange(0)
+    elif top < len(rank_days):
+        kth_days = rank_days[argpartition(rank_days, top - 1)[top - 1]]
+        candidates = (rank_days <= kth_days).nonzero()[0]
+    else:
+        candidates = arange(len(rank_days))
+
+    candidate_ids = seller_ids[seller_deadline["seller_codes"][candidates]]
+    return candidates[lexsort((candidate_ids, rank_days[candidates]))][:top]
+
+
+def seller_deadline_ranking(deadline_cube: dict, seller_deadline: dict) -> DataFrame:
     """ 
     :params
-    data: a dataframe filtered by month.
-    top:
+    deadline_cube: output of `build_seller_deadline_cube`.
+    seller_deadline: output of `month_seller_deadline` for the month.
+
+    :return a pandas dataframe of every seller active in the month, ranked from the lowest average days
+    between the shipping limit and the delivery.
+    """
+    ranked_positions = top_seller_codes(seller_deadline, deadline_cube["seller_ids"], len(seller_deadline["avg_days"]))
+    ranked_days = seller_deadline["avg_days"][ranked_positions]
+
+    return DataFrame({
+        "seller Id": deadline_cube["seller_ids"][seller_deadline["seller_codes"][ranked_positions]],
+        "Avg. Days before Deadline": ranked_days.round(2),
+        "Meet Deadline": where(ranked_days < 0, "Yes", "No")
+    })
+
+
+def top_sellers_order_deadline(
+        data: DataFrame, 
+        date_var: str, 
+        month_name:str, 
+        top: int=5, 
+        deadline_cube: dict=None, 
+        seller_deadline: dict=None,
+        year: int=None
+    ) -> dict:
+    """ 
+    :params
+    data: App data with seller's information.
+    date_var: a date variable from the data, used to filter the data.
+    month_name: input month (dashboard current month).
+    top: number of sellers.
+    deadline_cube: output of `build_seller_deadline_cube` for the data, built from the data when None.
+    seller_deadline: output of `month_seller_deadline` for the month, read from the cube when None.
+    year: the year of the input month, the latest year of the data when None.
+
     :return a dictionary
     """
+    try:
+        if deadline_cube is None:
+            deadline_cube = build_seller_deadline_cube(data, date_var)
+        if seller_deadline is None:
+            seller_deadline = month_seller_deadline(deadline_cube, month_name, year)
 
-    # Total number of active sellers in the selected month
-    func_dict = filter_month(data, date_var, month_name, False, True)
-    error_dict = {
+    except (KeyError, ValueError) as e:
+        return {
             "error": True,
-            "message": f"An error occured while calculating time difference: {func_dict['message']}",
+            "message": f"An error occured while calculating time difference: {e}",
             "data": None,
             "avg_days": None
         }
 
-    if func_dict["error"]:
-        return error_dict
-    else:
-        # Days difference of actual vs limit.
-        func_dict = create_time_diff(func_dict["data"], "shipping_limit_date", "order_delivered_customer_date", "day")
-
-        if func_dict["error"]:
-            return error_dict
-        else:
-            # Get the average time difference 
-            func_df = (
-                func_dict["data"]
-                .groupby("seller_id")["period"]
-                .agg("mean")
-                .reset_index()
-                .sort_values(by="period", ascending=True)
-                .assign(
-                    seller_id=lambda _: _["seller_id"],
-                    meet_deadline=lambda _: where(_["period"] < 0, "Yes", "No"),
-                    period=lambda _: round(_["period"], 2)
-                )
-                # 
-                .head(top)
-            )
-            # The average days of the top n sellers
-            avg_top_days = func_df["period"].mean()
-
-            func_df = func_df.rename(
-                columns={
-                    "seller_id": "seller Id", 
-                    "period": "Avg. Days before Deadline", 
-                    "meet_deadline": "Meet Deadline"
-                }
-            )
-
-            return {
-                "error": False,
-                "message": "",
-                "data": func_df,
-                "avg_days": avg_top_days
-            }
+    top_positions = top_seller_codes(seller_deadline, deadline_cube["seller_ids"], top)
+    top_days = seller_deadline["avg_days"][top_positions]
+
+    func_df = DataFrame({
+        "seller Id": deadline_cube["seller_ids"][seller_deadline["seller_codes"][top_positions]],
+        "Avg. Days before Deadline": top_days.round(2),
+        "Meet Deadline": where(top_days < 0, "Yes", "No")
+    })
+    # The average days of the top n sellers
+    avg_top_days = func_df["Avg. Days before Deadline"].mean()
+
+    return {
+        "error": False,
+        "message": "",
+        "data": func_df,
+        "avg_days": avg_top_days
+    }
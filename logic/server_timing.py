@@ -0,0 +1,112 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+import flask
+
+from logic.callback_metrics import callback_route
+
+
+# Phases of a callback request, in the order they are reported.
+timing_phases = {
+    "decode": "request JSON decode",
+    "data": "dataset lookup, typing and filtering",
+    "compute": "logic computation",
+    "figure": "figure assembly and figure cache read/write",
+    "other": "dash dispatch, output validation, response encoding and untimed code",
+    "total": "callback request"
+}
+
+
+@contextmanager
+def timed(phase: str):
+    """
+    Add the time spent in the block to the `phase` of the current callback request. Phases are exclusive,
+    the time of a nested phase is not counted by the phase around it. Outside of a timed request (e.g in
+    background callback jobs or scripts) nothing is recorded.
+
+    Can also be used as a function decorator: @timed("data").
+    """
+    if not flask.has_request_context() or "timing_stack" not in flask.g:
+        yield
+        return
+
+    timing_stack, timing_totals = flask.g.timing_stack, flask.g.timing_totals
+
+    now = perf_counter()
+    if timing_stack:
+        outer_phase, outer_start = timing_stack[-1]
+        timing_totals[outer_phase] += now - outer_start
+    timing_stack.append([phase, now])
+
+    try:
+        yield
+    finally:
+        now = perf_counter()
+        timing_totals[phase] += now - timing_stack.pop()[1]
+        if timing_stack:
+            timing_stack[-1][1] = now
+
+
+def timed_callback(func):
+    """
+    Decorator of the page callbacks, the time of the callback that is not spent in a nested phase
+    (data or figure) is its logic computation.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with timed("compute"):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def server_timing_header(timing_totals: dict) -> str:
+    """
+    :return the Server-Timing header value of the phase durations (in seconds).
+    """
+    return ", ".join(
+        f'{phase};dur={timing_totals[phase] * 1000:.2f};desc="{desc}"'
+        for phase, desc in timing_phases.items() if phase in timing_totals
+    )
+
+
+def register_server_timing(app):
+    """
+    Add a Server-Timing header with the decode / data / compute / figure / other split to every
+    callback response of the app. `other` is the rest of the request time, it is not a measured phase.
+
+    Background callbacks run in a job process outside of any request, the responses of their start and
+    polling requests only carry the decode, other and total phases. Their runtime is reported by
+    `dash_background_job_duration_seconds` on /metrics (see `callback_metrics.background_job_metrics`).
+
+    :params
+    app: the Dash app.
+    """
+    server = app.server
+
+    @server.before_request
+    def start_server_timing():
+        if flask.request.path == app.config.routes_pathname_prefix + callback_route:
+            flask.g.timing_start = perf_counter()
+            flask.g.timing_stack = []
+            flask.g.timing_totals = defaultdict(float)
+
+            # The parsed body is cached by flask, dash reads it from there.
+            with timed("decode"):
+                flask.request.get_json(silent=True)
+
+    @server.after_request
+    def add_server_timing(response):
+        if "timing_start" in flask.g:
+            timing_totals = flask.g.timing_totals
+            timing_totals["total"] = perf_counter() - flask.g.timing_start
+            # Whatever no timed block covers: Dash's dispatch, output validation, JSON encoding of the
+            # response and the callback code outside of the timed phases.
+            timing_totals["other"] = max(
+                timing_totals["total"] - sum(timing_totals.get(phase, 0) for phase in ["decode", "data", "compute", "figure"]),
+                0
+            )
+            response.headers["Server-Timing"] = server_timing_header(timing_totals)
+
+        return response
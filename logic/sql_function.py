@@ -0,0 +1,756 @@
+from threading import Lock
+from os import getpid, replace, remove, makedirs
+from os.path import splitext, exists, dirname
+from pandas import DataFrame, Series
+from numpy import where, zeros
+
+try:
+    import duckdb
+except ImportError:
+    # Without duckdb the logic functions run on the registered pandas dataframes.
+    duckdb = None
+
+from logic.global_function import (
+    select_periods,
+    period_code,
+    previous_period,
+    previous_year_period,
+    latest_year,
+    date_range_bounds,
+    month_ids,
+    month_index_column
+)
+from logic.duration_function import (
+    median_duration_day as median_duration_day_figure,
+    median_duration_month as median_duration_month_figure,
+    estimate_actual as estimate_actual_figure,
+    unit_time_labels,
+    unit_seconds,
+    estimate_pair,
+    day_ns,
+    hour_ns,
+    minute_ns
+)
+from logic.order_function import period_volume_figure, daily_volume_figure, week_volume_figure
+from logic.data_cache import source_signature
+from logic.server_timing import timed
+
+
+# Source file of each dataset type (table name), loaded into the database file once.
+sql_sources: dict[str, str] = {}
+# The tables are written to this file by the first process that needs them, every process (app workers,
+# background jobs) opens it read-only.
+sql_database_path = "cache/data.duckdb"
+
+_connection = None
+_connection_pid = None
+_connection_lock = Lock()
+
+# Errors of a query, returned in the error dictionaries like the pandas errors.
+query_errors = (ValueError, duckdb.Error) if duckdb is not None else (ValueError, )
+
+
+def register_sql_source(path: str, data_type: str) -> None:
+    """
+    :params
+    path: path to the csv (or parquet) file of the dataset.
+    data_type: The name of the dataset either ['orders', 'customer', 'seller'], used as the table name.
+    """
+    sql_sources[data_type] = path
+
+
+def use_sql_backend(backend: str) -> bool:
+    """
+    :params
+    backend: the configured logic backend, either ['pandas', 'duckdb'].
+
+    :return a boolean, whether the logic functions should run on the embedded database.
+    """
+    return backend == "duckdb" and duckdb is not None and len(sql_sources) > 0
+
+
+def source_rows() -> list:
+    """
+    :return a list of (table, path, size, modification time) of every registered source file.
+    """
+    rows = []
+    for data_type, path in sorted(sql_sources.items()):
+        signature = source_signature(path)
+        rows.append(
+            (data_type, path, signature[b"source_size"].decode(), signature[b"source_mtime_ns"].decode())
+        )
+
+    return rows
+
+
+def database_is_current(connection) -> bool:
+    """
+    :return a boolean, whether the database tables were built from the current source files.
+    """
+    try:
+        built_rows = connection.execute(
+            "SELECT data_type, path, source_size, source_mtime_ns FROM sql_sources ORDER BY data_type"
+        ).fetchall()
+    except duckdb.Error:
+        return False
+
+    return built_rows == source_rows()
+
+
+def build_database(path: str) -> None:
+    """
+    Load every registered source into a new database file, with one table per source sorted by the purchase 
+    date and a yyyymm `year_month` column. The file is written under a temporary name and renamed, so other
+    processes only ever open a complete database.
+
+    :params
+    path: path of the database file.
+    """
+    makedirs(dirname(path) or ".", exist_ok=True)
+    # Each process writes its own temporary file, the final rename is atomic.
+    temp_path = f"{path}.{getpid()}.tmp"
+    if exists(temp_path):
+        remove(temp_path)
+
+    connection = duckdb.connect(temp_path)
+    try:
+        for data_type, source_path, _, _ in source_rows():
+            reader = "read_parquet" if splitext(source_path)[1] == ".parquet" else "read_csv_auto"
+            connection.execute(f"""
+                CREATE TABLE "{data_type}" AS
+                SELECT *, year(order_purchase_timestamp) * 100 + month(order_purchase_timestamp) AS {month_index_column}
+                FROM {reader}(?)
+                ORDER BY order_purchase_timestamp
+            """, [source_path])
+
+        connection.execute(
+            "CREATE TABLE sql_sources (data_type VARCHAR, path VARCHAR, source_size VARCHAR, source_mtime_ns VARCHAR)"
+        )
+        connection.executemany("INSERT INTO sql_sources VALUES (?, ?, ?, ?)", source_rows())
+    finally:
+        connection.close()
+
+    replace(temp_path, path)
+
+
+def get_connection():
+    """
+    :return the read-only connection of the process to the database file, the file is (re)built when it is
+    missing or older than the source files. Forked processes (gunicorn workers, background callbacks) open 
+    the same file instead of loading the sources again.
+    """
+    global _connection, _connection_pid
+
+    with _connection_lock:
+        if _connection is None or _connection_pid != getpid():
+            connection = duckdb.connect(sql_database_path, read_only=True) if exists(sql_database_path) else None
+
+            if connection is None or not database_is_current(connection):
+                if connection is not None:
+                    connection.close()
+
+                build_database(sql_database_path)
+                connection = duckdb.connect(sql_database_path, read_only=True)
+
+            _connection, _connection_pid = connection, getpid()
+
+    return _connection
+
+
+@timed("data")
+def query(sql: str, params: list=None) -> DataFrame:
+    """
+    :return the result of the query as a pandas dataframe, on a cursor of the calling thread.
+    """
+    return get_connection().cursor().execute(sql, params or []).df()
+
+
+def seconds_between(first_date: str, second_date: str) -> str:
+    """
+    :return a SQL expression of the exact number of seconds from the first to the second date column.
+    """
+    return f'date_diff(\'microsecond\', "{first_date}", "{second_date}") / 1e6'
+
+
+def range_condition(date_var: str, date_range: list=None) -> tuple:
+    """
+    :params
+    date_var: the date column of the range.
+    date_range: the [first day, last day] of the range (see `date_range_view`), None for every day.
+
+    :return a tuple of the SQL condition and its parameters.
+    """
+    if not date_range:
+        return ("TRUE", [])
+
+    start, stop = date_range_bounds(date_range[0], date_range[-1])
+
+    return (f'"{date_var}" >= ? AND "{date_var}" < ?', [start.to_pydatetime(), stop.to_pydatetime()])
+
+
+def period_condition(periods: list) -> tuple:
+    """
+    :return a tuple of the SQL condition selecting the yyyymm periods and its parameters.
+    """
+    if len(periods) == 0:
+        return ("FALSE", [])
+
+    return (f"{month_index_column} IN ({', '.join('?' * len(periods))})", list(periods))
+
+
+def table_periods(table: str, date_var: str, date_range: list=None) -> list:
+    """
+    :return the sorted list of the yyyymm periods of the table (within the range of days).
+    """
+    range_sql, range_params = range_condition(date_var, date_range)
+    periods_df = query(
+        f'SELECT DISTINCT {month_index_column} AS period FROM "{table}" '
+        f"WHERE {month_index_column} IS NOT NULL AND {range_sql} ORDER BY period",
+        range_params
+    )
+
+    return [int(p) for p in periods_df["period"]]
+
+
+def month_periods(
+        table: str,
+        date_var: str,
+        month_name: str,
+        leading_up_to_month: bool=False,
+        drop_prev_year: bool=False,
+        year: int=None,
+        date_range: list=None
+) -> list:
+    """
+    The SQL version of `filter_month`: the periods are selected by `select_periods` on the table periods.
+
+    :return a list of the selected yyyymm periods.
+    """
+    periods = table_periods(table, date_var, date_range)
+
+    return select_periods(periods, month_name, leading_up_to_month, drop_prev_year, year)
+
+
+def window_counts(table: str, date_var: str, windows: list, count_sql: str, date_range: list=None) -> list:
+    """
+    :params
+    table: the table name.
+    date_var: the date column of the range.
+    windows: a list of yyyymm period lists, None for a window of every row.
+    count_sql: the aggregate of each window, e.g 'COUNT(*)' or 'COUNT(DISTINCT customer_unique_id)'.
+    date_range: the [first day, last day] of the range, None for every day.
+
+    :return the count of every window, from a single scan of the table.
+    """
+    select_sql, params = [], []
+    for periods in windows:
+        if periods is None:
+            select_sql.append(count_sql)
+            continue
+
+        window_sql, window_params = period_condition(periods)
+        select_sql.append(f"{count_sql} FILTER (WHERE {window_sql})")
+        params += window_params
+
+    range_sql, range_params = range_condition(date_var, date_range)
+    counts = query(f'SELECT {", ".join(select_sql)} FROM "{table}" WHERE {range_sql}', params + range_params)
+
+    return [int(count) for count in counts.iloc[0]]
+
+
+def get_stats_numbers(
+        table: str,
+        date_var: str,
+        month_name: str,
+        output_type: str,
+        year: int=None,
+        date_range: list=None
+) -> dict:
+    """
+    The SQL version of `order_function.get_stats_numbers`.
+
+    :params
+    table: the table name of the orders or customers.
+    month_name: input month name.
+    output_type: either ['orders', 'customer']
+    year: the year of the input month, the latest year of the data when None.
+    date_range: the [first day, last day] of the range, None for every day.
+
+    :return a dictionary of Order volume values.
+    """
+    error_dict =  {
+        "error": True,
+        "message": " ",
+        "volume": None,
+        "prev_volume": None,
+        "percentage_change": None,
+        "change_text": None,
+        "percentage_total": None
+    }
+
+    if output_type not in ["orders", "customer"]:
+        error_dict["message"] = "Invalid `output_type` value. Please input either 'orders' or 'customer'"
+        return error_dict
+
+    try:
+        periods = table_periods(table, date_var, date_range)
+        if year is None:
+            year = latest_year(periods)
+
+        current_period = period_code(year, month_ids[month_name]) if year is not None else None
+
+        total_month, current_month, previous_month = window_counts(
+            table,
+            date_var,
+            [
+                select_periods(periods, month_name, True, False, year),
+                [current_period] if year is not None else [],
+                [previous_period(current_period)] if year is not None else []
+            ],
+            "COUNT(*)" if output_type == "orders" else "COUNT(DISTINCT customer_unique_id)",
+            date_range
+        )
+
+        percentage_total = int((current_month / total_month)*100) if total_month > 0 else 0
+
+        change = round((current_month - previous_month) / previous_month * 100, 2) if previous_month > 0 else 0
+        if change > 0:
+            change_text = "increase"
+        elif change == 0:
+            change_text = "stable"
+        else:
+            change_text = "decrease"
+
+        return {
+            "error": False,
+            "message": "",
+            "volume": current_month,
+            "prev_volume": previous_month,
+            "percentage_change": change,
+            "change_text": change_text,
+            "percentage_total": percentage_total
+        }
+    except query_errors as e:
+        error_dict["message"] = f"An error occured while summarising order volume: {e}"
+        return error_dict
+
+
+def month_stats(table: str, date_var: str, month_name: str, year: int=None, date_range: list=None) -> dict:
+    """
+    The SQL version of `order_function.month_stats`.
+
+    :params
+    table: the table name of the orders.
+    date_var: a date variable from the table.
+    month_name: input month (dashboard current month).
+    year: the year of the input month, the latest year of the data when None.
+    date_range: the [first day, last day] of the range, None for every day.
+
+    :return a dictionary containing The MTD, MoM and YoY values.
+    """
+    try:
+        periods = table_periods(table, date_var, date_range)
+        if year is None:
+            year = latest_year(periods)
+
+        if year is not None:
+            current_period = period_code(year, month_ids[month_name])
+            windows = [
+                select_periods(periods, month_name, True, True, year),
+                [current_period],
+                [previous_period(current_period)],
+                [previous_year_period(current_period)]
+            ]
+        else:
+            windows = [[], [], [], []]
+
+        MTD, month_current_value, month_previous_value, year_previous_value = window_counts(
+            table, date_var, windows, "COUNT(*)", date_range
+        )
+
+        MoM_change = (
+            (month_current_value - month_previous_value) / month_previous_value * 100 if month_previous_value > 0 else 0
+        )
+        MoM_growth = (month_current_value - month_previous_value) - 1
+        YoY_change = (
+            (month_current_value - year_previous_value) / year_previous_value * 100 if year_previous_value > 0 else 0
+        )
+
+        return {
+            "error": False,
+            "message": " ",
+            "MTD": MTD,
+            "MoM_change": MoM_change,
+            "MoM_growth_rate": MoM_growth,
+            "YoY_change": YoY_change
+        }
+    except query_errors as e:
+        return {
+            "error": True,
+            "message": f"An error occured while calculating month stats: {e}",
+            "MTD": None,
+            "MoM_change": None,
+            "MoM_growth_rate": None,
+            "YoY_change": None
+        }
+
+
+def period_counts(table: str, date_var: str, status: str=None, date_range: list=None) -> Series:
+    """
+    :params
+    table: the table name of the orders.
+    date_var: the date column of the range.
+    status: count only the orders with this status, every order when None.
+    date_range: the [first day, last day] of the range, None for every day.
+
+    :return a pandas series of the order count of every yyyymm period of the table (0 for a period without 
+    orders of the status).
+    """
+    status_sql, status_params = ("order_status = ?", [status]) if status is not None else ("TRUE", [])
+    range_sql, range_params = range_condition(date_var, date_range)
+
+    counts_df = query(
+        f"""
+        SELECT {month_index_column} AS period, COUNT(*) FILTER (WHERE {status_sql}) AS count
+        FROM "{table}"
+        WHERE {month_index_column} IS NOT NULL AND {range_sql}
+        GROUP BY 1
+        ORDER BY 1
+        """,
+        status_params + range_params
+    )
+
+    return Series(counts_df["count"].to_numpy(dtype="int64"), index=counts_df["period"].to_numpy(dtype="int64"))
+
+
+def monthly_order_volume(
+        table: str,
+        date_var: str,
+        month_name: str,
+        plot_type: str="line",
+        year: int=None,
+        date_range: list=None,
+        status: str=None
+):
+    """
+    The SQL version of `order_function.monthly_order_volume` (and of `status_month_volume` with a status).
+
+    :return a plotly figure dictionary.
+    """
+    return period_volume_figure(period_counts(table, date_var, status, date_range), month_name, plot_type, year)
+
+
+def daily_order_volume(table: str, date_var: str, month_name: str, year: int=None, date_range: list=None):
+    """
+    The SQL version of `order_function.daily_order_volume` for the month.
+
+    :return a plotly figure dictionary.
+    """
+    periods = month_periods(table, date_var, month_name, False, True, year, date_range)
+    window_sql, window_params = period_condition(periods)
+    range_sql, range_params = range_condition(date_var, date_range)
+
+    day_df = query(
+        f"""
+        SELECT day("{date_var}") AS day, COUNT(*) AS count
+        FROM "{table}"
+        WHERE {window_sql} AND {range_sql}
+        GROUP BY 1
+        ORDER BY 1
+        """,
+        window_params + range_params
+    )
+
+    return daily_volume_figure(day_df, month_name)
+
+
+def get_week_volume(table: str, date_var: str, month_name: str, year: int=None, date_range: list=None):
+    """
+    The SQL version of `order_function.get_week_volume` for the month.
+
+    :return a plotly figure dictionary.
+    """
+    periods = month_periods(table, date_var, month_name, False, True, year, date_range)
+    window_sql, window_params = period_condition(periods)
+    range_sql, range_params = range_condition(date_var, date_range)
+
+    week_df = query(
+        f"""
+        SELECT CASE WHEN isodow("{date_var}") <= 5 THEN 'Weekday' ELSE 'weekend' END AS week_period, COUNT(*) AS count
+        FROM "{table}"
+        WHERE {window_sql} AND {range_sql}
+        GROUP BY 1
+        ORDER BY count DESC, week_period
+        """,
+        window_params + range_params
+    )
+
+    return week_volume_figure(week_df)
+
+
+def status_count(table: str, date_var: str, month_name: str, year: int=None, date_range: list=None) -> dict:
+    """
+    The SQL version of `order_function.status_count` for the month.
+
+    :return a dictionary of status count for the month.
+    """
+    periods = month_periods(table, date_var, month_name, False, True, year, date_range)
+    window_sql, window_params = period_condition(periods)
+    range_sql, range_params = range_condition(date_var, date_range)
+
+    status_df = query(
+        f"""
+        SELECT order_status, COUNT(*) AS count
+        FROM "{table}"
+        WHERE {window_sql} AND {range_sql} AND order_status IS NOT NULL
+        GROUP BY 1
+        """,
+        window_params + range_params
+    )
+
+    return dict(zip(status_df["order_status"].tolist(), status_df["count"].tolist()))
+
+
+def seller_count(table: str, date_var: str, month_name: str, year: int=None, date_range: list=None) -> dict:
+    """
+    The SQL version of `seller_function.seller_count`.
+
+    :params
+    table: the table name of the sellers.
+    date_var: a date variable from the table.
+    month_name: input month (dashboard current month).
+    year: the year of the input month, the latest year of the data when None.
+    date_range: the [first day, last day] of the range, None for every day.
+
+    :return a dictionary
+    """
+    try:
+        periods = month_periods(table, date_var, month_name, False, True, year, date_range)
+        overall_seller_count, seller_count = window_counts(
+            table, date_var, [None, periods], "COUNT(DISTINCT seller_id)", date_range
+        )
+
+        percentage = round(seller_count / overall_seller_count * 100) if overall_seller_count > 0 else 0
+
+        return {
+            "error": False,
+            "message": "",
+            "overall_seller_count": overall_seller_count,
+            "seller_count": seller_count,
+            "percentage": percentage
+        }
+    except query_errors as e:
+        return {
+            "error": True,
+            "message": f"An error occured while counting the sellers: {e}",
+            "overall_seller_count": None,
+            "seller_count": None,
+            "percentage": None
+        }
+
+
+def seller_deadline_ranking(
+        table: str,
+        date_var: str,
+        month_name: str,
+        top: int=None,
+        year: int=None,
+        date_range: list=None
+) -> DataFrame:
+    """
+    The SQL version of `seller_function.seller_deadline_ranking`, the ranking is sorted and cut to the `top`
+    sellers by the database.
+
+    :params
+    table: the table name of the sellers.
+    date_var: a date variable from the table.
+    month_name: input month (dashboard current month).
+    top: number of sellers, every seller active in the month when None.
+    year: the year of the input month, the latest year of the data when None.
+    date_range: the [first day, last day] of the range, None for every day.
+
+    :return a pandas dataframe of the sellers ranked from the lowest average days between the shipping limit
+    and the delivery.
+    """
+    periods = month_periods(table, date_var, month_name, False, True, year, date_range)
+    window_sql, window_params = period_condition(periods)
+    range_sql, range_params = range_condition(date_var, date_range)
+    limit_sql = "LIMIT ?" if top is not None else ""
+
+    ranking_df = query(
+        f"""
+        SELECT seller_id, AVG({seconds_between("shipping_limit_date", "order_delivered_customer_date")} / 86400) AS days
+        FROM "{table}"
+        WHERE {window_sql} AND {range_sql} AND seller_id IS NOT NULL
+        GROUP BY seller_id
+        ORDER BY days ASC NULLS LAST, seller_id
+        {limit_sql}
+        """,
+        window_params + range_params + ([int(top)] if top is not None else [])
+    )
+    ranked_days = ranking_df["days"].to_numpy(dtype=float)
+
+    return DataFrame({
+        "seller Id": ranking_df["seller_id"].to_numpy(),
+        "Avg. Days before Deadline": ranked_days.round(2),
+        "Meet Deadline": where(ranked_days < 0, "Yes", "No")
+    })
+
+
+def unit_time_histogram(
+        table: str,
+        date_var: str,
+        first_date: str,
+        second_date: str,
+        month_name: str,
+        year: int=None,
+        date_range: list=None
+) -> dict:
+    """
+    The SQL version of `duration_function.unit_time_histogram` over the durations of the month, each duration 
+    is classified as in `unit_time_code`.
+
+    :return a dictionary with the count and percentage of each unit of time (in the `unit_time_labels` order).
+    """
+    periods = month_periods(table, date_var, month_name, False, True, year, date_range)
+    window_sql, window_params = period_condition(periods)
+    range_sql, range_params = range_condition(date_var, date_range)
+    day_us, hour_us, minute_us = day_ns // 1000, hour_ns // 1000, minute_ns // 1000
+
+    counts_df = query(
+        f"""
+        WITH durations AS (
+            SELECT date_diff('microsecond', "{first_date}", "{second_date}") AS us
+            FROM "{table}"
+            WHERE {window_sql} AND {range_sql}
+        )
+        SELECT
+            CASE
+                WHEN us >= {day_us} THEN 3
+                WHEN ((us % {day_us}) + {day_us}) % {day_us} >= {hour_us} THEN 2
+                WHEN ((us % {day_us}) + {day_us}) % {day_us} >= {minute_us} THEN 1
+                ELSE 0
+            END AS code,
+            COUNT(*) AS count
+        FROM durations
+        GROUP BY code
+        """,
+        window_params + range_params
+    )
+
+    counts = zeros(len(unit_time_labels), dtype="int64")
+    counts[counts_df["code"].to_numpy(dtype=int)] = counts_df["count"].to_numpy()
+    total = counts.sum()
+    percentages = (counts / total * 100).round(1) if total > 0 else zeros(len(unit_time_labels))
+
+    return {"count": counts, "percentage": percentages}
+
+
+def duration_medians(
+        table: str,
+        date_var: str,
+        pairs: dict,
+        periods: list,
+        group_by: str,
+        num_unit: str,
+        date_range: list=None
+) -> DataFrame:
+    """
+    :params
+    table: the table name of the orders.
+    date_var: the date column the medians are grouped by.
+    pairs: a dictionary of {output column: (first date column, second date column)}.
+    periods: the yyyymm periods to include.
+    group_by: either ['day', 'month'], the day of the month or the month (number) of each median.
+    num_unit: The unit of time the medians should be measured in.
+    date_range: the [first day, last day] of the range, None for every day.
+
+    :return a pandas dataframe with the group and the median duration of every pair, in `group_by` order.
+    """
+    window_sql, window_params = period_condition(periods)
+    range_sql, range_params = range_condition(date_var, date_range)
+    unit = unit_seconds[num_unit] if num_unit in unit_seconds else unit_seconds["week"]
+
+    median_sql = ", ".join(
+        f'MEDIAN({seconds_between(first_date, second_date)}) / {unit} AS "{name}"'
+        for name, (first_date, second_date) in pairs.items()
+    )
+
+    return query(
+        f"""
+        SELECT {group_by}("{date_var}") AS {group_by}, {median_sql}
+        FROM "{table}"
+        WHERE {window_sql} AND {range_sql}
+        GROUP BY 1
+        ORDER BY 1
+        """,
+        window_params + range_params
+    )
+
+
+def median_duration_day(
+        table: str,
+        date_var: str,
+        pair: tuple,
+        diff_cols: list[str],
+        period: str,
+        month_name: str,
+        year: int=None,
+        date_range: list=None
+):
+    """
+    The SQL version of `duration_function.median_duration_day` for the month.
+
+    :return a plotly figure dictionary.
+    """
+    periods = month_periods(table, date_var, month_name, False, True, year, date_range)
+    summary_df = duration_medians(table, date_var, {"period": pair}, periods, "day", period, date_range)
+
+    return median_duration_day_figure(None, date_var, diff_cols, period, summary_df)
+
+
+def median_duration_month(
+        table: str,
+        date_var: str,
+        pair: tuple,
+        period: str,
+        month_name: str,
+        year: int=None,
+        date_range: list=None
+):
+    """
+    The SQL version of `duration_function.median_duration_month` for the months leading up to the month.
+
+    :return a plotly figure dictionary.
+    """
+    periods = month_periods(table, date_var, month_name, True, True, year, date_range)
+    summary_df = duration_medians(table, date_var, {"period": pair}, periods, "month", period, date_range)
+
+    return median_duration_month_figure(None, date_var, period, month_name, summary_df)
+
+
+def estimate_actual(
+        table: str,
+        date_var: str,
+        period: str,
+        month_name: str,
+        year: int=None,
+        date_range: list=None
+):
+    """
+    The SQL version of `duration_function.estimate_actual` for the month.
+
+    :return a plotly figure dictionary.
+    """
+    periods = month_periods(table, date_var, month_name, False, True, year, date_range)
+    summary_df = duration_medians(
+        table,
+        date_var,
+        {"Estimated": estimate_pair, "Actual": (date_var, "order_delivered_customer_date")},
+        periods,
+        "day",
+        period,
+        date_range
+    )
+
+    return estimate_actual_figure(None, period, summary_df)
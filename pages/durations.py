@@ -1,23 +1,26 @@
 import dash
 from dash import html, dcc
 import dash_mantine_components as dmc
-from dash import callback, Input, Output
+from dash import callback, clientside_callback, ClientsideFunction, Input, Output, State
 from dash.exceptions import PreventUpdate
 
 from components.page_layout import dashboard_page_layout, grid_container, grid_col
 from components.duration_comp import * 
 from components.utils import config_plotly, delivery_phase
 from components.duration_callback import *
+from components.period_callback import update_year_select, year_value, data_view
+from logic.server_timing import timed_callback
+from logic.callback_metrics import background_job_metrics
 
 # Register page
 dash.register_page(__name__, name="Order Shipping Duration", description="Duration of shipping product ..")
 
 duration_page_content_layout = html.Div(
     [
-        dcc.Store(id="month_filtered_data", data={}),
-        dcc.Store(id="date_diff_data", data={}),
+        # Handle of the orders in the selected date range, registered by the app process before the
+        # background jobs are forked (a job only rebuilds the view when it has been evicted since).
+        dcc.Store(id="duration_data_view", data={}),
 
-        
         grid_container(
             [
                 grid_col(breadcrumb(), span=8),
@@ -51,15 +54,27 @@ layout = dashboard_page_layout(
 
 
 
-@callback(
+clientside_callback(
+    ClientsideFunction(namespace="dashboard", function_name="toggleSidebar"),
     Output('duration_sidebar', 'className'),
     Input('duration_open_burger', 'opened')
 )
-def toggle_sidebar(is_opened):
-    return "page-sidebar" if is_opened else "page-sidebar close"
 
 
 @callback(
+    Output("duration_selected_year", "data"),
+    Output("duration_selected_year", "value"),
+
+    Input('store_orders_data', 'data'),
+    State("duration_selected_year", "value")
+)
+@timed_callback
+def update_year_options(data, year):
+    return update_year_select(data, year)
+
+
+clientside_callback(
+    ClientsideFunction(namespace="dashboard", function_name="validPhaseOptions"),
     Output("from_phase", "data"),
     Output("to_phase", "data"),
 
@@ -67,10 +82,9 @@ def toggle_sidebar(is_opened):
     Input("to_phase", "value"),
     prevent_initial_call=True
 )
-def update_delivery_phase_data(from_phase, to_phase):
-    return valid_phase_options(from_phase, to_phase)
 
-@callback(
+clientside_callback(
+    ClientsideFunction(namespace="dashboard", function_name="updateBcStyle"),
     Output("placement", "className"),
     Output("approval", "className"),
     Output("carrier", "className"),
@@ -79,22 +93,17 @@ def update_delivery_phase_data(from_phase, to_phase):
     Input("from_phase", "value"),
     Input("to_phase", "value")
 )
-def update_bc_phase(from_phase, to_phase):
-    return update_bc_style(from_phase, to_phase)
 
 
 @callback(
-    Output("month_filtered_data", "data"),
-    Output("date_diff_data", "data"),
+    Output("duration_data_view", "data"),
 
     Input('store_orders_data', 'data'),
-    Input("duration_selected_month", "value"),
-    Input("from_phase", "value"),
-    Input("to_phase", "value"),
-    Input('duration_median_day_period', 'value')
+    Input("duration_date_range", "value")
 )
-def create_date_difference(data, month, from_phase, to_phase, period):
-    return store_date_diff_data(data, month, from_phase, to_phase, period)
+@timed_callback
+def update_duration_view(data, date_range):
+    return prepare_duration_data(data, date_range)
 
 
 @callback(
@@ -108,40 +117,78 @@ def create_date_difference(data, month, from_phase, to_phase, period):
     Output("hour_percent", "children"),
     Output("day_percent", "children"),
 
-    Input("date_diff_data", "data"),
+    Input("duration_data_view", "data"),
+    Input("duration_selected_month", "value"),
+    Input("duration_selected_year", "value"),
+    Input("from_phase", "value"),
+    Input("to_phase", "value"),
+    background=True
 )
-def update_unit_time_table_values(data):
-    return update_ut_table(data)
+@background_job_metrics
+@timed_callback
+def create_date_difference(data, month, year, from_phase, to_phase):
+    return update_ut_table(
+        data_view(data, data.get("date_range")), month, from_phase, to_phase, year_value(year)
+    )
+
 
 @callback(
     Output("duration_median_day", "figure"),
 
-    Input("date_diff_data", "data"),
-    # Input("orders_selected_month", "value")
+    Input("duration_data_view", "data"),
+    Input("duration_selected_month", "value"),
+    Input("duration_selected_year", "value"),
     Input("from_phase", "value"),
     Input("to_phase", "value"),
-    Input('duration_median_day_period', 'value')
+    Input('duration_median_day_period', 'value'),
+    background=True,
+    running=[
+        (Output("duration_median_day_progress", "style"), {"visibility": "visible"}, {"visibility": "hidden"})
+    ]
 )
-def update_day_charts(diff_data, from_phase, to_phase, period):
-    return update_median_day_chart(diff_data, from_phase, to_phase, period)
+@background_job_metrics
+@timed_callback
+def update_day_charts(data, month, year, from_phase, to_phase, period):
+    return update_median_day_chart(
+        data_view(data, data.get("date_range")), month, from_phase, to_phase, period, year_value(year)
+    )
 
 
 @callback(
     Output("duration_median_month", "figure"),
-    Input('store_orders_data', 'data'),
+    Input("duration_data_view", "data"),
     Input("duration_selected_month", "value"),
+    Input("duration_selected_year", "value"),
     Input("from_phase", "value"),
     Input("to_phase", "value"),
     Input('duration_median_month_period', 'value'),
+    background=True,
+    running=[
+        (Output("duration_median_month_progress", "style"), {"visibility": "visible"}, {"visibility": "hidden"})
+    ]
 )
-def update_month_chart(lu_data, month, from_phase, to_phase, period):
-    return update_median_month_chart(lu_data, month, from_phase, to_phase, period)
+@background_job_metrics
+@timed_callback
+def update_month_chart(lu_data, month, year, from_phase, to_phase, period):
+    return update_median_month_chart(
+        data_view(lu_data, lu_data.get("date_range")), month, from_phase, to_phase, period, year_value(year)
+    )
 
 
 @callback(
     Output("duration_estimated_actual", "figure"),
-    Input('month_filtered_data', 'data'),
+    Input("duration_data_view", "data"),
+    Input("duration_selected_month", "value"),
+    Input("duration_selected_year", "value"),
     Input('duration_estimated_actual_period', 'value'),
+    background=True,
+    running=[
+        (Output("duration_estimated_actual_progress", "style"), {"visibility": "visible"}, {"visibility": "hidden"})
+    ]
 )
-def update_actual_vs_estimated_chart(data, period):
-    return update_actual_estimated_chart(data, period)
\ No newline at end of file
+@background_job_metrics
+@timed_callback
+def update_actual_vs_estimated_chart(data, month, year, period):
+    return update_actual_estimated_chart(
+        data_view(data, data.get("date_range")), month, period, year_value(year)
+    )
\ No newline at end of file
@@ -1,6 +1,6 @@
 import dash
 from dash import html, dcc
-from dash import callback, Input, Output, State
+from dash import callback, clientside_callback, ClientsideFunction, Input, Output, State, MATCH
 import dash_mantine_components as dmc
 
 from components.page_layout import dashboard_page_layout, graph_container, grid_container, grid_col
@@ -8,6 +8,8 @@ from components.stats_card import stats_card, mtd_card, mom_card
 from components.utils import delivery_status
 from components.order_comp import status_summary
 from components.orders_callback import *
+from components.period_callback import update_year_select, year_value, data_view
+from logic.server_timing import timed_callback
 
 # Register page
 dash.register_page(__name__, path='/', name="Orders Insight", description="Product Order metrics for different months")
@@ -15,7 +17,6 @@ dash.register_page(__name__, path='/', name="Orders Insight", description="Produ
 
 order_page_content_layout = html.Div(
     [
-        dcc.Store(id="store_selected_month_data", data={}),
         html.Div(
             [
                 stats_card("orders"),
@@ -52,23 +53,23 @@ layout = dashboard_page_layout(
 
 
 
-@callback(
+clientside_callback(
+    ClientsideFunction(namespace="dashboard", function_name="toggleSidebar"),
     Output('orders_sidebar', 'className'),
     Input('orders_open_burger', 'opened')
 )
-def toggle_sidebar(is_opened):
 
-    return "page-sidebar" if is_opened else "page-sidebar close"
 
 @callback(
-    Output("store_selected_month_data", "data"),
+    Output("orders_selected_year", "data"),
+    Output("orders_selected_year", "value"),
 
     Input('store_orders_data', 'data'),
-    Input("orders_selected_month", "value")
+    State("orders_selected_year", "value")
 )
-def filter_selected_month(data, month):
-    return filter_single_month(data, month)
-
+@timed_callback
+def update_year_options(data, year):
+    return update_year_select(data, year)
 
 @callback(
     Output("orders_count_value", "children"),
@@ -77,181 +78,68 @@ def filter_selected_month(data, month):
     Output("orders_change_icon", "children"),
     Output("orders_percent_chart_value", "sections"),
 
-    Input('store_orders_data', 'data'),
-    Input("orders_selected_month", "value")
-)
-def update_orders_count_stats(data, month):
-    return update_count_stats(data, month, "orders")
-
-
-
-@callback(
     Output("customer_count_value", "children"),
     Output("customer_percent_change", "children"),
     Output("customer_percent_text", "children"),
     Output("customer_change_icon", "children"),
     Output("customer_percent_chart_value", "sections"),
 
-    Input('store_customer_data', 'data'),
-    Input("orders_selected_month", "value")
-)
-def update_orders_count_stats(data, month):
-    return update_count_stats(data, month, "customer")
-
-
-@callback(
     Output("order_mtd", "children"),
     Output("order_mtd_month_abbr_name_range", "children"),
     Output("order_mom", "children"),
     Output("order_mom_growth_rate", "children"),
     Output("mom_icon_type", "children"),
 
-    Input('store_orders_data', 'data'),
-    Input("orders_selected_month", "value")
-)
-def update_month_stats(data, month):
-    return update_months_values(data, month)
-
-
-@callback(
     Output("order_month_chart", "figure"),
     Output("order_weekend_weekday_chart", "figure"),
     Output("order_days_chart", "figure"),
 
-    Input('store_orders_data', 'data'),
-    Input("store_selected_month_data", "data"),
-    Input("orders_selected_month", "value")
-)
-def update_charts(data, single_month_data, month):
-    return update_chart_callback(data, single_month_data, month)
-
-
-@callback(
     Output("delivered_status", "children"),
     Output("shipped_status", "children"),
     Output("canceled_status", "children"),
     Output("unavailable_status", "children"),
     Output("invoiced_status", "children"),
 
-    Input("store_selected_month_data", "data"),
-    Input("orders_selected_month", "value")
-)
-def update_status_cat_count(data, month):
-    return update_status_count(data, month)
-
-
-
-# def toggle_modal(n_click, opened):
-#     return not opened
-
-# for status_model_id in delivery_status:
-#     callback(
-#         Output(f"{status_model_id}_modal", "opened"),
-#         Input(f"{status_model_id}_trigger", "n_clicks"),
-#         State(f"{status_model_id}_modal", "opened"),
-#         prevent_initial_call=True
-#     )(toggle_modal)
-
-
-# Modal toggle
-
-@callback(
-    Output("delivered_modal", "opened"),
-    Input("delivered_trigger", "n_clicks"),
-    State("delivered_modal", "opened"),
-    prevent_initial_call=True
-)
-def toggle_delivered_modal(n_click, opened):
-    return not opened
-
-@callback(
-    Output("shipped_modal", "opened"),
-    Input("shipped_trigger", "n_clicks"),
-    State("shipped_modal", "opened"),
-    prevent_initial_call=True
-)
-def toggle_shipped_modal(n_click, opened):
-    return not opened
-
-@callback(
-    Output("canceled_modal", "opened"),
-    Input("canceled_trigger", "n_clicks"),
-    State("canceled_modal", "opened"),
-    prevent_initial_call=True
-)
-def toggle_canceled_modal(n_click, opened):
-    return not opened
-
-@callback(
-    Output("unavailable_modal", "opened"),
-    Input("unavailable_trigger", "n_clicks"),
-    State("unavailable_modal", "opened"),
-    prevent_initial_call=True
-)
-def toggle_unavailable_modal(n_click, opened):
-    return not opened
-
-@callback(
-    Output("invoiced_modal", "opened"),
-    Input("invoiced_trigger", "n_clicks"),
-    State("invoiced_modal", "opened"),
-    prevent_initial_call=True
-)
-def toggle_invoiced_modal(n_click, opened):
-    return not opened
-    
-
-@callback(
-    Output("delivered_month_chart", "figure"),
-
-    Input("delivered_modal", "opened"),
-    Input('store_orders_data', 'data'),
-    Input("orders_selected_month", "value"),
-    prevent_initial_call=True
-)
-def update_delivered_chart(is_opened: bool, data: dict, month: str):
-    return update_status_charts(data, month, is_opened, "delivered")
-
-@callback(
-    Output("shipped_month_chart", "figure"),
-
-    Input("shipped_modal", "opened"),
-    Input('store_orders_data', 'data'),
-    Input("orders_selected_month", "value"),
-    prevent_initial_call=True
-)
-def update_shipped_chart(is_opened: bool, data: dict, month: str):
-    return update_status_charts(data, month, is_opened, "shipped")
-
-@callback(
-    Output("canceled_month_chart", "figure"),
-
-    Input("canceled_modal", "opened"),
     Input('store_orders_data', 'data'),
+    Input('store_customer_data', 'data'),
     Input("orders_selected_month", "value"),
+    Input("orders_selected_year", "value"),
+    Input("orders_date_range", "value")
+)
+@timed_callback
+def update_orders_page_values(orders_data, customer_data, month, year, date_range):
+    return update_orders_page(
+        data_view(orders_data, date_range), 
+        data_view(customer_data, date_range), 
+        month, 
+        year_value(year)
+    )
+
+
+
+# Modal toggle, one for every status in `delivery_status`.
+clientside_callback(
+    ClientsideFunction(namespace="dashboard", function_name="toggleModal"),
+    Output({"type": "status_modal", "status": MATCH}, "opened"),
+    Input({"type": "status_modal_trigger", "status": MATCH}, "n_clicks"),
+    State({"type": "status_modal", "status": MATCH}, "opened"),
     prevent_initial_call=True
 )
-def update_canceled_chart(is_opened: bool, data: dict, month: str):
-    return update_status_charts(data, month, is_opened, "canceled")
-
-@callback(
-    Output("unavailable_month_chart", "figure"),
 
-    Input("unavailable_modal", "opened"),
-    Input('store_orders_data', 'data'),
-    Input("orders_selected_month", "value"),
-    prevent_initial_call=True
-)
-def update_unavailable_chart(is_opened: bool, data: dict, month: str):
-    return update_status_charts(data, month, is_opened, "unavailable")
 
 @callback(
-    Output("invoiced_month_chart", "figure"),
+    Output({"type": "status_month_chart", "status": MATCH}, "figure"),
 
-    Input("invoiced_modal", "opened"),
+    Input({"type": "status_modal", "status": MATCH}, "opened"),
     Input('store_orders_data', 'data'),
     Input("orders_selected_month", "value"),
+    Input("orders_selected_year", "value"),
+    Input("orders_date_range", "value"),
+    State({"type": "status_modal", "status": MATCH}, "id"),
     prevent_initial_call=True
 )
-def update_invoiced_chart(is_opened: bool, data: dict, month: str):
-    return update_status_charts(data, month, is_opened, "invoiced")
\ No newline at end of file
+@timed_callback
+def update_status_chart(is_opened: bool, data: dict, month: str, year: str, date_range: list, modal_id: dict):
+    return update_status_charts(
+        data_view(data, date_range), month, is_opened, modal_id["status"], year_value(year)
+    )
\ No newline at end of file
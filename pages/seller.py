@@ -1,20 +1,27 @@
 import dash
 from dash import html, dash_table
-from dash import callback, Input, Output
+from dash import callback, clientside_callback, ClientsideFunction, Input, Output, State, ctx
 from dash.exceptions import PreventUpdate
 import dash_mantine_components as dmc
-from pandas import DataFrame
-from dash_mantine_components.theme import DEFAULT_COLORS
 
 from components.page_layout import dashboard_page_layout, grid_container, grid_col
 from components.stats_card import seller_stats_card
-from components.utils import default_date_variable, default_color
+from components.utils import default_date_variable, default_color, data_backend
 
-from logic.seller_function import seller_count, top_sellers_order_deadline
+from components.seller_callback import update_seller_table
+from components.period_callback import update_year_select, year_value, data_view
+
+from logic.seller_function import seller_count
+from logic import sql_function
+from logic.sql_function import use_sql_backend
+from logic import polars_function
+from logic.polars_function import use_polars_backend, get_lazy_frame
 from logic.global_function import clean_date
+from logic.data_registry import resolve_dataset
+from logic.server_timing import timed_callback
 
 
-default_column_names = ["seller_id", "Avg. Days Before Deadline", "Meet Deadline"]
+default_column_names = ["seller Id", "Avg. Days before Deadline", "Meet Deadline"]
 
 
 # Register page
@@ -36,11 +43,11 @@ seller_page_content_layout = html.Div(
                                     [
                                         html.Div(
                                             [
-                                                dmc.Text("Top 5"),
+                                                dmc.Text("Top sellers"),
                                                 dmc.NumberInput(
                                                     label="",
                                                     value=5,
-                                                    min=5, max=100,
+                                                    min=5,
                                                     step=5,
                                                     id="top_n_seller",
                                                     style={"width": "200px"}
@@ -51,7 +58,7 @@ seller_page_content_layout = html.Div(
 
                                         html.Div(
                                             [
-                                                dmc.Text("Average Days:", color=default_color),
+                                                dmc.Text("Top sellers Average Days:", color=default_color),
                                                 dmc.Text("0000", id="avg_day_duration")
                                             ],
                                             className="sp-avg_container"
@@ -65,13 +72,33 @@ seller_page_content_layout = html.Div(
                                         dash_table.DataTable(
                                             id="top_seller_deadline_table",
                                             columns=[{"name": i, "id": i} for i in default_column_names],
+                                            # Only the rows of the current page are sent by the server.
+                                            page_action="custom",
+                                            page_current=0,
+                                            page_size=10,
+                                            sort_action="custom",
+                                            sort_mode="multi",
+                                            sort_by=[],
+                                            filter_action="custom",
+                                            filter_query="",
                                             style_as_list_view=True,
                                             style_header={
                                                 "backgroundColor": default_color,
                                                 "color": "#FFFFFF",
                                                 "fontWeight": "bold",
                                                 "border": "1px solid #FFFFFF",
-                                            }
+                                            },
+                                            style_cell={
+                                                "textAlign": "center",
+                                                "color": "#888888",
+                                                "textOverflow": "ellipsis",
+                                                "maxWidth": "100px",
+                                                "width": "70px",
+                                                "border": "1px solid #F5F5F5"
+                                            },
+                                            style_data_conditional=[
+                                                {"if": {"column_id": "Avg. Days before Deadline"}, "maxWidth": "50px"}
+                                            ]
                                         )
                                     ],
                                     className="sp-top_table",
@@ -97,12 +124,23 @@ layout = dashboard_page_layout(
 
 
 
-@callback(
+clientside_callback(
+    ClientsideFunction(namespace="dashboard", function_name="toggleSidebar"),
     Output('seller_sidebar', 'className'),
     Input('seller_open_burger', 'opened')
 )
-def toggle_sidebar(is_opened):
-    return "page-sidebar" if is_opened else "page-sidebar close"
+
+
+@callback(
+    Output("seller_selected_year", "data"),
+    Output("seller_selected_year", "value"),
+
+    Input('store_seller_data', 'data'),
+    State("seller_selected_year", "value")
+)
+@timed_callback
+def update_year_options(data, year):
+    return update_year_select(data, year)
 
 
 @callback(
@@ -112,13 +150,37 @@ def toggle_sidebar(is_opened):
     Output("seller_percent_text_value", "children"),
 
     Input("store_seller_data", "data"),
-    Input("seller_selected_month", "value")
+    Input("seller_selected_month", "value"),
+    Input("seller_selected_year", "value"),
+    Input("seller_date_range", "value")
 )
-def update_seller_count(data, month):
+@timed_callback
+def update_seller_count(data, month, year, date_range):
     
     if data != {}:
-        func_data = clean_date(DataFrame(data), "seller")
-        count_dict = seller_count(func_data, default_date_variable, month)
+        data = data_view(data, date_range)
+
+        if use_sql_backend(data_backend):
+            # Counted by the embedded database
+            count_dict = sql_function.seller_count(
+                data["data_type"], default_date_variable, month, year_value(year), data.get("date_range")
+            )
+        elif use_polars_backend(data_backend):
+            # Counted on the lazy frame of the data snapshot
+            frame_res = get_lazy_frame(data)
+            if frame_res["error"]:
+                raise PreventUpdate
+
+            count_dict = polars_function.seller_count(
+                frame_res["data"], default_date_variable, month, year_value(year)
+            )
+        else:
+            data_res = resolve_dataset(data)
+            if data_res["error"]:
+                raise PreventUpdate
+
+            func_data = clean_date(data_res["data"], "seller")
+            count_dict = seller_count(func_data, default_date_variable, month, year_value(year))
 
         if count_dict["error"]:
             raise PreventUpdate
@@ -137,56 +199,36 @@ def update_seller_count(data, month):
 
 
 @callback(
-    Output("top_seller_deadline", "children"),
+    Output("top_seller_deadline_table", "data"),
+    Output("top_seller_deadline_table", "page_count"),
+    Output("top_seller_deadline_table", "page_current"),
     Output("avg_day_duration", "children"),
 
     Input("store_seller_data", "data"),
     Input("seller_selected_month", "value"),
-    Input("top_n_seller", "value")
+    Input("seller_selected_year", "value"),
+    Input("seller_date_range", "value"),
+    Input("top_n_seller", "value"),
+    Input("top_seller_deadline_table", "page_current"),
+    Input("top_seller_deadline_table", "page_size"),
+    Input("top_seller_deadline_table", "sort_by"),
+    Input("top_seller_deadline_table", "filter_query")
 )
-def update_top_table(data, month, top_n):
+@timed_callback
+def update_top_table(data, month, year, date_range, top_n, page_current, page_size, sort_by, filter_query):
     """ 
     """
-    if data != {}:
-        func_data = clean_date(DataFrame(data), "seller")
-        top_dict = top_sellers_order_deadline(func_data, default_date_variable, month, top_n)
-
-        if top_dict["error"]:
-            raise PreventUpdate
-        else:
-            table =  dash_table.DataTable(
-                id="top_seller_deadline_table",
-                columns=[
-                    {"name": i, "id": i, "selectable": True} for i in top_dict["data"].columns
-                ],
-                data=top_dict["data"].to_dict("records"),
-                style_as_list_view=True,
-                style_header={
-                    "backgroundColor": default_color,
-                    "color": "#FFFFFF",
-                    "fontWeight": "bold",
-                    "border": "1px solid #FFFFFF",
-                },
-                style_cell={
-                    "textAlign": "center",
-                    "color": "#888888",
-                    "textOverflow": "ellipsis",
-                    "maxWidth": "100px",
-                    "width": "70px",
-                    "border": "1px solid #F5F5F5"
-                },
-                style_data_conditional=[
-                        {
-                        # 'if': {'column_id': 'Meet Deadline', 'filter_query': '{"Meet Deadline"} = "Yes"'}, 
-                        # 'color': default_color,
-                        
-                        'if': {"column_id": "Avg. Days before Deadline"}, "maxWidth": "50px"
-                    },
-                ]
-            )
-
-            return (table, round(top_dict["avg_days"], 2))
-
-    else:
-        raise PreventUpdate
-
+    # A new selection, sorting or filter starts from the first page (the top sellers only set the average).
+    if not set(ctx.triggered_prop_ids) <= {"top_seller_deadline_table.page_current", "top_n_seller.value"}:
+        page_current = 0
+
+    return update_seller_table(
+        data_view(data, date_range), 
+        month, 
+        top_n, 
+        page_current, 
+        page_size, 
+        sort_by, 
+        filter_query, 
+        year_value(year)
+    )
@@ -0,0 +1,113 @@
+"""
+The Durations callbacks run as background jobs, in processes forked from the app process by the
+DiskcacheManager. Polars can not run in a process forked after it has run, so with the polars backend
+the jobs must finish (on the pandas functions) once the app process has used polars.
+
+usage (from the repository root):
+    python -m pytest tests
+"""
+import json
+import time
+
+import pytest
+from dash import DiskcacheManager
+from diskcache import Cache
+from plotly.utils import PlotlyJSONEncoder
+
+pytest.importorskip("polars")
+
+from benchmarks.generate_data import generate_data
+from logic import figure_cache, polars_function
+from logic.global_function import read_data, build_month_index
+from logic.data_registry import register_dataset
+from logic.polars_function import register_polars_source, use_polars_backend, get_lazy_frame, frame_periods
+from components import duration_callback
+from components.duration_callback import (
+    prepare_duration_data,
+    update_ut_table,
+    update_median_day_chart,
+    update_median_month_chart,
+    update_actual_estimated_chart
+)
+from components.utils import default_date_variable
+
+
+# Seconds a job may run before it is taken for a deadlock.
+job_timeout = 60
+
+
+@pytest.fixture
+def orders_handle(tmp_path, monkeypatch):
+    """
+    :return the handle of a small orders dataset, with the polars backend active and already used by
+    this process.
+    """
+    generate_data(2000, str(tmp_path / "data"), start="2018-01-01", years=1)
+    orders_path = str(tmp_path / "data" / "orders.csv")
+    orders_data = build_month_index(read_data(orders_path, "orders"))
+    handle = register_dataset(orders_data, "orders")
+
+    monkeypatch.setattr(polars_function, "polars_sources", {})
+    monkeypatch.setattr(polars_function, "polars_source_directory", str(tmp_path / "polars"))
+    monkeypatch.setattr(polars_function, "_polars_pid", None)
+    register_polars_source(orders_data, handle)
+    monkeypatch.setattr(duration_callback, "data_backend", "polars")
+    # Every figure is built by the call, not read from the figure cache.
+    monkeypatch.setattr(figure_cache, "get_figure_cache", lambda: None)
+
+    # Start the polars thread pool of this process, as the Orders and Seller pages do.
+    frame_res = get_lazy_frame(handle)
+    assert not frame_res["error"]
+    frame_periods(frame_res["data"], default_date_variable)
+
+    return handle
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return DiskcacheManager(Cache(str(tmp_path / "callbacks")))
+
+
+def run_background(manager: DiskcacheManager, func, *args):
+    """
+    :return the result of `func` run as a background job of the manager, in a forked process.
+    """
+    key = f"{func.__name__}-{time.time_ns()}"
+    job = manager.call_job_fn(key, manager.make_job_fn(func, False), list(args), {})
+
+    deadline = time.monotonic() + job_timeout
+    while not manager.result_ready(key):
+        if time.monotonic() > deadline:
+            manager.terminate_job(job)
+            pytest.fail(f"{func.__name__} did not finish within {job_timeout}s")
+        time.sleep(0.05)
+
+    return manager.get_result(key, job)
+
+
+def as_json(result) -> str:
+    return json.dumps(result, cls=PlotlyJSONEncoder, sort_keys=True)
+
+
+@pytest.mark.parametrize("date_range", [None, ["2018-02-10", "2018-05-20"]])
+def test_duration_callbacks_in_background_jobs(orders_handle, manager, date_range):
+    # The view and its duration structures are registered by the app process, like `update_duration_view`.
+    data = prepare_duration_data(orders_handle, date_range)
+
+    callbacks = [
+        (update_ut_table, (data, "April", "placement", "customer", 2018)),
+        (update_median_day_chart, (data, "April", "placement", "customer", "day", 2018)),
+        (update_median_month_chart, (data, "April", "approval", "carrier", "hour", 2018)),
+        (update_actual_estimated_chart, (data, "April", "day", 2018))
+    ]
+
+    for func, args in callbacks:
+        result = run_background(manager, func, *args)
+
+        assert "long_callback_error" not in result, result["long_callback_error"]["tb"]
+        assert as_json(result) == as_json(func(*args))
+
+
+def test_no_polars_in_forked_job(orders_handle, manager):
+    assert use_polars_backend("polars")
+    assert run_background(manager, use_polars_backend, "polars") is False